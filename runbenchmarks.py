@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+import os
+import sys
+
+import django
+from django.conf import settings
+from django.test.utils import get_runner
+
+if __name__ == "__main__":
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.settings'
+    django.setup()
+    from tests.benchmarks import run
+    TestRunner = get_runner(settings)
+    test_runner = TestRunner()
+    test_runner.setup_test_environment()
+    old_config = test_runner.setup_databases()
+    try:
+        run(sys.argv[1:])
+    finally:
+        test_runner.teardown_databases(old_config)
+        test_runner.teardown_test_environment()
@@ -11,10 +11,6 @@ setup(
         'django-tastypie >= 0.13.3',
         'transliterate == 1.7.3',
         'vectortools == 0.0.7',
-        'shapeutils == 0.0.1',
-    ],
-    dependency_links = [
-##        'https://bitbucket.org/lighter/shape-utils/get/e0b5af9.zip#egg=shapeutils-0.0.1',
-        'https://bitbucket.org/slavas/shape-utils/get/master.zip#egg=shapeutils-0.0.1',
+        'pyshp == 2.1.3',
     ],
 )
@@ -0,0 +1,201 @@
+"""
+Micro benchmarks for the userlayers API. Run them with ``./runbenchmarks.py [name ...]``.
+"""
+import json
+import timeit
+from django.contrib.auth import get_user_model
+from django.test import Client
+from userlayers.api.resources import TablesResource, TableProxyResource
+from userlayers.api.cache import resource_cache
+from userlayers.api.export import export_cache
+from mutant.models import ModelDefinition
+
+BENCHMARKS = []
+
+TABLE_META = {
+    'name': 'bench',
+    'fields': [
+        {'name': 'text_field', 'type': 'text'},
+        {'name': 'integer_field', 'type': 'integer'},
+        {'name': 'float_field', 'type': 'float'},
+        {'name': 'boolean_field', 'type': 'boolean'},
+    ]
+}
+
+def benchmark(func):
+    BENCHMARKS.append(func)
+    return func
+
+def measure(func, number=50, repeat=3):
+    """Returns best time of one call in milliseconds"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1000
+
+def report(name, **timings):
+    print(name)
+    for k, v in sorted(timings.items()):
+        print('    %-30s %10.3f' % (k, v))
+
+class Fixture(object):
+    def __init__(self, username='bench'):
+        credentials = dict(username=username, password='password')
+        get_user_model().objects.create_user(**credentials)
+        self.client = Client()
+        self.client.login(**credentials)
+
+    def post_json(self, uri, data):
+        return self.client.post(uri, data=json.dumps(data), content_type='application/json')
+
+    def create_table(self, payload=TABLE_META):
+        resp = self.post_json(TablesResource().get_resource_uri(), payload)
+        assert resp.status_code == 201, resp.content
+        table_uri = resp['Location']
+        table_pk = int(table_uri.rstrip('/').split('/')[-1])
+        return table_pk, TableProxyResource().uri_for_table(table_pk)
+
+    def fill_table(self, objects_uri, count):
+        for i in range(count):
+            payload = {
+                'text_field': u'text %s' % i,
+                'integer_field': i,
+                'float_field': i * 1.5,
+                'boolean_field': bool(i % 2),
+                'geometry': {'type': 'Point', 'coordinates': [37.6 + i * 0.0001, 55.7]},
+            }
+            self.post_json(objects_uri, payload)
+
+@benchmark
+def resource_class_cache(fixture):
+    table_pk, objects_uri = fixture.create_table()
+    fixture.fill_table(objects_uri, 5)
+    proxy = TableProxyResource()
+
+    def build():
+        resource_cache.clear()
+        proxy.get_objects_resource(table_pk)
+
+    def cached():
+        proxy.get_objects_resource(table_pk)
+
+    def get_uncached():
+        resource_cache.clear()
+        fixture.client.get(objects_uri)
+
+    def get_cached():
+        fixture.client.get(objects_uri)
+
+    report('resource_class_cache (ms per call)',
+        get_objects_resource_uncached=measure(build),
+        get_objects_resource_cached=measure(cached),
+        list_request_uncached=measure(get_uncached),
+        list_request_cached=measure(get_cached),
+    )
+
+@benchmark
+def batch_write(fixture, count=500):
+    table_pk, objects_uri = fixture.create_table()
+    batch_uri = TableProxyResource().uri_for_batch(table_pk)
+    features = [{
+        'type': 'Feature',
+        'properties': {'text_field': u'text %s' % i, 'integer_field': i, 'float_field': i * 1.5, 'boolean_field': bool(i % 2)},
+        'geometry': {'type': 'Point', 'coordinates': [37.6 + i * 0.0001, 55.7]},
+    } for i in range(count)]
+
+    def per_row():
+        fixture.fill_table(objects_uri, count)
+
+    def batch():
+        resp = fixture.post_json(batch_uri, {'type': 'FeatureCollection', 'features': features})
+        assert resp.status_code == 200, resp.content
+
+    per_row_ms = measure(per_row, number=1, repeat=1)
+    batch_ms = measure(batch, number=1, repeat=3)
+    report('batch_write (%s features)' % count,
+        per_row_ms=per_row_ms,
+        batch_ms=batch_ms,
+        per_row_features_per_second=count / per_row_ms * 1000,
+        batch_features_per_second=count / batch_ms * 1000,
+    )
+
+@benchmark
+def table_catalog(fixture, count=50):
+    for i in range(count):
+        fixture.create_table(dict(TABLE_META, name='catalog%s' % i))
+    uri = TablesResource().get_resource_uri()
+
+    def get_catalog():
+        fixture.client.get(uri, data={'limit': 0})
+
+    report('table_catalog (%s tables, ms per request)' % count, list_request=measure(get_catalog, number=5))
+
+@benchmark
+def binary_formats(fixture, count=2000):
+    table_pk, objects_uri = fixture.create_table(dict(TABLE_META, name='formats'))
+    batch_uri = TableProxyResource().uri_for_batch(table_pk)
+    features = [{
+        'type': 'Feature',
+        'properties': {'text_field': u'text %s' % i, 'integer_field': i, 'float_field': i * 1.5, 'boolean_field': bool(i % 2)},
+        'geometry': {'type': 'Point', 'coordinates': [37.6 + i * 0.0001, 55.7]},
+    } for i in range(count)]
+    fixture.post_json(batch_uri, {'type': 'FeatureCollection', 'features': features})
+    sizes = {}
+
+    def get(format_name):
+        def request():
+            resp = fixture.client.get(objects_uri, data={'format': format_name, 'limit': 0})
+            sizes[format_name] = len(b''.join(resp.streaming_content))
+        return request
+
+    #every request builds its output
+    enabled, export_cache.enabled = export_cache.enabled, False
+    try:
+        timings = dict(('%s_ms' % name, measure(get(name), number=1)) for name in ('geojson', 'flatgeobuf', 'geobuf'))
+    finally:
+        export_cache.enabled = enabled
+    timings.update(('%s_kb' % name, size / 1024.0) for name, size in sizes.items())
+    report('binary_formats (%s features)' % count, **timings)
+
+@benchmark
+def table_creation(fixture, columns=60):
+    fields = [{'name': 'column%s' % i, 'type': ('text', 'integer', 'float')[i % 3]} for i in range(columns)]
+    tables = iter(range(1000))
+
+    def create():
+        fixture.create_table({'name': 'wide%s' % next(tables), 'fields': fields})
+
+    report('table_creation (%s columns, ms per table)' % columns, create=measure(create, number=3, repeat=1))
+
+@benchmark
+def table_copy(fixture, count=5000):
+    table_pk, objects_uri = fixture.create_table(dict(TABLE_META, name='copysource'))
+    batch_uri = TableProxyResource().uri_for_batch(table_pk)
+    features = [{
+        'type': 'Feature',
+        'properties': {'text_field': u'text %s' % i, 'integer_field': i, 'float_field': i * 1.5, 'boolean_field': bool(i % 2)},
+        'geometry': {'type': 'Point', 'coordinates': [37.6 + i * 0.0001, 55.7]},
+    } for i in range(count)]
+    fixture.post_json(batch_uri, {'type': 'FeatureCollection', 'features': features})
+    table_uri = TablesResource().get_resource_uri(ModelDefinition(pk=table_pk))
+    target_pk = fixture.create_table(dict(TABLE_META, name='copytarget'))[0]
+    append_uri = TablesResource().get_resource_uri(ModelDefinition(pk=target_pk)) + 'append/'
+
+    def clone():
+        resp = fixture.post_json(table_uri + 'clone/', {})
+        assert resp.status_code == 201, resp.content
+
+    def append():
+        resp = fixture.post_json(append_uri, {'source': table_uri})
+        assert resp.status_code == 200, resp.content
+
+    clone_ms = measure(clone, number=1)
+    append_ms = measure(append, number=1)
+    report('table_copy (%s rows)' % count,
+        clone_ms=clone_ms,
+        append_ms=append_ms,
+        append_rows_per_second=count / append_ms * 1000,
+    )
+
+def run(names=None):
+    fixture = Fixture()
+    for func in BENCHMARKS:
+        if not names or func.__name__ in names:
+            func(fixture)
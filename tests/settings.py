@@ -35,3 +35,7 @@ INSTALLED_APPS = [
 ]
 
 ROOT_URLCONF = 'userlayers.urls'
+
+USERLAYERS_IMPORT_WORKERS = 0
+USERLAYERS_SCHEMA_CHANGE_WORKERS = 0
+USERLAYERS_SCHEMA_CHANGE_THROTTLE = 0
@@ -1,8 +1,10 @@
 from tastypie.api import Api
-from .resources import TablesResource, FieldsResource, TableProxyResource, FileImportResource
+from .resources import TablesResource, FieldsResource, TableProxyResource, FileImportResource, ImportJobsResource, SchemaChangesResource
 
 v1_api = Api(api_name='v1')
 v1_api.register(TablesResource())
 v1_api.register(FieldsResource())
 v1_api.register(TableProxyResource())
 v1_api.register(FileImportResource())
+v1_api.register(ImportJobsResource())
+v1_api.register(SchemaChangesResource())
@@ -0,0 +1,108 @@
+from django.core.cache import caches
+from django.db import transaction
+from mutant.models import FieldDefinition
+from userlayers.settings import CACHE_ALIAS, INDEX_ADVISOR, INDEX_ADVISOR_WINDOW, INDEX_ADVISOR_MIN_QUERIES
+from userlayers.settings import INDEX_ADVISOR_THRESHOLD, INDEX_ADVISOR_AUTO_CREATE
+
+def get_used_fields(params, names):
+    """
+    Returns names of fields filtered and ordered by list query with GET params.
+    """
+    names = set(names)
+    filtered = set(k.split('__')[0] for k in params.keys()) & names
+    ordered = set(v.lstrip('-') for v in params.getlist('order_by')) & names
+    return filtered, ordered
+
+def is_indexed(field):
+    return bool(field.db_index or field.unique)
+
+class IndexAdvisor(object):
+    """
+    Counts list queries of every table and queries filtering and ordering by each of its columns. Counters are kept
+    in django cache for window seconds, so they follow recent usage and are shared between processes. Columns without
+    index used by threshold share of queries are advised to be indexed once table got min_queries queries; with
+    auto_create the query which made them advised queues schema changes creating their indexes.
+    """
+    key_template = 'userlayers-advisor-%s-%s-%s'
+
+    def __init__(self, enabled=INDEX_ADVISOR, window=INDEX_ADVISOR_WINDOW, min_queries=INDEX_ADVISOR_MIN_QUERIES,
+                 threshold=INDEX_ADVISOR_THRESHOLD, auto_create=INDEX_ADVISOR_AUTO_CREATE, alias=CACHE_ALIAS):
+        self.enabled = enabled
+        self.window = window
+        self.min_queries = min_queries
+        self.threshold = threshold
+        self.auto_create = auto_create
+        self.alias = alias
+
+    def key(self, table_pk, kind='queries', name=''):
+        return self.key_template % (table_pk, kind, name)
+
+    def incr(self, key):
+        cache = caches[self.alias]
+        if cache.add(key, 1, self.window):
+            return 1
+        try:
+            return cache.incr(key)
+        except ValueError:
+            #expired meanwhile
+            cache.set(key, 1, self.window)
+            return 1
+
+    def is_advised(self, field, queries, uses):
+        return not is_indexed(field) and queries >= self.min_queries and uses >= queries * self.threshold
+
+    def record(self, table_pk, params, fields):
+        """
+        Counts list query of table with GET params, fields are model fields of table columns.
+        Returns names of fields used by query which are advised to be indexed.
+        """
+        if not self.enabled:
+            return []
+        filtered, ordered = get_used_fields(params, [f.name for f in fields])
+        queries = self.incr(self.key(table_pk))
+        advised = []
+        for f in fields:
+            uses = 0
+            if f.name in filtered:
+                uses = self.incr(self.key(table_pk, 'filter', f.name))
+            if f.name in ordered:
+                uses = max(uses, self.incr(self.key(table_pk, 'order', f.name)))
+            if uses and self.is_advised(f, queries, uses):
+                advised.append(f.name)
+        return advised
+
+    def report(self, table_pk, fields):
+        """
+        Usage of table columns by list queries and advice on their indexes.
+        """
+        keys = [self.key(table_pk)] + [self.key(table_pk, kind, f.name) for f in fields for kind in ('filter', 'order')]
+        counts = caches[self.alias].get_many(keys)
+        queries = counts.get(self.key(table_pk), 0)
+        columns = []
+        for f in fields:
+            filters = counts.get(self.key(table_pk, 'filter', f.name), 0)
+            orderings = counts.get(self.key(table_pk, 'order', f.name), 0)
+            columns.append({
+                'name': f.name,
+                'filters': filters,
+                'orderings': orderings,
+                'indexed': is_indexed(f),
+                'unique': bool(f.unique),
+                'advised': self.is_advised(f, queries, max(filters, orderings)),
+            })
+        return {'enabled': self.enabled, 'queries': queries, 'columns': columns}
+
+    @transaction.atomic
+    def create_index(self, table_pk, name):
+        """
+        Creates index of column, run by schema change job.
+        """
+        #definition is locked, so concurrent jobs don't create the same index
+        pks = list(FieldDefinition.objects.select_for_update().filter(model_def_id=table_pk, name=name).values_list('pk', flat=True))
+        field_def = FieldDefinition.objects.select_subclasses().get(pk__in=pks)
+        if field_def.db_index or field_def.unique:
+            return
+        field_def.db_index = True
+        field_def.save()
+
+index_advisor = IndexAdvisor()
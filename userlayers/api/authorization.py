@@ -1,8 +1,13 @@
+import uuid
 from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.module_loading import import_string
 from mutant.models.model import ModelDefinition
-from userlayers.models import UserToTable
+from userlayers.models import UserToTable, ImportJob, SchemaChange
 from mutant.models.field import FieldDefinition
+from userlayers.settings import CACHE_ALIAS, AUTH_CACHE_TIMEOUT
 
 class FullAccessForLoginedUsers(object):
     def base_check(self, object_list, user):
@@ -59,24 +64,115 @@ class TableAuthorization(FullAccessForLoginedUsers):
         return self.base_check(object_list, bundle.request.user)
     
     def check_data_view(self, md, user):
-        return self.check_detail_view([md], user)
+        return md.pk in get_table_permissions(user).tables('view')
      
     def check_data_modify(self, md, user):
-        return self.check_detail_modify([md], user)
+        return md.pk in get_table_permissions(user).tables('modify')
+
+_table_auth_classes = {}
 
 def get_table_auth():
     custom_table_auth = getattr(settings, 'USERLAYERS_TABLE_AUTHORIZATION', None)
- 
-    if custom_table_auth:
-        return import_string(custom_table_auth)
-    
-    return TableAuthorization
+    try:
+        return _table_auth_classes[custom_table_auth]
+    except KeyError:
+        pass
+    auth_class = import_string(custom_table_auth) if custom_table_auth else TableAuthorization
+    _table_auth_classes[custom_table_auth] = auth_class
+    return auth_class
+
+class TablePermissions(object):
+    """
+    Tables user can view and modify, resolved through table authorization once and then served from memory.
+    Permissions are kept on user object, which lives as long as request. With USERLAYERS_AUTH_CACHE_TIMEOUT
+    sets of tables are also shared between requests through django cache until UserToTable or ModelDefinition
+    rows change.
+    """
+    attr = '_userlayers_table_permissions'
+    key = 'userlayers-table-permissions-%s-%s-%s'
+    version_key = 'userlayers-table-permissions-version'
+
+    def __init__(self, user):
+        self.user = user
+        self.auth = get_table_auth()()
+        self._tables = {}
+        self._data = {}
+        self._definitions = {}
+
+    def get_cache_key(self, operation):
+        if not AUTH_CACHE_TIMEOUT or self.user.is_anonymous():
+            return None
+        cache = caches[CACHE_ALIAS]
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return self.key % (version, self.user.pk, operation)
+
+    def tables(self, operation):
+        """
+        Returns frozenset of pks of tables user can view ('view') or modify ('modify').
+        """
+        if operation not in self._tables:
+            key = self.get_cache_key(operation)
+            tables = caches[CACHE_ALIAS].get(key) if key else None
+            if tables is None:
+                object_list = getattr(self.auth, 'check_list_%s' % operation)(ModelDefinition.objects.all(), self.user)
+                if hasattr(object_list, 'values_list'):
+                    tables = frozenset(object_list.values_list('pk', flat=True))
+                else:
+                    tables = frozenset(o.pk for o in object_list)
+                if key:
+                    caches[CACHE_ALIAS].set(key, tables, AUTH_CACHE_TIMEOUT)
+            self._tables[operation] = tables
+        return self._tables[operation]
+
+    def check_data(self, md, operation):
+        """
+        Memoized check_data_view/check_data_modify of table authorization, custom classes may override them.
+        """
+        key = (operation, md.pk)
+        if key not in self._data:
+            self._data[key] = bool(getattr(self.auth, 'check_data_%s' % operation)(md, self.user))
+        return self._data[key]
+
+    def get_table(self, table_pk):
+        """
+        Definition of table read once per request, None if table doesn't exist. Resource classes of table data
+        are cached between requests, so they take definition from here instead of keeping their own copy.
+        """
+        if table_pk not in self._definitions:
+            self._definitions[table_pk] = ModelDefinition.objects.filter(pk=table_pk).first()
+        return self._definitions[table_pk]
+
+    def check_table_data(self, table_pk, operation):
+        md = self.get_table(table_pk)
+        return md is not None and self.check_data(md, operation)
+
+def get_table_permissions(user):
+    permissions = getattr(user, TablePermissions.attr, None)
+    if permissions is None:
+        permissions = TablePermissions(user)
+        setattr(user, TablePermissions.attr, permissions)
+    return permissions
+
+def forget_table_permissions(user):
+    if hasattr(user, TablePermissions.attr):
+        delattr(user, TablePermissions.attr)
+
+def invalidate_table_permissions():
+    caches[CACHE_ALIAS].set(TablePermissions.version_key, uuid.uuid4().hex, None)
+
+@receiver([post_save, post_delete], sender=UserToTable, dispatch_uid='userlayers.api.authorization.usertotable_changed')
+@receiver([post_save, post_delete], sender=ModelDefinition, dispatch_uid='userlayers.api.authorization.table_changed')
+def table_permissions_changed(sender, **kwargs):
+    if AUTH_CACHE_TIMEOUT:
+        invalidate_table_permissions()
 
 def get_field_auth():
     class FieldAuthorization(FullAccessForLoginedUsers):
         def check_table_access(self, operation, object_list, user):
-            method = 'check_list_%s' % operation
-            md_list = getattr(get_table_auth()(), method)(ModelDefinition.objects.all(), user)
+            md_list = get_table_permissions(user).tables(operation)
             field_list = [o.pk for o in object_list] if type(object_list) is list else object_list
             return FieldDefinition.objects.filter(pk__in=field_list, model_def__in=md_list)
         
@@ -87,22 +183,35 @@ def get_field_auth():
             return self.check_table_access('view', object_list, user)
 
         def create_detail(self, object_list, bundle):
-            return get_table_auth()().check_detail_modify([bundle.obj.model_def], bundle.request.user)
+            return bundle.obj.model_def.pk in get_table_permissions(bundle.request.user).tables('modify')
         
     return FieldAuthorization
 
-def get_table_data_auth(md):
+def get_table_data_auth(table_pk):
     class TableDataAuthorization(FullAccessForLoginedUsers):
         def check_list_modify(self, object_list, user):
-            if get_table_auth()().check_data_modify(md, user):
+            if get_table_permissions(user).check_table_data(table_pk, 'modify'):
                 return object_list
             else:
                 return []
         
         def check_list_view(self, object_list, user):
-            if get_table_auth()().check_data_view(md, user):
+            if get_table_permissions(user).check_table_data(table_pk, 'view'):
                 return object_list
             else:
                 return []
         
     return TableDataAuthorization
+
+class ImportJobAuthorization(FullAccessForLoginedUsers):
+    model = ImportJob
+
+    def check_list_modify(self, object_list, user):
+        if not self.base_check(object_list, user):
+            return []
+        if user.is_superuser:
+            return object_list
+        return self.model.objects.filter(pk__in=object_list, user=user)
+
+class SchemaChangeAuthorization(ImportJobAuthorization):
+    model = SchemaChange
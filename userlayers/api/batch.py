@@ -0,0 +1,264 @@
+import json
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.gis.geos.error import GEOSException
+from django.db import connection, transaction
+from django.db.models import Case, When, Value, F
+from tastypie.exceptions import BadRequest
+from userlayers.settings import IMPORT_BATCH_SIZE, BATCH_MAX_FEATURES
+
+ACTIONS = ('create', 'update', 'delete')
+
+class FieldValue(Value):
+    """
+    Value rendered with placeholder of its field, so spatial backends get geometries wrapped
+    in their sql functions like in plain INSERT/UPDATE.
+    """
+    def as_sql(self, compiler, connection):
+        sql, params = super(FieldValue, self).as_sql(compiler, connection)
+        if params and hasattr(self.output_field, 'get_placeholder'):
+            sql = self.output_field.get_placeholder(self.value, compiler, connection)
+        return sql, params
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def lock_table(model_class):
+    """
+    Blocks concurrent inserts into table until the end of transaction, so ids of rows created by
+    bulk insert can be selected after it. Returns False if backend can't lock table.
+    """
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    if connection.vendor == 'postgresql':
+        cursor.execute('LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE' % qn(model_class._meta.db_table))
+        return True
+    if connection.vendor == 'sqlite':
+        #SQLite has one writer at a time, write statement takes write lock of database until the end
+        #of transaction even if it changes no rows
+        pk_column = qn(model_class._meta.pk.column)
+        cursor.execute('UPDATE %s SET %s = %s WHERE 0 = 1' % (qn(model_class._meta.db_table), pk_column, pk_column))
+        return True
+    return False
+
+def insert_rows(model_class, objects, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Inserts objects, returns their pks in order of objects. Pks are taken from bulk insert if backend
+    returns them, or selected after it under table lock; if table can't be locked, objects are inserted
+    one by one rather than mapped to ids that concurrent inserts may have taken.
+    """
+    if getattr(connection.features, 'can_return_ids_from_bulk_insert', False):
+        model_class.objects.bulk_create(objects, batch_size=batch_size)
+        return [obj.pk for obj in objects]
+    if not lock_table(model_class):
+        for obj in objects:
+            obj.save(force_insert=True)
+        return [obj.pk for obj in objects]
+    last_pk = model_class.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    model_class.objects.bulk_create(objects, batch_size=batch_size)
+    #rows of one insert get ascending ids, table lock keeps other inserts out of the range
+    pks = list(model_class.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:len(objects)])
+    if len(pks) != len(objects):
+        raise RuntimeError(u'ids of %s inserted rows of table "%s" are not found' % (len(objects), model_class._meta.db_table))
+    return pks
+
+def update_rows(model_class, updates):
+    """
+    Updates rows by one UPDATE with CASE per changed column, updates are (pk, dict of values).
+    """
+    kwargs = {}
+    names = set()
+    for pk, values in updates:
+        names.update(values.keys())
+    for name in names:
+        field = model_class._meta.get_field(name)
+        whens = [When(pk=pk, then=FieldValue(values[name], output_field=field)) for pk, values in updates if name in values]
+        kwargs[name] = Case(*whens, default=F(name), output_field=field)
+    if kwargs:
+        model_class.objects.filter(pk__in=[pk for pk, values in updates]).update(**kwargs)
+
+class KeyedWriter(object):
+    """
+    Upserts objects by key column: objects whose key is found in table update rows with this key (only
+    columns of names are changed), other objects are inserted. Every batch takes one query looking up
+    keys, one UPDATE and one INSERT; of objects with the same key in one batch the last one is written.
+    """
+    def __init__(self, model_class, key, names):
+        self.model_class = model_class
+        self.key = key
+        self.names = names
+
+    def write(self, objects):
+        """
+        Writes batch of model objects, returns count of created rows and pks of updated rows.
+        """
+        keyed = OrderedDict()
+        created = []
+        for obj in objects:
+            key = getattr(obj, self.key)
+            if key is None:
+                created.append(obj)
+            else:
+                keyed[key] = obj
+        existing = {}
+        if keyed:
+            rows = self.model_class.objects.filter(**{'%s__in' % self.key: list(keyed)}).values_list(self.key, 'pk')
+            for key, pk in rows:
+                existing.setdefault(key, []).append(pk)
+        updates = []
+        for key, obj in keyed.items():
+            if key in existing:
+                values = dict((name, getattr(obj, name)) for name in self.names)
+                updates.extend((pk, values) for pk in existing[key])
+            else:
+                created.append(obj)
+        for chunk in chunks(updates, len(objects)):
+            update_rows(self.model_class, chunk)
+        if created:
+            self.model_class.objects.bulk_create(created)
+        return len(created), [pk for pk, values in updates]
+
+class BatchWriter(object):
+    """
+    Applies FeatureCollection of creates, updates and deletes to table. Feature action is taken from
+    its "action" member, features with id are updated and features without id are created by default.
+    All features are validated before anything is written, then changes are applied in one transaction
+    with one query per chunk of objects.
+    """
+    def __init__(self, model_class, geometry_field_name, max_features=BATCH_MAX_FEATURES, chunk_size=IMPORT_BATCH_SIZE):
+        self.model_class = model_class
+        self.geometry_field = model_class._meta.get_field(geometry_field_name)
+        self.fields = dict((f.name, f) for f in model_class._meta.fields if not f.primary_key and f is not self.geometry_field)
+        self.max_features = max_features
+        self.chunk_size = chunk_size
+        self.results = []
+        self.creates = []
+        self.updates = []
+        self.deletes = []
+
+    def clean_geometry(self, value):
+        if value is None:
+            return None
+        try:
+            geometry = GEOSGeometry(json.dumps(value))
+        except (GEOSException, GDALException, ValueError, TypeError):
+            raise ValidationError(u'invalid geometry')
+        field = self.geometry_field
+        if field.geom_type != 'GEOMETRY' and geometry.geom_type.upper() != field.geom_type:
+            raise ValidationError(u'geometry must be %s' % field.geom_type)
+        if geometry.srid is None:
+            geometry.srid = field.srid
+        if field.dim == 3 and not geometry.hasz:
+            geom_3d = geometry.ogr
+            geom_3d._set_coord_dim(3)
+            geometry = geom_3d.geos
+        return geometry
+
+    def clean_feature(self, feature):
+        """
+        Returns action, pk and dict of cleaned values of feature, raises ValidationError with dict of errors.
+        """
+        if not isinstance(feature, dict):
+            raise ValidationError({'feature': [u'feature must be an object']})
+        pk = feature.get('id')
+        action = feature.get('action') or ('create' if pk is None else 'update')
+        if action not in ACTIONS:
+            raise ValidationError({'action': [u'action must be one of %s' % ', '.join(ACTIONS)]})
+        if action != 'create':
+            try:
+                pk = int(pk)
+            except (TypeError, ValueError):
+                raise ValidationError({'id': [u'id is required for %s' % action]})
+        else:
+            pk = None
+        values = {}
+        errors = {}
+        if action != 'delete':
+            properties = feature.get('properties') or {}
+            if not isinstance(properties, dict):
+                raise ValidationError({'properties': [u'properties must be an object']})
+            for name, value in properties.iteritems():
+                field = self.fields.get(name)
+                if field is None:
+                    errors[name] = [u'unknown field']
+                    continue
+                try:
+                    values[name] = field.clean(value, None)
+                except ValidationError as e:
+                    errors[name] = e.messages
+            if 'geometry' in feature or action == 'create':
+                try:
+                    values[self.geometry_field.name] = self.clean_geometry(feature.get('geometry'))
+                except ValidationError as e:
+                    errors['geometry'] = e.messages
+        if errors:
+            raise ValidationError(errors)
+        return action, pk, values
+
+    def validate(self, data):
+        """
+        Validates FeatureCollection, returns True if all features are valid. Results with errors are in self.results.
+        """
+        if not isinstance(data, dict) or not isinstance(data.get('features'), list):
+            raise BadRequest(u'FeatureCollection is expected')
+        features = data['features']
+        if len(features) > self.max_features:
+            raise BadRequest(u'batch may contain at most %s features' % self.max_features)
+        valid = True
+        seen = set()
+        for index, feature in enumerate(features):
+            try:
+                action, pk, values = self.clean_feature(feature)
+                if pk is not None and pk in seen:
+                    raise ValidationError({'id': [u'object is changed more than once']})
+            except ValidationError as e:
+                valid = False
+                self.results.append({'action': (feature.get('action') if isinstance(feature, dict) else None),
+                                     'id': (feature.get('id') if isinstance(feature, dict) else None),
+                                     'errors': e.message_dict})
+                continue
+            seen.add(pk)
+            result = {'action': action, 'id': pk}
+            self.results.append(result)
+            if action == 'create':
+                self.creates.append((result, values))
+            elif action == 'update':
+                self.updates.append((result, values))
+            else:
+                self.deletes.append(result)
+
+        pks = [r['id'] for r, v in self.updates] + [r['id'] for r in self.deletes]
+        existing = set()
+        for chunk in chunks(pks, self.chunk_size):
+            existing.update(self.model_class.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        for result in [r for r, v in self.updates] + self.deletes:
+            if result['id'] not in existing:
+                valid = False
+                result['errors'] = {'id': [u'object does not exist']}
+        return valid
+
+    @transaction.atomic
+    def apply(self):
+        self.apply_creates()
+        self.apply_updates()
+        self.apply_deletes()
+        return {'created': len(self.creates), 'updated': len(self.updates), 'deleted': len(self.deletes)}
+
+    def apply_creates(self):
+        if not self.creates:
+            return
+        objects = [self.model_class(**values) for result, values in self.creates]
+        pks = insert_rows(self.model_class, objects, self.chunk_size)
+        for (result, values), pk in zip(self.creates, pks):
+            result['id'] = pk
+
+    def apply_updates(self):
+        for chunk in chunks(self.updates, self.chunk_size):
+            update_rows(self.model_class, [(result['id'], values) for result, values in chunk])
+
+    def apply_deletes(self):
+        for chunk in chunks(self.deletes, self.chunk_size):
+            self.model_class.objects.filter(pk__in=[result['id'] for result in chunk]).delete()
@@ -0,0 +1,83 @@
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from django.dispatch import receiver
+from mutant.models import ModelDefinition
+from mutant.state import handler as state_handler
+from userlayers.models import TableState
+from userlayers.signals import table_updated
+
+class ResourceCache(object):
+    """
+    Process-wide cache of the per-table resource classes built by TableProxyResource.
+    Entries are keyed by table pk and tagged with mutant's model checksum, which acts as
+    the schema version: any field change produces a new checksum, so a stale class is
+    never served even if the change was made by another process (with a shared mutant
+    state handler). Classes keep only what the checksum covers; definition of table,
+    which authorizations and layer names depend on, is read by every request.
+    """
+    def __init__(self):
+        self._resources = {}
+
+    def get_schema_version(self, table_pk):
+        return state_handler.get_checksum(table_pk)
+
+    def get(self, table_pk):
+        try:
+            version, resource = self._resources[table_pk]
+        except KeyError:
+            return None
+        if version is None or version != self.get_schema_version(table_pk):
+            return None
+        return resource
+
+    def set(self, table_pk, resource):
+        self._resources[table_pk] = (self.get_schema_version(table_pk), resource)
+
+    def invalidate(self, table_pk):
+        self._resources.pop(table_pk, None)
+
+    def clear(self):
+        self._resources.clear()
+
+class DataVersions(object):
+    """
+    Per-table data versions kept in TableState rows. Versions are changed in the transaction that writes
+    table rows, so they are never ahead of or behind the data seen by other processes. State of tables
+    created before it was tracked is created on first access.
+    """
+    def get_state(self, table_pk):
+        try:
+            return TableState.objects.get(md_id=table_pk)
+        except TableState.DoesNotExist:
+            try:
+                with transaction.atomic():
+                    return TableState.objects.create(md_id=table_pk)
+            except IntegrityError:
+                return TableState.objects.get(md_id=table_pk)
+
+    def get(self, table_pk):
+        """
+        Returns opaque token of table data version.
+        """
+        return self.get_state(table_pk).token
+
+    def bump(self, table_pk):
+        updated = TableState.objects.filter(md_id=table_pk).update(version=F('version') + 1, modified=timezone.now())
+        if not updated and ModelDefinition.objects.filter(pk=table_pk).exists():
+            self.get_state(table_pk)
+            self.bump(table_pk)
+
+resource_cache = ResourceCache()
+data_versions = DataVersions()
+
+@receiver(table_updated, dispatch_uid='userlayers.api.cache.table_updated')
+def invalidate_updated_table(sender, md, **kwargs):
+    resource_cache.invalidate(md.pk)
+    #responses depend on schema as well
+    data_versions.bump(md.pk)
+
+@receiver(post_delete, sender=ModelDefinition, dispatch_uid='userlayers.api.cache.table_deleted')
+def invalidate_deleted_table(sender, instance, **kwargs):
+    resource_cache.invalidate(instance.pk)
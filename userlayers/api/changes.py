@@ -0,0 +1,112 @@
+import datetime
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F, Max, Min
+from django.db.models.query import QuerySet
+from django.utils import timezone
+from userlayers.models import TableChange, TableState
+from userlayers.settings import CACHE_ALIAS, CHANGES_RETENTION, CHANGES_COMPACT_INTERVAL, IMPORT_BATCH_SIZE
+from .cache import data_versions
+
+class ChangesExpired(Exception):
+    pass
+
+class ChangeLog(object):
+    """
+    Log of created, updated and deleted rows of user tables. Every record call numbers its entries by
+    change tokens under lock of TableState row, which is held until the writing transaction commits, so
+    a change committed later always gets a greater token, even if its id was taken earlier. The lock
+    serializes writers of one table from their first recorded change to commit (writes of rows bump
+    data version of the same row anyway); writers of different tables don't wait for each other.
+    Changes since token are listed as one entry per object, the latest one. Entries older than
+    retention are removed at most once per compact_interval for every table, tokens older than
+    removed entries are expired.
+    """
+    compact_key = 'userlayers-changes-compacted-%s'
+
+    def __init__(self, retention=CHANGES_RETENTION, compact_interval=CHANGES_COMPACT_INTERVAL, alias=CACHE_ALIAS):
+        self.retention = retention
+        self.compact_interval = compact_interval
+        self.alias = alias
+
+    def record(self, table_pk, changes):
+        """
+        Records (action, object pk) changes.
+        """
+        now = timezone.now()
+        entries = [TableChange(md_id=table_pk, object_id=pk, action=action, created=now) for action, pk in changes]
+        TableChange.objects.bulk_create(entries, batch_size=IMPORT_BATCH_SIZE)
+        self.number(table_pk)
+        self.maybe_compact(table_pk)
+
+    def record_queryset(self, table_pk, queryset, action):
+        """
+        Records change of every row of queryset by one INSERT ... SELECT, rows are not fetched.
+        """
+        if not isinstance(queryset, QuerySet):
+            return self.record(table_pk, [(action, obj.pk) for obj in queryset])
+        sql, params = queryset.order_by().values_list('pk').query.sql_with_params()
+        qn = connection.ops.quote_name
+        opts = TableChange._meta
+        created = opts.get_field('created').get_db_prep_value(timezone.now(), connection)
+        cursor = connection.cursor()
+        cursor.execute('INSERT INTO %s (%s, %s, %s, %s) SELECT %%s, changed.%s, %%s, %%s FROM (%s) changed' % (
+            qn(opts.db_table), qn('md_id'), qn('object_id'), qn('action'), qn('created'), qn(queryset.model._meta.pk.column), sql),
+            [table_pk, action, created] + list(params))
+        self.number(table_pk)
+        self.maybe_compact(table_pk)
+
+    def number(self, table_pk):
+        """
+        Gives tokens to entries recorded by current transaction so far and locks TableState row of
+        table until the transaction ends. Entries of other transactions aren't visible until they
+        commit, and those waiting for the lock number theirs after it.
+        """
+        data_versions.get_state(table_pk)
+        with transaction.atomic():
+            state = TableState.objects.select_for_update().get(md_id=table_pk)
+            new = TableChange.objects.filter(md_id=table_pk, seq__isnull=True)
+            ids = new.aggregate(first=Min('id'), last=Max('id'))
+            if ids['first'] is None:
+                return
+            offset = state.changes_seq + 1 - ids['first']
+            new.update(seq=F('id') + offset)
+            TableState.objects.filter(md_id=table_pk).update(changes_seq=ids['last'] + offset)
+
+    def maybe_compact(self, table_pk):
+        if self.retention and caches[self.alias].add(self.compact_key % table_pk, 1, self.compact_interval):
+            self.compact(table_pk)
+
+    @transaction.atomic
+    def compact(self, table_pk):
+        expired = TableChange.objects.filter(md_id=table_pk, created__lt=timezone.now() - datetime.timedelta(seconds=self.retention))
+        last = expired.aggregate(last=Max('seq'))['last']
+        if last is None:
+            return
+        data_versions.get_state(table_pk)
+        TableState.objects.filter(md_id=table_pk, changes_floor__lt=last).update(changes_floor=last)
+        TableChange.objects.filter(md_id=table_pk, seq__lte=last).delete()
+
+    def get_token(self, table_pk):
+        """
+        Returns token of current state of table.
+        """
+        state = data_versions.get_state(table_pk)
+        return max(state.changes_seq, state.changes_floor)
+
+    def get_changes(self, table_pk, since, limit):
+        """
+        Returns pks of objects changed after token since (at most limit of them), token of the last
+        returned change and whether there are more changes. Raises ChangesExpired if since is too old.
+        """
+        self.maybe_compact(table_pk)
+        if since < data_versions.get_state(table_pk).changes_floor:
+            raise ChangesExpired()
+        changes = TableChange.objects.filter(md_id=table_pk, seq__gt=since).values('object_id').annotate(last=Max('seq'))
+        rows = list(changes.order_by('last')[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        token = rows[-1]['last'] if rows else since
+        return [r['object_id'] for r in rows], token, more
+
+change_log = ChangeLog()
@@ -0,0 +1,24 @@
+import calendar
+from django.utils.http import http_date, parse_etags, quote_etag, parse_http_date_safe
+
+def get_timestamp(modified):
+    return calendar.timegm(modified.utctimetuple())
+
+def is_not_modified(request, etag, modified):
+    """
+    Checks If-None-Match (or If-Modified-Since if there is no If-None-Match) of GET request against
+    validators of current response.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+    return if_modified_since is not None and modified is not None and get_timestamp(modified) <= if_modified_since
+
+def set_validators(response, etag, modified):
+    response['ETag'] = quote_etag(etag)
+    if modified is not None:
+        response['Last-Modified'] = http_date(get_timestamp(modified))
@@ -0,0 +1,246 @@
+import os
+import glob
+import hashlib
+import zipfile
+import tempfile
+import shapefile
+from vectortools.fsutils import TempDir
+from userlayers.settings import EXPORT_CACHE, EXPORT_CACHE_DIR
+
+PRJ_WGS84 = 'GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]'
+
+#geojson type -> (suffix of shapefile, 2d shape type, 3d shape type)
+SHAPE_TYPES = {
+    'Point': ('point', shapefile.POINT, shapefile.POINTZ),
+    'MultiPoint': ('multipoint', shapefile.MULTIPOINT, shapefile.MULTIPOINTZ),
+    'LineString': ('line', shapefile.POLYLINE, shapefile.POLYLINEZ),
+    'MultiLineString': ('line', shapefile.POLYLINE, shapefile.POLYLINEZ),
+    'Polygon': ('polygon', shapefile.POLYGON, shapefile.POLYGONZ),
+    'MultiPolygon': ('polygon', shapefile.POLYGON, shapefile.POLYGONZ),
+}
+NULL_SHAPE_TYPE = ('null', shapefile.NULL, shapefile.NULL)
+
+#django internal field type -> dbf field (type, size, decimal)
+DBF_FIELD_TYPES = {
+    'AutoField': ('N', 18, 0),
+    'IntegerField': ('N', 18, 0),
+    'BigIntegerField': ('N', 18, 0),
+    'SmallIntegerField': ('N', 18, 0),
+    'PositiveIntegerField': ('N', 18, 0),
+    'PositiveSmallIntegerField': ('N', 18, 0),
+    'FloatField': ('N', 24, 15),
+    'DecimalField': ('N', 24, 15),
+    'BooleanField': ('L', 1, 0),
+    'NullBooleanField': ('L', 1, 0),
+    'DateField': ('D', 8, 0),
+}
+
+def dbf_field_for_value(value):
+    if isinstance(value, bool):
+        return ('L', 1, 0)
+    if isinstance(value, (int, long)):
+        return ('N', 18, 0)
+    if isinstance(value, float):
+        return ('N', 24, 15)
+    return None
+
+def dbf_fields_for_model(model_class):
+    return dict((f.name, DBF_FIELD_TYPES[f.get_internal_type()]) for f in model_class._meta.fields
+                if f.get_internal_type() in DBF_FIELD_TYPES)
+
+def signed_area(ring):
+    area = 0
+    for (x1, y1), (x2, y2) in zip((p[:2] for p in ring), (p[:2] for p in ring[1:])):
+        area += x1 * y2 - x2 * y1
+    return area / 2.0
+
+def orient(ring, clockwise):
+    if (signed_area(ring) < 0) != clockwise:
+        return ring[::-1]
+    return ring
+
+class ShapefileWriter(object):
+    """
+    Writes GeoJSON-like features into shapefiles. Shapefile holds geometries of one kind
+    only, so a separate shapefile is started for every kind of geometry met. Features are
+    written as they come and are not kept in memory.
+    """
+    def __init__(self, path, name, fields=None, encoding='utf8', size=254):
+        self.path = path
+        self.name = name
+        self.fields = fields or {}
+        self.encoding = encoding
+        self.size = size
+        self.writers = {}
+        self.columns = None
+
+    def trunc_value(self, value):
+        #utf8 uses up to 4 bytes per character, so short strings never need truncation
+        if isinstance(value, basestring) and len(value) * 4 > self.size:
+            return value.encode(self.encoding)[:self.size].decode(self.encoding, 'ignore')
+        return value
+
+    def build_columns(self, properties):
+        columns = []
+        names = set()
+        for key in sorted(properties.keys()):
+            dbf_field = self.fields.get(key) or dbf_field_for_value(properties[key]) or ('C', self.size, 0)
+            name = key[:10]
+            i = 1
+            while name.lower() in names:
+                suffix = str(i)
+                name = key[:10 - len(suffix)] + suffix
+                i += 1
+            names.add(name.lower())
+            columns.append((key, name, dbf_field))
+        return columns
+
+    def get_writer(self, geometry):
+        shape_type = SHAPE_TYPES.get(geometry['type'], NULL_SHAPE_TYPE) if geometry else NULL_SHAPE_TYPE
+        is_3d = shape_type is not NULL_SHAPE_TYPE and self.has_z(geometry)
+        key = (shape_type[0], is_3d)
+        if key not in self.writers:
+            filename = '%s_%s%s' % (self.name, shape_type[0], 'z' if is_3d else '')
+            writer = shapefile.Writer(os.path.join(self.path, filename), shapeType=shape_type[2 if is_3d else 1], encoding=self.encoding)
+            for key_name, name, (ftype, size, decimal) in self.columns:
+                writer.field(name, ftype, size, decimal)
+            with open(os.path.join(self.path, filename + '.prj'), 'w') as f:
+                f.write(PRJ_WGS84)
+            with open(os.path.join(self.path, filename + '.cpg'), 'w') as f:
+                f.write(self.encoding.upper().replace('UTF8', 'UTF-8'))
+            self.writers[key] = writer
+        return self.writers[key]
+
+    def has_z(self, geometry):
+        coords = geometry['coordinates']
+        while coords and isinstance(coords[0], list):
+            coords = coords[0]
+        return len(coords) > 2
+
+    def write_shape(self, writer, geometry):
+        if writer.shapeType == shapefile.NULL:
+            writer.null()
+            return
+        gtype = geometry['type']
+        coords = geometry['coordinates']
+        if gtype == 'Point':
+            writer.shape(self.build_shape(writer.shapeType, [[coords]]))
+        elif gtype in ('MultiPoint', 'LineString'):
+            writer.shape(self.build_shape(writer.shapeType, [coords]))
+        elif gtype == 'MultiLineString':
+            writer.shape(self.build_shape(writer.shapeType, coords))
+        else:
+            polygons = [coords] if gtype == 'Polygon' else coords
+            rings = []
+            for polygon in polygons:
+                rings.append(orient(polygon[0], clockwise=True))
+                rings.extend(orient(ring, clockwise=False) for ring in polygon[1:])
+            writer.shape(self.build_shape(writer.shapeType, rings))
+
+    def build_shape(self, shape_type, parts):
+        shape = shapefile.Shape(shape_type)
+        shape.parts = []
+        shape.points = []
+        for part in parts:
+            shape.parts.append(len(shape.points))
+            shape.points.extend(part)
+        return shape
+
+    def build_record(self, properties):
+        record = []
+        for key, name, (ftype, size, decimal) in self.columns:
+            value = properties.get(key)
+            if value is None:
+                value = ''
+            elif ftype == 'C':
+                value = self.trunc_value(value if isinstance(value, basestring) else unicode(value))
+            elif ftype == 'D' and isinstance(value, basestring):
+                value = value[:10].replace('-', '')
+            record.append(value)
+        return record
+
+    def write(self, feature):
+        if self.columns is None:
+            self.columns = self.build_columns(feature['properties'])
+        writer = self.get_writer(feature['geometry'])
+        self.write_shape(writer, feature['geometry'])
+        writer.record(*self.build_record(feature['properties']))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+def write_zipped_shapefile(fileobj, name, features, fields=None, encoding='utf8', size=254):
+    """
+    Writes features into shapefiles in temporary directory and packs them into zip archive
+    written to fileobj.
+    """
+    tmp_dir = TempDir()
+    writer = ShapefileWriter(tmp_dir.path, name, fields, encoding, size)
+    for feature in features:
+        writer.write(feature)
+    if not writer.writers:
+        #empty layer still gets a shapefile, dbf requires at least one column
+        writer.columns = writer.build_columns(dict.fromkeys(fields or ['id']))
+        writer.get_writer(None)
+    writer.close()
+    zf = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+    for filename in sorted(os.listdir(tmp_dir.path)):
+        zf.write(os.path.join(tmp_dir.path, filename), filename)
+    zf.close()
+
+class ExportCache(object):
+    """
+    On-disk cache of finished export archives. Archive names start with table pk and data
+    version followed by digest of the key (query, paging, schema version); archives of older
+    versions of the table are removed when a new one is stored.
+    """
+    def __init__(self, path=EXPORT_CACHE_DIR, enabled=EXPORT_CACHE):
+        self.path = path
+        self.enabled = enabled
+
+    def get_filename(self, table_pk, version, key):
+        digest = hashlib.md5(repr(key)).hexdigest()
+        return os.path.join(self.path, '%s-%s-%s' % (table_pk, version, digest))
+
+    def get_or_build(self, write, table_pk, version, key=None):
+        """
+        Returns file object of cached archive rewound. If archive is missing it is built by calling write with
+        file object. Results with key None, or all results if cache is disabled, are written to temporary file
+        that is removed on close.
+        """
+        if not self.enabled or key is None:
+            fileobj = tempfile.TemporaryFile()
+            write(fileobj)
+            fileobj.seek(0)
+            return fileobj
+        filename = self.get_filename(table_pk, version, key)
+        try:
+            return open(filename, 'rb')
+        except IOError:
+            pass
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError:
+                pass
+        fd, tmp_filename = tempfile.mkstemp(dir=self.path, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as fileobj:
+                write(fileobj)
+            os.rename(tmp_filename, filename)
+        except:
+            os.remove(tmp_filename)
+            raise
+        self.remove_stale(table_pk, version)
+        return open(filename, 'rb')
+
+    def remove_stale(self, table_pk, version):
+        for filename in glob.glob(os.path.join(self.path, '%s-*' % table_pk)):
+            if not os.path.basename(filename).startswith('%s-%s-' % (table_pk, version)):
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+
+export_cache = ExportCache()
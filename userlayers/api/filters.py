@@ -0,0 +1,94 @@
+from django.db import connection
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSGeometry, Polygon
+from django.contrib.gis.geos.error import GEOSException
+from tastypie.exceptions import BadRequest
+
+SRID = 4326
+
+def parse_bbox(value):
+    try:
+        minx, miny, maxx, maxy = [float(v) for v in value.split(',')]
+    except ValueError:
+        raise BadRequest(u'bbox must be minx,miny,maxx,maxy')
+    if minx > maxx or miny > maxy:
+        raise BadRequest(u'bbox must be minx,miny,maxx,maxy')
+    polygon = Polygon.from_bbox((minx, miny, maxx, maxy))
+    polygon.srid = SRID
+    return polygon
+
+def parse_geometry(value):
+    """
+    Parses GeoJSON or WKT (EWKT, HEXEWKB) geometry, geometries without srid are in WGS 84.
+    """
+    try:
+        geometry = GEOSGeometry(value)
+    except (GEOSException, GDALException, ValueError, TypeError):
+        raise BadRequest(u'intersects must be GeoJSON or WKT geometry')
+    if geometry.srid is None:
+        geometry.srid = SRID
+    return geometry
+
+def spatial_index_where(queryset, field, geometry):
+    """
+    SpatiaLite doesn't use spatial index for spatial lookups on its own, rows are preselected by
+    bounding box through its SpatialIndex virtual table. PostGIS functions use index themselves.
+    """
+    if connection.vendor != 'sqlite' or not getattr(field, 'spatial_index', False):
+        return queryset
+    opts = queryset.model._meta
+    qn = connection.ops.quote_name
+    where = ('%s.%s IN (SELECT ROWID FROM SpatialIndex WHERE f_table_name = %%s AND f_geometry_column = %%s '
+             'AND search_frame = GeomFromText(%%s, %%s))' % (qn(opts.db_table), qn(opts.pk.column)))
+    return queryset.extra(where=[where], params=[opts.db_table, field.column, geometry.envelope.wkt, geometry.srid])
+
+def filter_intersects(queryset, field_name, geometry):
+    field = queryset.model._meta.get_field(field_name)
+    queryset = spatial_index_where(queryset, field, geometry)
+    return queryset.filter(**{'%s__intersects' % field_name: geometry})
+
+def apply_spatial_filters(queryset, params, field_name):
+    """
+    Filters queryset by bbox=minx,miny,maxx,maxy and intersects=<geometry> parameters.
+    """
+    for param, parse in (('bbox', parse_bbox), ('intersects', parse_geometry)):
+        value = params.get(param)
+        if value:
+            queryset = filter_intersects(queryset, field_name, parse(value))
+    return queryset
+
+#lookups of attribute filters by kind of column
+COMPARISON_LOOKUPS = ('exact', 'in', 'range', 'gt', 'gte', 'lt', 'lte', 'isnull')
+TEXT_LOOKUPS = ('exact', 'in', 'icontains', 'istartswith', 'isnull')
+BOOLEAN_LOOKUPS = ('exact', 'isnull')
+TEXT_TYPES = ('CharField', 'TextField', 'EmailField', 'URLField', 'SlugField')
+BOOLEAN_TYPES = ('BooleanField', 'NullBooleanField')
+
+def attribute_filtering(fields):
+    """
+    Returns tastypie filtering of model fields: field name -> allowed lookups.
+    """
+    filtering = {}
+    for f in fields:
+        internal_type = f.get_internal_type()
+        if internal_type in TEXT_TYPES:
+            filtering[f.name] = TEXT_LOOKUPS
+        elif internal_type in BOOLEAN_TYPES:
+            filtering[f.name] = BOOLEAN_LOOKUPS
+        elif internal_type != 'FileField':
+            filtering[f.name] = COMPARISON_LOOKUPS
+    return filtering
+
+def parse_sparse_fields(params, names):
+    """
+    Returns names of fields selected by fields=<name>,<name> (None if all of them are) and whether
+    geometry is selected (it is unless geometry=false is given).
+    """
+    selected = None
+    if params.get('fields'):
+        selected = [name.strip() for name in params['fields'].split(',') if name.strip()]
+        unknown = [name for name in selected if name not in names]
+        if unknown:
+            raise BadRequest(u'unknown fields: %s' % u', '.join(unknown))
+    with_geometry = (params.get('geometry') or '').lower() not in ('false', '0')
+    return selected, with_geometry
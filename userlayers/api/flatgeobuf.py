@@ -0,0 +1,393 @@
+import struct
+import shutil
+import tempfile
+from array import array
+from django.utils.encoding import force_text
+
+CONTENT_TYPE = 'application/flatgeobuf'
+MAGIC = b'fgb\x03fgb\x00'
+#features per node of packed Hilbert R-tree index
+INDEX_NODE_SIZE = 16
+HILBERT_MAX = (1 << 16) - 1
+
+#header.fbs GeometryType
+GEOMETRY_TYPES = {
+    'Point': 1,
+    'LineString': 2,
+    'Polygon': 3,
+    'MultiPoint': 4,
+    'MultiLineString': 5,
+    'MultiPolygon': 6,
+    'GeometryCollection': 7,
+}
+
+#header.fbs ColumnType
+BOOL, LONG, DOUBLE, STRING, DATETIME = 2, 7, 10, 11, 13
+
+#django internal field type -> column type
+COLUMN_TYPES = {
+    'AutoField': LONG,
+    'IntegerField': LONG,
+    'BigIntegerField': LONG,
+    'SmallIntegerField': LONG,
+    'PositiveIntegerField': LONG,
+    'PositiveSmallIntegerField': LONG,
+    'FloatField': DOUBLE,
+    'DecimalField': DOUBLE,
+    'BooleanField': BOOL,
+    'NullBooleanField': BOOL,
+    'DateField': DATETIME,
+    'DateTimeField': DATETIME,
+}
+
+SCALARS = {
+    'bool': ('<B', 1),
+    'ubyte': ('<B', 1),
+    'ushort': ('<H', 2),
+    'int': ('<i', 4),
+    'ulong': ('<Q', 8),
+}
+VECTORS = {
+    '[ubyte]': ('B', 1),
+    '[uint]': ('I', 4),
+    '[double]': ('d', 8),
+}
+
+class Table(object):
+    """
+    FlatBuffers table: list of (field index, kind, value), fields with value None are absent.
+    """
+    def __init__(self, *fields):
+        self.fields = [f for f in fields if f[2] is not None]
+
+class FlatBufferBuilder(object):
+    """
+    Writes size prefixed FlatBuffer front to back: vtable, table, then objects referenced by the
+    table, so all offsets point forward as FlatBuffers requires. Offsets are aligned to the
+    start of the buffer.
+    """
+    def __init__(self):
+        self.buf = bytearray()
+
+    def pad(self, alignment, extra=0):
+        while (len(self.buf) + extra) % alignment:
+            self.buf.append(0)
+
+    def finish(self, table):
+        self.buf.extend(b'\0' * 8)
+        root = self.write_table(table)
+        struct.pack_into('<I', self.buf, 4, root - 4)
+        self.pad(4)
+        struct.pack_into('<I', self.buf, 0, len(self.buf) - 4)
+        return bytes(self.buf)
+
+    def write_table(self, table):
+        inline = []
+        size = 4
+        for field in sorted(table.fields, key=lambda f: -SCALARS.get(f[1], (None, 4))[1]):
+            field_size = SCALARS.get(field[1], (None, 4))[1]
+            size = (size + field_size - 1) // field_size * field_size
+            inline.append((field, size))
+            size += field_size
+        count = max([f[0] for f in table.fields] or [-1]) + 1
+        vtable = [4 + 2 * count, size] + [0] * count
+        for (index, kind, value), offset in inline:
+            vtable[2 + index] = offset
+        self.pad(2)
+        vtable_pos = len(self.buf)
+        self.buf.extend(struct.pack('<%dH' % len(vtable), *vtable))
+        self.pad(8)
+        table_pos = len(self.buf)
+        self.buf.extend(b'\0' * size)
+        struct.pack_into('<i', self.buf, table_pos, table_pos - vtable_pos)
+        refs = []
+        for (index, kind, value), offset in inline:
+            if kind in SCALARS:
+                struct.pack_into(SCALARS[kind][0], self.buf, table_pos + offset, value)
+            else:
+                refs.append((table_pos + offset, kind, value))
+        for pos, kind, value in refs:
+            struct.pack_into('<I', self.buf, pos, self.write_ref(kind, value) - pos)
+        return table_pos
+
+    def write_ref(self, kind, value):
+        if kind == 'table':
+            return self.write_table(value)
+        if kind == 'string':
+            data = force_text(value).encode('utf8')
+            self.pad(4)
+            pos = len(self.buf)
+            self.buf.extend(struct.pack('<I', len(data)))
+            self.buf.extend(data)
+            self.buf.append(0)
+            return pos
+        if kind == '[table]':
+            self.pad(4)
+            pos = len(self.buf)
+            self.buf.extend(struct.pack('<I', len(value)))
+            self.buf.extend(b'\0' * 4 * len(value))
+            for i, table in enumerate(value):
+                item = pos + 4 + 4 * i
+                struct.pack_into('<I', self.buf, item, self.write_table(table) - item)
+            return pos
+        code, size = VECTORS[kind]
+        #elements following the length are aligned to their size
+        self.pad(max(size, 4), extra=4)
+        pos = len(self.buf)
+        self.buf.extend(struct.pack('<I', len(value)))
+        if kind == '[ubyte]':
+            self.buf.extend(value)
+        else:
+            self.buf.extend(struct.pack('<%d%s' % (len(value), code), *value))
+        return pos
+
+def hilbert(x, y):
+    """
+    Position of point (x, y) of 16 bit grid on Hilbert curve.
+    """
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+
+    return (i1 << 1) | i0
+
+def level_bounds(num_items, node_size):
+    """
+    Returns [(start, end)] of nodes of every level of packed R-tree, from leaves up to the root.
+    Root is the first node, leaves are the last ones.
+    """
+    n = num_items
+    num_nodes = n
+    level_num_nodes = [n]
+    while True:
+        n = (n + node_size - 1) // node_size
+        num_nodes += n
+        level_num_nodes.append(n)
+        if n == 1:
+            break
+    bounds = []
+    for size in level_num_nodes:
+        bounds.append((num_nodes - size, num_nodes))
+        num_nodes -= size
+    return bounds
+
+def iter_coordinates(geometry):
+    if geometry['type'] == 'GeometryCollection':
+        for child in geometry['geometries']:
+            for point in iter_coordinates(child):
+                yield point
+        return
+    coordinates = geometry['coordinates']
+    if geometry['type'] == 'Point':
+        coordinates = [coordinates]
+    while coordinates and isinstance(coordinates[0][0], (list, tuple)):
+        coordinates = [p for part in coordinates for p in part]
+    for point in coordinates:
+        yield point
+
+class FlatGeobufWriter(object):
+    """
+    Writes GeoJSON-like features as FlatGeobuf with packed Hilbert R-tree index. Index and header
+    (extent, count) precede features in the file, so encoded features are collected in temporary file
+    first and copied in Hilbert order by close(); only bounding boxes and offsets are kept in memory.
+    columns are (name, column type) pairs, feature id is written as "id" column.
+    """
+    def __init__(self, fileobj, name, columns, geometry_type=None, has_z=False, index_node_size=INDEX_NODE_SIZE):
+        self.fileobj = fileobj
+        self.name = name
+        self.columns = [('id', LONG)] + [c for c in columns if c[0] != 'id']
+        self.column_index = dict((c[0], i) for i, c in enumerate(self.columns))
+        #OGC names of django geometry fields are upper case
+        self.geometry_type = dict((k.upper(), v) for k, v in GEOMETRY_TYPES.items()).get((geometry_type or '').upper(), 0)
+        self.has_z = has_z
+        self.index_node_size = index_node_size
+        self.features = tempfile.TemporaryFile()
+        self.boxes = array('d')
+        self.sizes = array('L')
+
+    def build_geometry(self, geometry):
+        gtype = geometry['type']
+        if gtype in ('GeometryCollection', 'MultiPolygon'):
+            if gtype == 'GeometryCollection':
+                parts = [self.build_geometry(g) for g in geometry['geometries']]
+            else:
+                parts = [self.build_geometry({'type': 'Polygon', 'coordinates': c}) for c in geometry['coordinates']]
+            return Table((6, 'ubyte', GEOMETRY_TYPES[gtype]), (7, '[table]', parts))
+        coordinates = geometry['coordinates']
+        ends = None
+        if gtype == 'Point':
+            points = [coordinates]
+        elif gtype in ('LineString', 'MultiPoint'):
+            points = coordinates
+        else:
+            points = [p for line in coordinates for p in line]
+            if len(coordinates) > 1:
+                ends = []
+                for line in coordinates:
+                    ends.append((ends[-1] if ends else 0) + len(line))
+        xy = [c for p in points for c in p[:2]]
+        z = [p[2] if len(p) > 2 else 0.0 for p in points] if self.has_z else None
+        return Table((0, '[uint]', ends), (1, '[double]', xy), (2, '[double]', z), (6, 'ubyte', GEOMETRY_TYPES[gtype]))
+
+    def build_properties(self, feature):
+        buf = bytearray()
+        values = dict(feature['properties'], id=feature.get('id'))
+        for i, (name, column_type) in enumerate(self.columns):
+            value = values.get(name)
+            if value is None:
+                continue
+            buf.extend(struct.pack('<H', i))
+            if column_type == BOOL:
+                buf.extend(struct.pack('<B', bool(value)))
+            elif column_type == LONG:
+                buf.extend(struct.pack('<q', int(value)))
+            elif column_type == DOUBLE:
+                buf.extend(struct.pack('<d', float(value)))
+            else:
+                data = (value.isoformat() if hasattr(value, 'isoformat') else force_text(value)).encode('utf8')
+                buf.extend(struct.pack('<I', len(data)))
+                buf.extend(data)
+        return buf
+
+    def write(self, feature):
+        geometry = feature.get('geometry')
+        if geometry:
+            points = list(iter_coordinates(geometry))
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            box = (min(xs), min(ys), max(xs), max(ys)) if points else (float('nan'),) * 4
+        else:
+            box = (float('nan'),) * 4
+        table = Table((0, 'table', self.build_geometry(geometry) if geometry else None),
+                      (1, '[ubyte]', self.build_properties(feature) or None))
+        data = FlatBufferBuilder().finish(table)
+        self.features.write(data)
+        self.boxes.extend(box)
+        self.sizes.append(len(data))
+
+    def get_extent(self):
+        boxes = self.boxes
+        #nan fails every comparison, boxes of features without geometry are skipped
+        minxs = [boxes[i] for i in range(0, len(boxes), 4) if boxes[i] == boxes[i]]
+        if not minxs:
+            return None
+        return (min(minxs), min(boxes[i] for i in range(1, len(boxes), 4) if boxes[i] == boxes[i]),
+                max(boxes[i] for i in range(2, len(boxes), 4) if boxes[i] == boxes[i]),
+                max(boxes[i] for i in range(3, len(boxes), 4) if boxes[i] == boxes[i]))
+
+    def get_box(self, i, extent):
+        box = tuple(self.boxes[i * 4:i * 4 + 4])
+        if box[0] != box[0]:
+            #features without geometry are indexed as a point at the corner of extent
+            return (extent[0], extent[1], extent[0], extent[1])
+        return box
+
+    def build_header(self, count, extent):
+        columns = [Table((0, 'string', name), (1, 'ubyte', column_type)) for name, column_type in self.columns]
+        crs = Table((0, 'string', 'EPSG'), (1, 'int', 4326))
+        return Table((0, 'string', self.name),
+                     (1, '[double]', list(extent) if extent else None),
+                     (2, 'ubyte', self.geometry_type),
+                     (3, 'bool', int(self.has_z)),
+                     (7, '[table]', columns),
+                     (8, 'ulong', count),
+                     (9, 'ushort', self.index_node_size if count else 0),
+                     (10, 'table', crs))
+
+    def sort_order(self, count, extent):
+        if not extent:
+            return range(count)
+        minx, miny = extent[0], extent[1]
+        width, height = extent[2] - minx, extent[3] - miny
+        values = []
+        for i in range(count):
+            box = self.get_box(i, extent)
+            x = int(HILBERT_MAX * ((box[0] + box[2]) / 2 - minx) / width) if width else 0
+            y = int(HILBERT_MAX * ((box[1] + box[3]) / 2 - miny) / height) if height else 0
+            values.append(hilbert(x, y))
+        return sorted(range(count), key=values.__getitem__)
+
+    def write_index(self, order, extent):
+        bounds = level_bounds(len(order), self.index_node_size)
+        nodes = [None] * bounds[0][1]
+        start = bounds[0][0]
+        offset = 0
+        for n, i in enumerate(order):
+            nodes[start + n] = self.get_box(i, extent) + (offset,)
+            offset += self.sizes[i]
+        for level in range(len(bounds) - 1):
+            pos, end = bounds[level]
+            parent = bounds[level + 1][0]
+            while pos < end:
+                children = nodes[pos:min(pos + self.index_node_size, end)]
+                nodes[parent] = (min(c[0] for c in children), min(c[1] for c in children),
+                                 max(c[2] for c in children), max(c[3] for c in children), pos)
+                pos += len(children)
+                parent += 1
+        for node in nodes:
+            self.fileobj.write(struct.pack('<ddddQ', *node))
+
+    def close(self):
+        count = len(self.sizes)
+        extent = self.get_extent()
+        self.fileobj.write(MAGIC)
+        self.fileobj.write(FlatBufferBuilder().finish(self.build_header(count, extent)))
+        if count and self.index_node_size:
+            order = self.sort_order(count, extent or (0, 0, 0, 0))
+            self.write_index(order, extent or (0, 0, 0, 0))
+            offsets = []
+            offset = 0
+            for size in self.sizes:
+                offsets.append(offset)
+                offset += size
+            for i in order:
+                self.features.seek(offsets[i])
+                self.fileobj.write(self.features.read(self.sizes[i]))
+        else:
+            self.features.seek(0)
+            shutil.copyfileobj(self.features, self.fileobj)
+        self.features.close()
+
+def write_flatgeobuf(fileobj, name, features, columns, geometry_type=None, has_z=False):
+    writer = FlatGeobufWriter(fileobj, name, columns, geometry_type, has_z)
+    for feature in features:
+        writer.write(feature)
+    writer.close()
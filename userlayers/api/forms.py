@@ -8,6 +8,7 @@ import mutant.contrib.related.models
 import mutant.contrib.web.models
 import mutant.contrib.temporal.models
 from django import forms
+from userlayers.models import ImportJob
 from .naming import normalize_field_name
 
 GEOMETRY_FIELD_TYPES = (
@@ -51,6 +52,8 @@ FIELD_TYPES = (
 class FieldForm(forms.ModelForm):
     type = forms.ChoiceField(choices=FIELD_TYPES)
     table = forms.CharField(required=False)
+    indexed = forms.BooleanField(required=False)
+    unique = forms.BooleanField(required=False)
     
     class Meta:
         model = mutant.models.FieldDefinition
@@ -62,9 +65,31 @@ class FieldForm(forms.ModelForm):
     def clean_table(self):
         return self.cleaned_data['table'] or None 
 
+    def clean(self):
+        cleaned_data = super(FieldForm, self).clean()
+        if cleaned_data.get('type') in dict(GEOMETRY_FIELD_TYPES) and (cleaned_data.get('indexed') or cleaned_data.get('unique')):
+            raise forms.ValidationError(u'geometry fields have spatial index')
+        return cleaned_data
+
 class TableFromFileForm(forms.Form):
     file = forms.FileField()
-    name = forms.CharField()
+    name = forms.CharField(required=False)
+    #URI of existing table file is imported into
+    table = forms.CharField(required=False)
+    mode = forms.ChoiceField(choices=ImportJob.MODE_CHOICES, required=False)
+    key = forms.CharField(required=False)
+
+    def clean(self):
+        cleaned_data = super(TableFromFileForm, self).clean()
+        mode = cleaned_data.get('mode') or (ImportJob.MODE_APPEND if cleaned_data.get('table') else ImportJob.MODE_CREATE)
+        cleaned_data['mode'] = mode
+        if mode == ImportJob.MODE_CREATE and not cleaned_data.get('name'):
+            self.add_error('name', self.fields['name'].error_messages['required'])
+        if mode != ImportJob.MODE_CREATE and not cleaned_data.get('table'):
+            self.add_error('table', u'table is required by %s mode' % mode)
+        if mode == ImportJob.MODE_UPSERT and not cleaned_data.get('key'):
+            self.add_error('key', u'key column is required by upsert mode')
+        return cleaned_data
 
 class TableForm(forms.Form):
     name = forms.CharField()
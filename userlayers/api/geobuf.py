@@ -0,0 +1,150 @@
+import struct
+import decimal
+import tempfile
+import shutil
+from django.utils.encoding import force_text
+from .pbf import write_varint, write_key, write_bytes, write_packed, zigzag
+
+CONTENT_TYPE = 'application/x-geobuf'
+#coordinates are stored as integers, decoders in javascript lose digits beyond 2 ** 53
+MAX_PRECISION = 9
+
+#geobuf.proto Data.Geometry.Type
+GEOMETRY_TYPES = {
+    'Point': 0,
+    'MultiPoint': 1,
+    'LineString': 2,
+    'MultiLineString': 3,
+    'Polygon': 4,
+    'MultiPolygon': 5,
+    'GeometryCollection': 6,
+}
+
+def encode_value(value):
+    buf = bytearray()
+    if isinstance(value, bool):
+        write_key(buf, 5, 0)
+        write_varint(buf, int(value))
+    elif isinstance(value, (int, long)):
+        write_key(buf, 3 if value >= 0 else 4, 0)
+        write_varint(buf, abs(value))
+    elif isinstance(value, (float, decimal.Decimal)):
+        write_key(buf, 2, 1)
+        buf.extend(struct.pack('<d', float(value)))
+    else:
+        write_bytes(buf, 1, force_text(value).encode('utf8'))
+    return buf
+
+class GeobufWriter(object):
+    """
+    Writes GeoJSON-like features as geobuf FeatureCollection. Protobuf message needs its length before
+    its content, so encoded features are collected in temporary file, which is appended to the header
+    by close(). Keys of properties are known up front, features are not kept in memory.
+    """
+    def __init__(self, fileobj, keys, dimensions=2, precision=6):
+        self.fileobj = fileobj
+        self.keys = list(keys)
+        self.key_index = dict((k, i) for i, k in enumerate(self.keys))
+        self.dimensions = dimensions
+        self.precision = min(precision, MAX_PRECISION)
+        self.e = 10 ** self.precision
+        self.features = tempfile.TemporaryFile()
+        self.size = 0
+
+    def add_point(self, coords, point):
+        for i in range(self.dimensions):
+            coords.append(int(round(point[i] * self.e)) if i < len(point) else 0)
+
+    def add_line(self, coords, points, closed=False):
+        #coordinates are delta-encoded within every line
+        sums = [0] * self.dimensions
+        for point in points[:-1] if closed else points:
+            for i in range(self.dimensions):
+                n = (int(round(point[i] * self.e)) if i < len(point) else 0) - sums[i]
+                coords.append(n)
+                sums[i] += n
+
+    def encode_geometry(self, geometry):
+        buf = bytearray()
+        gtype = geometry['type']
+        write_key(buf, 1, 0)
+        write_varint(buf, GEOMETRY_TYPES[gtype])
+        if gtype == 'GeometryCollection':
+            for child in geometry['geometries']:
+                write_bytes(buf, 4, self.encode_geometry(child))
+            return buf
+        coordinates = geometry['coordinates']
+        coords = []
+        lengths = []
+        if gtype == 'Point':
+            self.add_point(coords, coordinates)
+        elif gtype in ('MultiPoint', 'LineString'):
+            self.add_line(coords, coordinates)
+        elif gtype in ('MultiLineString', 'Polygon'):
+            closed = gtype == 'Polygon'
+            if len(coordinates) != 1:
+                lengths = [len(line) - closed for line in coordinates]
+            for line in coordinates:
+                self.add_line(coords, line, closed)
+        else:
+            if len(coordinates) != 1 or len(coordinates[0]) != 1:
+                lengths.append(len(coordinates))
+                for polygon in coordinates:
+                    lengths.append(len(polygon))
+                    lengths.extend(len(ring) - 1 for ring in polygon)
+            for polygon in coordinates:
+                for ring in polygon:
+                    self.add_line(coords, ring, closed=True)
+        if lengths:
+            write_packed(buf, 2, lengths)
+        if coords:
+            write_packed(buf, 3, [zigzag(c) for c in coords])
+        return buf
+
+    def encode_feature(self, feature):
+        buf = bytearray()
+        if feature.get('geometry'):
+            write_bytes(buf, 1, self.encode_geometry(feature['geometry']))
+        pk = feature.get('id')
+        if isinstance(pk, (int, long)):
+            write_key(buf, 12, 0)
+            write_varint(buf, zigzag(pk))
+        elif pk is not None:
+            write_bytes(buf, 11, force_text(pk).encode('utf8'))
+        properties = []
+        for key, value in sorted(feature['properties'].items()):
+            if value is None or key not in self.key_index:
+                continue
+            write_bytes(buf, 13, encode_value(value))
+            properties.extend((self.key_index[key], len(properties) // 2))
+        if properties:
+            write_packed(buf, 14, properties)
+        return buf
+
+    def write(self, feature):
+        buf = bytearray()
+        #FeatureCollection.features
+        write_bytes(buf, 1, self.encode_feature(feature))
+        self.features.write(bytes(buf))
+        self.size += len(buf)
+
+    def close(self):
+        buf = bytearray()
+        for key in self.keys:
+            write_bytes(buf, 1, force_text(key).encode('utf8'))
+        write_key(buf, 2, 0)
+        write_varint(buf, self.dimensions)
+        write_key(buf, 3, 0)
+        write_varint(buf, self.precision)
+        write_key(buf, 4, 2)
+        write_varint(buf, self.size)
+        self.fileobj.write(bytes(buf))
+        self.features.seek(0)
+        shutil.copyfileobj(self.features, self.fileobj)
+        self.features.close()
+
+def write_geobuf(fileobj, features, keys, dimensions=2, precision=6):
+    writer = GeobufWriter(fileobj, keys, dimensions, precision)
+    for feature in features:
+        writer.write(feature)
+    writer.close()
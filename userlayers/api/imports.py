@@ -0,0 +1,566 @@
+import re
+import os
+import json
+import time
+import datetime
+import itertools
+from collections import OrderedDict
+import cchardet as chardet
+from osgeo import gdal, ogr
+from django.core.exceptions import ValidationError
+from django.contrib.gis.geos import GEOSGeometry, WKBWriter, MultiPoint, MultiLineString, MultiPolygon
+from django.contrib.gis.geos.error import GEOSException
+from django.contrib.gis.gdal import GDALException
+from vectortools.reader import VectorReader, VectorReaderError
+from userlayers.settings import IMPORT_TYPE_SAMPLE_SIZE, MAX_IMPORT_TYPE_SAMPLE_SIZE
+from .naming import normalize_field_name
+
+#ogr field type -> column type, values of other fields are examined
+OGR_FIELD_TYPES = {
+    ogr.OFTInteger: 'integer',
+    getattr(ogr, 'OFTInteger64', ogr.OFTInteger): 'integer',
+    ogr.OFTReal: 'float',
+    ogr.OFTDate: 'date',
+}
+
+#ogr layer geometry type -> geos geometry types layer may contain
+OGR_GEOMETRY_TYPES = {
+    ogr.wkbPoint: ('Point',),
+    ogr.wkbMultiPoint: ('MultiPoint',),
+    ogr.wkbLineString: ('LineString',),
+    ogr.wkbMultiLineString: ('MultiLineString',),
+    ogr.wkbPolygon: ('Polygon',),
+    ogr.wkbMultiPolygon: ('MultiPolygon',),
+    ogr.wkbGeometryCollection: ('GeometryCollection',),
+}
+
+#shapefile stores single and multi part lines (polygons) as one shape type
+SHAPEFILE_GEOMETRY_TYPES = {
+    ogr.wkbLineString: ('LineString', 'MultiLineString'),
+    ogr.wkbPolygon: ('Polygon', 'MultiPolygon'),
+}
+
+#geos geometry type -> geometry column type
+GEOMETRY_TYPES = {
+    'Point': 'point',
+    'MultiPoint': 'multi_point',
+    'LineString': 'line_string',
+    'MultiLineString': 'multi_line_string',
+    'Polygon': 'polygon',
+    'MultiPolygon': 'multi_polygon',
+    'GeometryCollection': 'geometry_collection',
+}
+
+#single part geos geometry type -> multi part geometry type and class
+MULTI_GEOMETRY_TYPES = {
+    'Point': ('MultiPoint', MultiPoint),
+    'LineString': ('MultiLineString', MultiLineString),
+    'Polygon': ('MultiPolygon', MultiPolygon),
+}
+
+#RFC 8142 record separator, it precedes every text sequence record
+RECORD_SEPARATOR = b'\x1e'
+#extensions of newline-delimited GeoJSON files
+GEOJSONSEQ_EXTENSIONS = ('.geojsons', '.geojsonl', '.geojsonseq', '.ndjson', '.jsonl')
+
+INTEGER_RE = re.compile(r'^-?(0|[1-9]\d{0,17})$')
+FLOAT_RE = re.compile(r'^-?(0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?$')
+DATE_RE = re.compile(r'^(\d{4})[-/](\d{2})[-/](\d{2})$')
+BOOLEAN_VALUES = {'true': True, 'false': False}
+
+#django internal type of existing column -> type values are converted to by coerce_value,
+#values of other columns are converted by their model fields
+COLUMN_VALUE_TYPES = {
+    'BigIntegerField': 'integer',
+    'IntegerField': 'integer',
+    'SmallIntegerField': 'integer',
+    'FloatField': 'float',
+    'BooleanField': 'null_boolean',
+    'NullBooleanField': 'null_boolean',
+    'DateField': 'date',
+    'TextField': 'text',
+    'CharField': 'text',
+    'EmailField': 'text',
+    'URLField': 'text',
+    'GenericIPAddressField': 'text',
+    'IPAddressField': 'text',
+}
+
+def parse_date(value):
+    match = DATE_RE.match(value)
+    if not match:
+        raise ValueError(value)
+    return datetime.date(*map(int, match.groups()))
+
+def get_value_type(value):
+    """
+    Returns column type for single value, strings are checked to contain numbers, dates or booleans.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return 'null_boolean'
+    if isinstance(value, (int, long)):
+        return 'integer'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return 'date'
+    if not isinstance(value, basestring):
+        return 'text'
+    if value.lower() in BOOLEAN_VALUES:
+        return 'null_boolean'
+    if INTEGER_RE.match(value):
+        return 'integer'
+    if FLOAT_RE.match(value):
+        return 'float'
+    try:
+        parse_date(value)
+        return 'date'
+    except ValueError:
+        return 'text'
+
+def merge_value_types(a, b):
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if set([a, b]) == set(['integer', 'float']):
+        return 'float'
+    return 'text'
+
+def coerce_value(value, field_type):
+    """
+    Converts value to python type of column, raises ValueError if value does not fit it.
+    """
+    if value is None:
+        return None
+    if field_type == 'text':
+        return value if isinstance(value, basestring) else unicode(value)
+    if value == '':
+        return None
+    if isinstance(value, basestring):
+        if field_type == 'null_boolean':
+            try:
+                return BOOLEAN_VALUES[value.lower()]
+            except KeyError:
+                raise ValueError(value)
+        if field_type == 'integer' and not INTEGER_RE.match(value):
+            raise ValueError(value)
+        if field_type == 'date':
+            return parse_date(value)
+    elif field_type == 'date' or (field_type == 'integer' and isinstance(value, float)):
+        raise ValueError(value)
+    return {'integer': int, 'float': float, 'null_boolean': bool}[field_type](value)
+
+def fit_geometry(geometry, multi_geometry, is_3d):
+    """
+    Converts geometry of single part type of multi_geometry (single part type, multi part class) to multi
+    part one, z coordinates are added or dropped to match is_3d.
+    """
+    if multi_geometry and geometry.geom_type == multi_geometry[0]:
+        geometry = multi_geometry[1](geometry)
+    if is_3d and not geometry.hasz:
+        geom_3d = geometry.ogr
+        geom_3d._set_coord_dim(3)
+        geometry = geom_3d.geos
+    elif not is_3d and geometry.hasz:
+        geometry = GEOSGeometry(WKBWriter().write(geometry))
+    return geometry
+
+def merge_geometry_types(types):
+    """
+    Returns geometry column type for set of geos geometry types, single and multi part geometries of
+    the same kind are stored as multi part ones. None in types stands for unknown type.
+    """
+    if not types or None in types:
+        return 'geometry'
+    if len(types) == 1:
+        return GEOMETRY_TYPES[list(types)[0]]
+    multi_types = set(MULTI_GEOMETRY_TYPES.get(t, (t,))[0] for t in types)
+    if len(multi_types) == 1:
+        return GEOMETRY_TYPES[multi_types.pop()]
+    return 'geometry'
+
+class FileImportError(Exception):
+    pass
+
+class FeatureReader(object):
+    """
+    Reads features of all layers of vector file one at a time straight from OGR, so
+    memory use does not depend on file size.
+    """
+    def __init__(self, path, unicode_errors='replace'):
+        #read raw attribute bytes, encoding is detected in decode()
+        shape_encoding = gdal.GetConfigOption('SHAPE_ENCODING')
+        gdal.SetConfigOption('SHAPE_ENCODING', '')
+        try:
+            self.reader = VectorReader(path)
+        except VectorReaderError:
+            raise FileImportError(u'wrong file format')
+        finally:
+            gdal.SetConfigOption('SHAPE_ENCODING', shape_encoding)
+        self.unicode_errors = unicode_errors
+        self.encoding = None
+
+    def decode(self, value):
+        if not isinstance(value, str):
+            return value
+        if self.encoding:
+            return value.decode(self.encoding, self.unicode_errors)
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            self.encoding = (chardet.detect(value) or {}).get('encoding') or 'utf-8'
+            return value.decode(self.encoding, self.unicode_errors)
+
+    def layers(self):
+        ds = self.reader.ds
+        for i in range(ds.GetLayerCount()):
+            yield ds.GetLayer(i)
+
+    def iter_layer(self, layer):
+        layer.ResetReading()
+        feature = layer.GetNextFeature()
+        while feature is not None:
+            yield feature
+            feature = layer.GetNextFeature()
+
+    def get_layer_fields(self, layer):
+        defn = layer.GetLayerDefn()
+        return [defn.GetFieldDefn(i) for i in range(defn.GetFieldCount())]
+
+    def get_field_types(self):
+        """
+        Returns names of fields of all layers mapped to column types declared by format, None for fields
+        which types have to be inferred from values.
+        """
+        field_types = OrderedDict()
+        for layer in self.layers():
+            for field_defn in self.get_layer_fields(layer):
+                name = self.decode(field_defn.GetName())
+                ftype = OGR_FIELD_TYPES.get(field_defn.GetType())
+                if self.is_boolean_field(field_defn):
+                    ftype = 'null_boolean'
+                if name in field_types and field_types[name] != ftype:
+                    ftype = None
+                field_types[name] = ftype
+        return field_types
+
+    def is_boolean_field(self, field_defn):
+        return hasattr(ogr, 'OFSTBoolean') and field_defn.GetSubType() == ogr.OFSTBoolean
+
+    def get_declared_geometry_types(self):
+        """
+        Returns set of geos geometry types layers are declared to contain (None for unknown type) and 3d flag.
+        Nothing is read from features.
+        """
+        is_shapefile = self.reader.ds.GetDriver().GetName() == 'ESRI Shapefile'
+        types = set()
+        is_3d = False
+        for layer in self.layers():
+            gtype = layer.GetGeomType()
+            flat_type = ogr.GT_Flatten(gtype)
+            is_3d = is_3d or bool(ogr.GT_HasZ(gtype))
+            layer_types = OGR_GEOMETRY_TYPES.get(flat_type, (None,))
+            if is_shapefile:
+                layer_types = SHAPEFILE_GEOMETRY_TYPES.get(flat_type, layer_types)
+            types.update(layer_types)
+        return types, is_3d
+
+    def get_feature_count(self):
+        return sum(layer.GetFeatureCount() for layer in self.layers())
+
+    def __iter__(self):
+        """
+        Yields (properties, geometry) for every feature, geometry is GEOSGeometry or None.
+        """
+        for layer in self.layers():
+            field_defns = self.get_layer_fields(layer)
+            names = [self.decode(f.GetName()) for f in field_defns]
+            boolean_fields = set(i for i, f in enumerate(field_defns) if self.is_boolean_field(f))
+            for feature in self.iter_layer(layer):
+                properties = {}
+                for i, name in enumerate(names):
+                    value = self.decode(feature.GetField(i))
+                    if i in boolean_fields and value is not None:
+                        value = bool(value)
+                    properties[name] = value
+                geom = feature.GetGeometryRef()
+                geometry = None
+                if geom is not None:
+                    try:
+                        geometry = GEOSGeometry(buffer(geom.ExportToWkb()))
+                    except (GEOSException, ValueError):
+                        raise FileImportError(u'file contains wrong geometry')
+                yield properties, geometry
+
+class GeoJSONSeqReader(object):
+    """
+    Reads newline-delimited GeoJSON (GeoJSONSeq, RFC 8142 records or plain lines) one line at a time, so
+    memory use does not depend on file size. The format declares neither property names nor geometry
+    types, so the file is parsed once: names are collected from features read so far (schemas ask for
+    them after reading their type sample) and geometry type is declared unknown.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.field_names = OrderedDict()
+
+    def iter_lines(self):
+        with open(self.path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip().lstrip(RECORD_SEPARATOR).strip()
+                if line:
+                    yield number, line
+
+    def iter_records(self):
+        for number, line in self.iter_lines():
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except (ValueError, UnicodeDecodeError):
+                raise FileImportError(u'line %s is not valid GeoJSON' % number)
+            if not isinstance(record, dict):
+                raise FileImportError(u'line %s is not GeoJSON feature' % number)
+            if record.get('type') == 'FeatureCollection':
+                for feature in record.get('features') or []:
+                    yield number, feature
+            elif record.get('type') == 'Feature':
+                yield number, record
+            else:
+                yield number, {'type': 'Feature', 'properties': {}, 'geometry': record}
+
+    def get_field_types(self):
+        """
+        Returns names of properties of features read so far, types are always inferred from values.
+        """
+        return OrderedDict((name, None) for name in self.field_names)
+
+    def get_declared_geometry_types(self):
+        return set([None]), False
+
+    def get_feature_count(self):
+        #unknown until the whole file is read
+        return None
+
+    def __iter__(self):
+        """
+        Yields (properties, geometry) for every feature, geometry is GEOSGeometry or None.
+        """
+        for number, feature in self.iter_records():
+            properties = {}
+            for name, value in (feature.get('properties') or {}).iteritems():
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value, ensure_ascii=False)
+                properties[name] = value
+                if name not in self.field_names:
+                    self.field_names[name] = None
+            geometry = feature.get('geometry')
+            if geometry:
+                try:
+                    geometry = GEOSGeometry(json.dumps(geometry))
+                except (GEOSException, ValueError, GDALException):
+                    raise FileImportError(u'line %s contains wrong geometry' % number)
+            yield properties, geometry or None
+
+def is_geojsonseq(path):
+    if os.path.splitext(path)[1].lower() in GEOJSONSEQ_EXTENSIONS:
+        return True
+    with open(path, 'rb') as f:
+        return f.read(1) == RECORD_SEPARATOR
+
+def get_feature_reader(path, unicode_errors='replace'):
+    """
+    Returns reader of vector file: newline-delimited GeoJSON is read line by line, other formats by OGR.
+    """
+    if is_geojsonseq(path):
+        return GeoJSONSeqReader(path)
+    return FeatureReader(path, unicode_errors=unicode_errors)
+
+class ImportSchema(object):
+    """
+    Column and geometry types of imported table, inferred in the same pass that inserts features.
+    First sample_size features (at most MAX_IMPORT_TYPE_SAMPLE_SIZE) are parsed and kept in memory until
+    table is created; iterating schema yields them followed by the rest of features, converted to column
+    types. Values of further features that do not fit inferred types are replaced with None and counted
+    in invalid_values, as are values of properties first met after the sample (they have no column).
+    """
+    def __init__(self, reader, sample_size=IMPORT_TYPE_SAMPLE_SIZE):
+        if not 0 < sample_size <= MAX_IMPORT_TYPE_SAMPLE_SIZE:
+            raise ValueError(u'sample_size must be between 1 and %s' % MAX_IMPORT_TYPE_SAMPLE_SIZE)
+        self.reader = reader
+        self.features = iter(reader)
+        self.sample = list(itertools.islice(self.features, sample_size))
+        self.complete = len(self.sample) < sample_size
+        self.invalid_values = 0
+
+        field_types = reader.get_field_types()
+        inferred_types = dict.fromkeys(field_types)
+        geometry_types = set()
+        self.is_3d = False
+        for properties, geometry in self.sample:
+            for name, value in properties.iteritems():
+                if field_types.get(name) is None:
+                    inferred_types[name] = merge_value_types(inferred_types.get(name), get_value_type(value))
+            if geometry is not None:
+                geometry_types.add(geometry.geom_type)
+                self.is_3d = self.is_3d or geometry.hasz
+        self.fields = [{'name': name, 'type': ftype or inferred_types.get(name) or 'text'} for name, ftype in field_types.items()]
+        self.field_types = dict((f['name'], f['type']) for f in self.fields)
+
+        if not self.complete:
+            declared_types, declared_3d = reader.get_declared_geometry_types()
+            geometry_types.update(declared_types)
+            self.is_3d = self.is_3d or declared_3d
+        self.geometry_type = merge_geometry_types(geometry_types)
+        self.multi_geometry = None
+        for single_type, (multi_type, multi_class) in MULTI_GEOMETRY_TYPES.items():
+            if GEOMETRY_TYPES[multi_type] == self.geometry_type:
+                self.multi_geometry = (single_type, multi_class)
+
+    def coerce_properties(self, properties):
+        data = {}
+        for name, value in properties.iteritems():
+            if name not in self.field_types:
+                if value is not None and value != '':
+                    self.invalid_values += 1
+                continue
+            try:
+                data[name] = coerce_value(value, self.field_types[name])
+            except (ValueError, TypeError, OverflowError):
+                self.invalid_values += 1
+                data[name] = None
+        return data
+
+    def coerce_geometry(self, geometry):
+        if geometry is None:
+            return None
+        return fit_geometry(geometry, self.multi_geometry, self.is_3d)
+
+    def __iter__(self):
+        for properties, geometry in itertools.chain(self.sample, self.features):
+            yield self.coerce_properties(properties), self.coerce_geometry(geometry)
+        self.sample = []
+
+class TableImportSchema(object):
+    """
+    Maps features onto columns of existing table: properties are matched to columns by normalized names
+    (properties without column are skipped), values are converted to column types and geometries to
+    geometry type of table. Values and geometries that do not fit are replaced with None and counted
+    in invalid_values. Readers that can't declare property names are sampled as in ImportSchema, values
+    of properties first met after the sample that match a column are counted in invalid_values too.
+    """
+    def __init__(self, reader, model_class, geometry_field_name, sample_size=IMPORT_TYPE_SAMPLE_SIZE):
+        if not 0 < sample_size <= MAX_IMPORT_TYPE_SAMPLE_SIZE:
+            raise ValueError(u'sample_size must be between 1 and %s' % MAX_IMPORT_TYPE_SAMPLE_SIZE)
+        self.reader = reader
+        self.features = iter(reader)
+        self.sample = list(itertools.islice(self.features, sample_size))
+        self.geometry_field = model_class._meta.get_field(geometry_field_name)
+        self.fields = dict((f.name, f) for f in model_class._meta.fields if not f.primary_key and f is not self.geometry_field)
+        #property name -> model field
+        self.columns = OrderedDict()
+        self.skipped = []
+        for name in reader.get_field_types():
+            field = self.fields.get(normalize_field_name(name))
+            if field is not None and field not in self.columns.values():
+                self.columns[name] = field
+            else:
+                self.skipped.append(name)
+        #property name -> whether it matches a column, for properties first met after the sample
+        self.late_properties = dict.fromkeys(self.skipped, False)
+        self.is_3d = self.geometry_field.dim == 3
+        self.multi_geometry = None
+        for single_type, (multi_type, multi_class) in MULTI_GEOMETRY_TYPES.items():
+            if multi_type.upper() == self.geometry_field.geom_type:
+                self.multi_geometry = (single_type, multi_class)
+        self.invalid_values = 0
+
+    def is_late_column(self, name):
+        if name not in self.late_properties:
+            field = self.fields.get(normalize_field_name(name))
+            self.late_properties[name] = field is not None and field not in self.columns.values()
+        return self.late_properties[name]
+
+    def coerce_value(self, value, field):
+        value_type = COLUMN_VALUE_TYPES.get(field.get_internal_type())
+        if value_type:
+            value = coerce_value(value, value_type)
+        elif value == '':
+            value = None
+        elif value is not None:
+            value = field.to_python(value)
+        if isinstance(value, basestring) and field.max_length and len(value) > field.max_length:
+            raise ValueError(value)
+        return value
+
+    def coerce_properties(self, properties):
+        data = {}
+        for name, field in self.columns.iteritems():
+            try:
+                data[field.name] = self.coerce_value(properties.get(name), field)
+            except (ValueError, TypeError, OverflowError, ValidationError):
+                self.invalid_values += 1
+                data[field.name] = None
+        for name, value in properties.iteritems():
+            if name not in self.columns and value is not None and value != '' and self.is_late_column(name):
+                self.invalid_values += 1
+        return data
+
+    def coerce_geometry(self, geometry):
+        if geometry is None:
+            return None
+        geometry = fit_geometry(geometry, self.multi_geometry, self.is_3d)
+        if self.geometry_field.geom_type != 'GEOMETRY' and geometry.geom_type.upper() != self.geometry_field.geom_type:
+            self.invalid_values += 1
+            return None
+        if geometry.srid is None:
+            geometry.srid = self.geometry_field.srid
+        return geometry
+
+    def __iter__(self):
+        for properties, geometry in itertools.chain(self.sample, self.features):
+            yield self.coerce_properties(properties), self.coerce_geometry(geometry)
+        self.sample = []
+
+class ImportStats(object):
+    def __init__(self):
+        self.features = 0
+        self.batches = 0
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self.invalid_values = 0
+        self.started = time.time()
+        self.finished = None
+
+    def add_batch(self, count, created=None, updated=0):
+        """
+        Counts batch of count features, which created and updated rows (all of them are created by default).
+        """
+        self.features += count
+        self.batches += 1
+        self.created += count if created is None else created
+        self.updated += updated
+
+    def finish(self):
+        self.finished = time.time()
+
+    @property
+    def seconds(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def features_per_second(self):
+        return self.features / self.seconds if self.seconds else 0
+
+    def as_dict(self):
+        return {
+            'features': self.features,
+            'batches': self.batches,
+            'created': self.created,
+            'updated': self.updated,
+            'deleted': self.deleted,
+            'invalid_values': self.invalid_values,
+            'seconds': round(self.seconds, 3),
+            'features_per_second': round(self.features_per_second, 1),
+        }
@@ -0,0 +1,123 @@
+import datetime
+import logging
+import threading
+import time
+from django.db import close_old_connections
+from django.utils import timezone
+from userlayers.models import ImportJob
+from userlayers.settings import IMPORT_WORKERS, IMPORT_QUEUE_SIZE, IMPORT_POLL_INTERVAL, JOB_TIMEOUT
+
+logger = logging.getLogger('userlayers.api.jobs')
+
+class WorkerPool(object):
+    """
+    Runs queued jobs (import jobs, schema changes) in background threads of the current process.
+    The job table is the queue: workers claim queued jobs with conditional update, so several
+    processes can share it, and jobs saved in not yet committed transaction are simply picked up later.
+    Threads are started by the first request of process (see UserlayersConfig), so jobs queued before
+    restart are run without waiting for a new one. Heartbeat thread touches updated of jobs running in
+    this process; running jobs not touched for timeout seconds were left by dead process, they are
+    failed and abandon is called with their pks.
+    """
+    def __init__(self, run, model=ImportJob, name='import', workers=IMPORT_WORKERS, queue_size=IMPORT_QUEUE_SIZE,
+                 poll_interval=IMPORT_POLL_INTERVAL, timeout=JOB_TIMEOUT, abandon=None):
+        self.run = run
+        self.model = model
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.abandon = abandon
+        self.threads = []
+        self.running = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def is_full(self):
+        return self.model.objects.filter(status=self.model.STATUS_QUEUED).count() >= self.queue_size
+
+    def claim(self, job_pk):
+        return self.model.objects.filter(pk=job_pk, status=self.model.STATUS_QUEUED).update(status=self.model.STATUS_RUNNING) == 1
+
+    def reclaim(self):
+        """
+        Fails running jobs without heartbeat for timeout seconds.
+        """
+        stale = self.model.objects.filter(status=self.model.STATUS_RUNNING, updated__lt=timezone.now() - datetime.timedelta(seconds=self.timeout))
+        for job_pk in list(stale.values_list('pk', flat=True)):
+            if stale.filter(pk=job_pk).update(status=self.model.STATUS_FAILED, error=u'job was interrupted', updated=timezone.now()) != 1:
+                continue
+            logger.warning('%s job "%s" was abandoned' % (self.name, job_pk))
+            if self.abandon:
+                self.abandon(job_pk)
+
+    def next_job(self):
+        self.reclaim()
+        queued = self.model.objects.filter(status=self.model.STATUS_QUEUED).order_by('created', 'pk')
+        for job_pk in queued.values_list('pk', flat=True)[:self.workers + 1]:
+            if self.claim(job_pk):
+                return job_pk
+        return None
+
+    def start(self):
+        if not self.workers:
+            return
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            targets = [t.name for t in self.threads]
+            name = 'userlayers-%s-heartbeat' % self.name
+            if name not in targets:
+                self.start_thread(self.heartbeat, name)
+            for i in range(self.workers):
+                name = 'userlayers-%s-%s' % (self.name, i)
+                if name not in targets:
+                    self.start_thread(self.work, name)
+
+    def start_thread(self, target, name):
+        t = threading.Thread(target=target, name=name)
+        t.daemon = True
+        t.start()
+        self.threads.append(t)
+
+    def submit(self, job):
+        if not self.workers:
+            if self.claim(job.pk):
+                self.run(job.pk)
+            return
+        self.start()
+        self.wakeup.set()
+
+    def work(self):
+        while True:
+            close_old_connections()
+            try:
+                job_pk = self.next_job()
+            except Exception:
+                logger.exception('could not fetch %s job' % self.name)
+                job_pk = None
+            if job_pk is None:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            self.running.add(job_pk)
+            try:
+                self.run(job_pk)
+            except Exception:
+                logger.exception('%s job "%s" crashed' % (self.name, job_pk))
+            finally:
+                self.running.discard(job_pk)
+                close_old_connections()
+
+    def heartbeat(self):
+        while True:
+            time.sleep(self.poll_interval)
+            pks = list(self.running)
+            if not pks:
+                continue
+            try:
+                self.model.objects.filter(pk__in=pks, status=self.model.STATUS_RUNNING).update(updated=timezone.now())
+            except Exception:
+                logger.exception('could not touch running %s jobs' % self.name)
+            finally:
+                close_old_connections()
@@ -0,0 +1,199 @@
+import json
+import decimal
+import datetime
+import hashlib
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_text
+from tastypie.exceptions import BadRequest
+from tastypie.paginator import Paginator
+from userlayers.settings import CACHE_ALIAS
+
+COUNT_MODES = ('exact', 'cached', 'estimate', 'none')
+
+def dump_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return force_text(value)
+    return value
+
+class TableDataPaginator(Paginator):
+    """
+    Paginator of table data. Besides tastypie's limit/offset it pages by key when "cursor" parameter
+    is given: every page is one index range scan starting after the last row of previous page, so its
+    cost doesn't depend on page depth. Rows are ordered by primary key or by indexed column given
+    in "cursor_field" or "order_by" (then by primary key among equal values, rows with null value
+    come last), other orderings can't be paged by key. meta.next holds opaque signed token of the next page.
+
+    "count" parameter chooses how meta.total_count is computed: "exact" counts rows on every request
+    (default of offset pages), "cached" counts them once per data version, "estimate" takes row count
+    estimated by database planner (PostgreSQL only, other databases fall back to "cached") and "none"
+    skips counting (default of cursor pages).
+    """
+    salt = 'userlayers.api.paginators.cursor'
+
+    def get_data_version(self):
+        """
+        Token changing with table rows, required by "cached" count.
+        """
+        return None
+
+    def is_cursor_request(self):
+        return 'cursor' in self.request_data
+
+    def get_count_mode(self):
+        mode = self.request_data.get('count') or ('none' if self.is_cursor_request() else 'exact')
+        if mode not in COUNT_MODES:
+            raise BadRequest(u'count must be one of %s' % ', '.join(COUNT_MODES))
+        return mode
+
+    def get_count(self):
+        mode = self.get_count_mode()
+        if mode == 'none':
+            return None
+        if not isinstance(self.objects, QuerySet) or mode == 'exact':
+            return super(TableDataPaginator, self).get_count()
+        if mode == 'estimate':
+            count = self.get_estimated_count()
+            if count is not None:
+                return count
+        return self.get_cached_count()
+
+    def get_estimated_count(self):
+        queryset = self.objects.order_by().values_list('pk')
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN (FORMAT JSON) %s' % sql, params)
+        plan = cursor.fetchone()[0]
+        if not isinstance(plan, list):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_cached_count(self):
+        version = self.get_data_version()
+        if version is None:
+            return super(TableDataPaginator, self).get_count()
+        sql, params = self.objects.order_by().query.sql_with_params()
+        key = hashlib.md5(json.dumps([version, sql, [force_text(p) for p in params]])).hexdigest()
+        key = 'userlayers-count-%s' % key
+        cache = caches[CACHE_ALIAS]
+        count = cache.get(key)
+        if count is None:
+            count = self.objects.count()
+            cache.set(key, count, None)
+        return count
+
+    def get_next(self, limit, offset, count):
+        if count is None or self.get_count_mode() == 'estimate':
+            #count isn't exact, look for a row after the page instead
+            if not self.objects[offset + limit:offset + limit + 1]:
+                return None
+            return self._generate_uri(limit, offset + limit)
+        return super(TableDataPaginator, self).get_next(limit, offset, count)
+
+    def get_cursor_field(self, name):
+        opts = self.objects.model._meta
+        if name in (None, '', 'pk', opts.pk.name):
+            return opts.pk
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            raise BadRequest(u'unknown cursor field "%s"' % name)
+        if not (field.primary_key or field.db_index or field.unique):
+            raise BadRequest(u'cursor field must be indexed')
+        return field
+
+    def get_order_by(self):
+        if hasattr(self.request_data, 'getlist'):
+            return [name for name in self.request_data.getlist('order_by') if name]
+        return [self.request_data['order_by']] if self.request_data.get('order_by') else []
+
+    def check_ordering(self, field):
+        order_by = self.get_order_by()
+        if order_by and (len(order_by) > 1 or self.get_cursor_field(order_by[0].lstrip('-')) != field or order_by[0].startswith('-')):
+            raise BadRequest(u'cursor pages can be ordered only by cursor field in ascending order')
+
+    def decode_cursor(self, token):
+        """
+        Returns field, value and primary key of the last row of previous page, (field, None, None) for the first page.
+        """
+        if not token:
+            order_by = self.get_order_by()
+            name = self.request_data.get('cursor_field') or (order_by[0] if len(order_by) == 1 else None)
+            return self.get_cursor_field(name), None, None
+        try:
+            data = signing.loads(token, salt=self.salt)
+            field = self.get_cursor_field(data['f'])
+            value = field.to_python(data['v']) if data['v'] is not None else None
+            return field, value, int(data['pk'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise BadRequest(u'invalid cursor')
+
+    def encode_cursor(self, field, obj):
+        value = None if field.primary_key else dump_value(getattr(obj, field.attname))
+        data = {'f': field.name, 'v': value, 'pk': obj.pk}
+        return signing.dumps(data, salt=self.salt, compress=True)
+
+    def get_cursor_slice(self, limit, field, value, last_pk):
+        objects = self.objects
+        if field.primary_key:
+            if last_pk is not None:
+                objects = objects.filter(pk__gt=last_pk)
+            return list(objects.order_by('pk')[:limit])
+        nulls = objects.filter(**{'%s__isnull' % field.name: True}).order_by('pk')
+        page = []
+        if last_pk is None or value is not None:
+            values = objects.filter(**{'%s__isnull' % field.name: False})
+            if last_pk is not None:
+                values = values.filter(Q(**{'%s__gt' % field.name: value}) | Q(**{field.name: value, 'pk__gt': last_pk}))
+            page = list(values.order_by(field.name, 'pk')[:limit])
+        elif last_pk is not None:
+            nulls = nulls.filter(pk__gt=last_pk)
+        if len(page) < limit:
+            page += list(nulls[:limit - len(page)])
+        return page
+
+    def get_cursor_uri(self, limit, token):
+        request_params = self.request_data.copy()
+        for name in ('limit', 'offset', 'cursor', 'cursor_field'):
+            if name in request_params:
+                del request_params[name]
+        request_params.update({'limit': limit, 'cursor': token})
+        return '%s?%s' % (self.resource_uri, request_params.urlencode())
+
+    def cursor_page(self):
+        if not isinstance(self.objects, QuerySet):
+            #authorization may replace queryset with plain list
+            return super(TableDataPaginator, self).page()
+        limit = self.get_limit() or self.limit or getattr(settings, 'API_LIMIT_PER_PAGE', 20)
+        field, value, last_pk = self.decode_cursor(self.request_data.get('cursor'))
+        self.check_ordering(field)
+        objects = self.get_cursor_slice(limit + 1, field, value, last_pk)
+        meta = {
+            'limit': limit,
+            'total_count': self.get_count(),
+            'previous': None,
+            'next': None,
+        }
+        if len(objects) > limit:
+            objects = objects[:limit]
+            if self.resource_uri is not None:
+                meta['next'] = self.get_cursor_uri(limit, self.encode_cursor(field, objects[-1]))
+        return {
+            self.collection_name: objects,
+            'meta': meta,
+        }
+
+    def page(self):
+        if self.is_cursor_request():
+            return self.cursor_page()
+        return super(TableDataPaginator, self).page()
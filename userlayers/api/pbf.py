@@ -0,0 +1,24 @@
+#minimal protocol buffers encoding used by vector tiles and geobuf output
+
+def write_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def write_key(buf, field, wire_type):
+    write_varint(buf, (field << 3) | wire_type)
+
+def write_bytes(buf, field, data):
+    write_key(buf, field, 2)
+    write_varint(buf, len(data))
+    buf.extend(data)
+
+def write_packed(buf, field, values):
+    data = bytearray()
+    for value in values:
+        write_varint(data, value)
+    write_bytes(buf, field, data)
+
+def zigzag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
@@ -1,19 +1,25 @@
 import os
-import json
+import hashlib
 import mutant
 import logging
+from wsgiref.util import FileWrapper
 
 from django.contrib.gis.gdal import GDALException
 from django.forms.models import modelform_factory
 from django.conf import settings
 from django.conf.urls import url
-from django.core.urlresolvers import reverse
+from django.core.urlresolvers import reverse, resolve, get_script_prefix, Resolver404
+from django.core.management.color import no_style
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.http.response import HttpResponse
+from django.http import HttpRequest
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django.contrib.gis.geos import GEOSGeometry, WKBWriter
-from django.contrib.gis.geos.error import GEOSException
 from django.contrib.contenttypes.fields import GenericRelation
-from django.db import transaction
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Prefetch
+from django.db.models.query import QuerySet, prefetch_related_objects
+from django.utils import timezone
+from django.utils.encoding import force_text
 from tastypie.resources import Resource
 from tastypie.contrib.gis.resources import ModelResource
 from tastypie import fields, http
@@ -22,18 +28,37 @@ from tastypie.authorization import Authorization
 from tastypie.authentication import SessionAuthentication
 from tastypie.serializers import Serializer
 from tastypie.utils import trailing_slash
+from tastypie.utils.mime import determine_format, build_content_type
 from tastypie.exceptions import BadRequest, ImmediateHttpResponse
 from mutant.models import ModelDefinition, FieldDefinition
 from mutant.contrib.geo.models.field import GeometryFieldDefinition
 from userlayers.signals import table_created, table_updated
-from userlayers.models import UserToTable, AttachedFile
-from userlayers.settings import DEFAULT_MD_GEOMETRY_FIELD_NAME, DEFAULT_MD_GEOMETRY_FIELD_TYPE
+from userlayers.models import UserToTable, AttachedFile, ImportJob, TableChange, SchemaChange
+from userlayers.settings import DEFAULT_MD_GEOMETRY_FIELD_NAME, DEFAULT_MD_GEOMETRY_FIELD_TYPE, IMPORT_BATCH_SIZE, CHANGES_PAGE_SIZE
+from userlayers.settings import SCHEMA_CHANGE_WORKERS
 from vectortools.fsutils import TempDir
-from vectortools.geojson import convert_to_geojson_data
-from vectortools.reader import VectorReaderError
 from .validators import FieldValidation
-from .serializers import GeoJsonSerializer
-from .authorization import FullAccessForLoginedUsers, get_table_auth, get_field_auth, get_table_data_auth
+from .serializers import GeoJsonSerializer, parse_geometry_options, simplify_geometry, geometry_to_simple, round_geometry
+from .cache import resource_cache, data_versions
+from .export import export_cache, dbf_fields_for_model
+from .streaming import queryset_iterator, is_streaming_request
+from .batch import BatchWriter, KeyedWriter, chunks, lock_table
+from .changes import change_log, ChangesExpired
+from .stats import table_stats, parse_bins
+from .summary import table_summary
+from .advisor import index_advisor
+from .schema import add_columns
+from .tablecopy import map_columns, copy_rows
+from .filters import apply_spatial_filters, filter_intersects, attribute_filtering, parse_sparse_fields, COMPARISON_LOOKUPS
+from .paginators import TableDataPaginator
+from .conditional import is_not_modified, set_validators
+from .tiles import TileBuilder, render_tile, tile_cache, MAX_ZOOM, CONTENT_TYPE as TILE_CONTENT_TYPE
+from .flatgeobuf import COLUMN_TYPES, STRING
+from .imports import get_feature_reader, FileImportError, ImportSchema, TableImportSchema, ImportStats
+from .jobs import WorkerPool
+from .shadow import ShadowTableCopy, shadow_table_name
+from .authorization import FullAccessForLoginedUsers, ImportJobAuthorization, SchemaChangeAuthorization, get_table_auth, get_field_auth, get_table_data_auth
+from .authorization import get_table_permissions, forget_table_permissions
 from .forms import TableFromFileForm, FieldForm, FIELD_TYPES, TableForm, GEOMETRY_FIELD_TYPES
 from .naming import translit_and_slugify, get_db_table_name, normalize_field_name
 from tastypie.validation import FormValidation
@@ -44,7 +69,40 @@ get_db_table_name = getattr(settings, 'USERLAYERS_DB_TABLE_GENERATOR', get_db_ta
 
 logger = logging.getLogger('userlayers.api.schema')
 
-class FieldsResource(ModelResource):
+#field definition class -> api field type
+FIELD_TYPE_NAMES = dict((v, k) for k, v in FIELD_TYPES)
+#api types of fields, which can be changed into each other by copying table
+SCALAR_FIELD_TYPES = ('text', 'varchar', 'integer', 'small_integer', 'float', 'null_boolean', 'boolean',
+                      'ip_generic', 'ip', 'email', 'url', 'date', 'time', 'datetime')
+
+URI_MARKER = '2147483647'
+_uri_templates = {}
+
+def get_uri_template(url_name, pk_kwarg, **kwargs):
+    """
+    Returns url reversed once with marker in place of pk_kwarg, to be formatted with pk. Catalog
+    renders uri of every table and field, reversing each of them is the slowest part of it.
+    """
+    key = (get_script_prefix(), url_name, pk_kwarg, tuple(sorted(kwargs.items())))
+    if key not in _uri_templates:
+        kwargs[pk_kwarg] = URI_MARKER
+        _uri_templates[key] = reverse(url_name, kwargs=kwargs).replace('%', '%%').replace(URI_MARKER, '%s')
+    return _uri_templates[key]
+
+def fields_prefetch():
+    return Prefetch('fielddefinitions', queryset=FieldDefinition.objects.select_subclasses())
+
+class TemplateUriMixin(object):
+    def get_resource_uri(self, bundle_or_obj=None, url_name='api_dispatch_list'):
+        if bundle_or_obj is None:
+            return super(TemplateUriMixin, self).get_resource_uri(bundle_or_obj, url_name)
+        kwargs = self.resource_uri_kwargs(bundle_or_obj)
+        pk = kwargs.pop('pk')
+        if pk is None:
+            return ''
+        return get_uri_template('api_dispatch_detail', 'pk', **kwargs) % pk
+
+class FieldsResource(TemplateUriMixin, ModelResource):
     type = fields.ApiField()
     table = fields.ToOneField('userlayers.api.resources.TablesResource', 'model_def')
     
@@ -69,29 +127,183 @@ class FieldsResource(ModelResource):
                 bundle.obj = model()
             bundle.obj.null = True
             bundle.obj.blank = True
+        elif FIELD_TYPE_NAMES[type(bundle.obj.type_cast())] != bundle.data['type']:
+            #type is changed by copying table, see save
+            bundle.new_type = bundle.data['type']
         bundle.obj.verbose_name = verbose_name
+        bundle.obj.db_index = bundle.data['indexed']
+        bundle.obj.unique = bundle.data['unique']
         return bundle
+
+    def save(self, bundle, *args, **kwargs):
+        new_type = getattr(bundle, 'new_type', None)
+        if new_type:
+            old_type = FIELD_TYPE_NAMES[type(bundle.obj.type_cast())]
+            if old_type not in SCALAR_FIELD_TYPES or new_type not in SCALAR_FIELD_TYPES:
+                error = {'type': u'type of field can be changed only between %s' % u', '.join(SCALAR_FIELD_TYPES)}
+                raise ImmediateHttpResponse(response=self.error_response(bundle.request, error))
+            if bundle.obj.name != bundle.obj._saved_name:
+                error = {'type': u'name and type of field are changed by separate requests'}
+                raise ImmediateHttpResponse(response=self.error_response(bundle.request, error))
+            self.authorized_update_detail(self.get_object_list(bundle.request), bundle)
+            self.start_schema_change(bundle.request, bundle.obj, SchemaChange.OPERATION_ALTER, new_type)
+        try:
+            with transaction.atomic():
+                return super(FieldsResource, self).save(bundle, *args, **kwargs)
+        except IntegrityError:
+            #unique index can't be created
+            raise ImmediateHttpResponse(response=self.error_response(bundle.request, {'unique': u'column has duplicate values'}))
+
+    def is_online_request(self, request):
+        return request.GET.get('online', '').lower() in ('1', 'true')
+
+    def delete_detail(self, request, **kwargs):
+        if not self.is_online_request(request):
+            return super(FieldsResource, self).delete_detail(request, **kwargs)
+        bundle = self.build_bundle(request=request)
+        bundle.obj = self.obj_get(bundle=bundle, **self.remove_api_resource_names(kwargs))
+        self.authorized_delete_detail(self.get_object_list(request), bundle)
+        self.start_schema_change(request, bundle.obj, SchemaChange.OPERATION_DROP)
+
+    def start_schema_change(self, request, field_def, operation, field_type=''):
+        """
+        Queues change of column made by copying table and responds with URI of the change.
+        """
+        md = field_def.model_def
+        #change left running by dead process doesn't block the table
+        schema_change_pool.reclaim()
+        if SchemaChange.objects.filter(md=md, status__in=(SchemaChange.STATUS_QUEUED, SchemaChange.STATUS_RUNNING)).exists():
+            raise ImmediateHttpResponse(response=self.error_response(request, {'table': [u'table is being changed, try again later']},
+                                                                     response_class=http.HttpConflict))
+        if schema_change_pool.is_full():
+            raise ImmediateHttpResponse(response=self.error_response(request, {'table': [u'too many tables are being changed, try again later']},
+                                                                     response_class=http.HttpTooManyRequests))
+        change = SchemaChange.objects.create(user=request.user, md=md, operation=operation, field_name=field_def.name, field_type=field_type)
+        logger.info('"%s" queued %s of field "%s" of table "%s", change "%s"' % (request.user, operation, field_def.name, md.db_table, change.pk))
+        schema_change_pool.submit(change)
+        location = SchemaChangesResource().get_resource_uri(change)
+        raise ImmediateHttpResponse(response=self.create_response(request, {'change_uri': location}, response_class=http.HttpAccepted, location=location))
+
+    def queue_index(self, user, table_pk, names):
+        """
+        Queues creation of index advised by index advisor for the first of columns names. Nothing is queued
+        while table is being changed or queue is full, and advisor indexes every column at most once.
+        """
+        schema_change_pool.reclaim()
+        changes = SchemaChange.objects.filter(md_id=table_pk)
+        if changes.filter(status__in=(SchemaChange.STATUS_QUEUED, SchemaChange.STATUS_RUNNING)).exists() or schema_change_pool.is_full():
+            return
+        indexed = set(changes.filter(operation=SchemaChange.OPERATION_INDEX).values_list('field_name', flat=True))
+        names = [name for name in names if name not in indexed]
+        if not names:
+            return
+        change = SchemaChange.objects.create(user=user if user.is_authenticated() else None, md_id=table_pk,
+                                             operation=SchemaChange.OPERATION_INDEX, field_name=names[0])
+        logger.info('queued advised index of field "%s" of table "%s", change "%s"' % (names[0], table_pk, change.pk))
+        schema_change_pool.submit(change)
+
+    def run_schema_change(self, change_pk):
+        """
+        Runs claimed schema change. Table is copied into shadow table with changed column, which replaces it
+        together with changed definition of field; reads and writes of table go on meanwhile.
+        """
+        change = SchemaChange.objects.select_related('md').get(pk=change_pk)
+        md = change.md
+        if change.operation == SchemaChange.OPERATION_INDEX:
+            return self.run_index_change(change)
+        try:
+            field_def = FieldDefinition.objects.get(model_def=md, name=change.field_name)
+            new_def = new_field = None
+            if change.operation == SchemaChange.OPERATION_ALTER:
+                new_def = dict(FIELD_TYPES)[change.field_type](name=field_def.name, verbose_name=field_def.verbose_name, null=True, blank=True)
+                new_field = new_def.construct_for_migrate()
+            copy = ShadowTableCopy(md, change.field_name, new_field, suffix='s%s' % change.pk)
+            change.rows_total = copy.model_class.objects.count()
+            change.save(update_fields=['rows_total', 'updated'])
+
+            def swap():
+                #column is already changed in place of table, definitions are changed without DDL.
+                #mutant skips DDL of fields deleted with their table, which is marked by deletion origin
+                field_def._state._cascade_deletion_origin = 'model_def'
+                field_def.delete(force_create_model_class=new_def is None)
+                if new_def is not None:
+                    new_def.model_def = md
+                    new_def._state._add_column = False
+                    new_def.save()
+
+            progress = lambda copy: SchemaChange.objects.filter(pk=change.pk).update(rows_copied=copy.rows_copied, updated=timezone.now())
+            copy.run(swap, progress)
+        except Exception:
+            logger.exception('schema change "%s" failed' % change.pk)
+            change.status = SchemaChange.STATUS_FAILED
+            change.error = u'internal error'
+        else:
+            change.status = SchemaChange.STATUS_DONE
+            change.rows_copied = copy.rows_copied
+            change.invalid_values = copy.invalid_values
+            logger.info('changed field "%s" of table "%s" by copying %s rows, change "%s"' % (change.field_name, md.db_table, copy.rows_copied, change.pk))
+        change.save()
+
+    def abandon_schema_change(self, change_pk):
+        """
+        Drops shadow table of change failed by worker pool because its process died.
+        """
+        change = SchemaChange.objects.select_related('md').get(pk=change_pk)
+        if change.operation == SchemaChange.OPERATION_INDEX:
+            return
+        db_table = shadow_table_name(change.md.db_table, 's%s' % change.pk)
+        if db_table in connection.introspection.table_names():
+            with connection.schema_editor() as editor:
+                editor.execute(editor.sql_delete_table % {'table': editor.quote_name(db_table)})
+
+    def run_index_change(self, change):
+        """
+        Creates advised index, the table is not copied.
+        """
+        try:
+            index_advisor.create_index(change.md_id, change.field_name)
+        except Exception:
+            logger.exception('schema change "%s" failed' % change.pk)
+            change.status = SchemaChange.STATUS_FAILED
+            change.error = u'internal error'
+        else:
+            change.status = SchemaChange.STATUS_DONE
+            logger.info('created advised index of field "%s" of table "%s", change "%s"' % (change.field_name, change.md.db_table, change.pk))
+        change.save()
         
     def dehydrate(self, bundle):
         obj = bundle.obj.type_cast()
-        f_type = dict((v,k) for k,v in FIELD_TYPES)[type(obj)]
-        bundle.data['type'] = f_type
+        bundle.data['type'] = FIELD_TYPE_NAMES[type(obj)]
+        bundle.data['indexed'] = obj.db_index
+        bundle.data['unique'] = obj.unique
         
         if isinstance(obj, GeometryFieldDefinition):
             bundle.data['is_3d'] = obj.dim == GeometryFieldDefinition.DIM_3D
         return bundle
 
-class TablesResource(ModelResource):
+class TablesResource(TemplateUriMixin, ModelResource):
     name = fields.ApiField('verbose_name')
     fields = fields.ToManyField(FieldsResource, 'fielddefinitions', related_name='table', full=True)
     
     class Meta:
-        queryset = ModelDefinition.objects.all()
+        queryset = ModelDefinition.objects.prefetch_related(fields_prefetch(), 'state')
         authorization = get_table_auth()()
         authentication = SessionAuthentication()
         validation = FormValidation(form_class=TableForm)
         fields = ['name']
     
+    def prefetch_fields(self, object_list):
+        #authorization may build new queryset or list of tables, fields are fetched for all of them
+        #by one query with field subclasses joined, so type_cast() and model_def don't hit db.
+        #Table states with summaries are fetched by one more query
+        if isinstance(object_list, QuerySet):
+            return object_list.prefetch_related(None).prefetch_related(fields_prefetch(), 'state')
+        prefetch_related_objects(list(object_list), [fields_prefetch(), 'state'])
+        return object_list
+
+    def authorized_read_list(self, object_list, bundle):
+        return self.prefetch_fields(super(TablesResource, self).authorized_read_list(object_list, bundle))
+
     def fill_obj(self, bundle):
         slug = translit_and_slugify(bundle.data['name'])
         bundle.obj.verbose_name = bundle.data['name']
@@ -115,11 +327,78 @@ class TablesResource(ModelResource):
  
     @transaction.atomic
     def save(self, bundle, *args, **kwargs):
+        if not bundle.obj.pk:
+            self.build_definition(bundle)
+        #post_save of definition rebuilds model class with new name
         self.fill_obj(bundle)
-        if bundle.obj.pk:
-            #hack for renaming
-            bundle.obj.model_class(force_create=True)
         return super(TablesResource, self).save(bundle, *args, **kwargs)
+
+    def build_definition(self, bundle):
+        """
+        Replaces new table with definition carrying its fields, so mutant creates table with all columns
+        by one CREATE TABLE and saves field definitions without altering it.
+        """
+        resource = FieldsResource()
+        self.hydrate_m2m(bundle)
+        names = set()
+        for field_bundle in bundle.data['fields']:
+            if field_bundle.errors:
+                raise ImmediateHttpResponse(response=resource.error_response(bundle.request, field_bundle.errors))
+            if field_bundle.obj.name in names:
+                error = {'name': u'field with name "%s" already exists' % field_bundle.obj.name}
+                raise ImmediateHttpResponse(response=resource.error_response(bundle.request, error))
+            names.add(field_bundle.obj.name)
+        bundle.obj = ModelDefinition(fields=[f.obj for f in bundle.data['fields']])
+        bundle.fields_created = True
+
+    def save_fields(self, bundle):
+        """
+        Applies fields of updated table as one schema change. Unchanged fields are not saved, renamed ones
+        are altered one by one, columns of new fields are added by one schema editor after their definitions
+        are saved. Model class is rebuilt once at the end.
+        """
+        resource = FieldsResource()
+        opts = bundle.obj.model_class()._meta
+        changed, added = [], []
+        for field_bundle in bundle.data['fields']:
+            obj = field_bundle.obj
+            if obj.pk and obj.model_def_id != bundle.obj.pk:
+                error = {'fields': u'field "%s" belongs to another table' % obj.name}
+                raise ImmediateHttpResponse(response=self.error_response(bundle.request, error))
+            obj.model_def = bundle.obj
+            if not obj.pk:
+                added.append(field_bundle)
+            else:
+                model_field = opts.get_field(obj._saved_name)
+                if (obj.name != obj._saved_name or obj.verbose_name != model_field.verbose_name or
+                        obj.db_index != model_field.db_index or obj.unique != model_field.unique):
+                    changed.append(field_bundle)
+        if not changed and not added:
+            return
+        object_list = resource.get_object_list(bundle.request)
+        names = set()
+        for field_bundle in changed + added:
+            if not resource.is_valid(field_bundle) or field_bundle.obj.name in names:
+                errors = field_bundle.errors or {'name': u'field with name "%s" already exists' % field_bundle.obj.name}
+                raise ImmediateHttpResponse(response=resource.error_response(bundle.request, errors))
+            names.add(field_bundle.obj.name)
+            if field_bundle.obj.pk:
+                resource.authorized_update_detail(object_list, field_bundle)
+                try:
+                    with transaction.atomic():
+                        field_bundle.obj.save()
+                except IntegrityError:
+                    error = {'unique': u'column "%s" has duplicate values' % field_bundle.obj.name}
+                    raise ImmediateHttpResponse(response=resource.error_response(bundle.request, error))
+            else:
+                resource.authorized_create_detail(object_list, field_bundle)
+        #renames are altered with fresh model class, new columns are added to its state taken here
+        model_class = bundle.obj.model_class().render_state()
+        for field_bundle in added:
+            field_bundle.obj._state._add_column = False
+            field_bundle.obj.save(force_create_model_class=False)
+        add_columns(model_class, [f.obj.construct_for_migrate() for f in added])
+        bundle.obj.model_class(force_create=True)
     
     def _create_auto_fields(self, bundle):
         FieldModel = dict(GEOMETRY_FIELD_TYPES).get(bundle.data.get('geometry_type'), DEFAULT_MD_GEOMETRY_FIELD_TYPE)
@@ -128,6 +407,7 @@ class TablesResource(ModelResource):
             'model_def': bundle.obj,
             'null': True,
             'blank': True,
+            'spatial_index': True,
         }
         if bundle.data.get('is_3d'):
             kwargs['dim'] = FieldModel.DIM_3D
@@ -138,6 +418,7 @@ class TablesResource(ModelResource):
     def obj_create(self, bundle, **kwargs):
         self._create_auto_fields(bundle)
         bundle = super(TablesResource, self).obj_create(bundle, **kwargs)
+        table_summary.reset(bundle.obj.pk)
         self.emit_created_signal(bundle)
         logger.info('"%s" created table "%s"' % (bundle.request.user, bundle.obj.db_table))
         return bundle
@@ -155,19 +436,134 @@ class TablesResource(ModelResource):
 
     def save_m2m(self, bundle):
         #This is only place for create UserToTable entry. Because we need to do it after save MD, but before save m2m (fields),
-        #because fields authorization checks UserToTable entry
+        #because fields authorization checks UserToTable entry. Fields of new table are saved with MD by its owner
         UserToTable.objects.get_or_create(md=bundle.obj, user=bundle.request.user)
+        forget_table_permissions(bundle.request.user)
         
-        for f in bundle.data['fields']:
-            f.obj.model_def = bundle.obj
-        return super(TablesResource, self).save_m2m(bundle)
+        if not getattr(bundle, 'fields_created', False):
+            self.save_fields(bundle)
     
+    def prepend_urls(self):
+        return [
+            url(r"^(?P<resource_name>%s)/(?P<pk>\d+)/clone%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('post_clone'), name="api_dispatch_clone"),
+            url(r"^(?P<resource_name>%s)/(?P<pk>\d+)/append%s$" % (self._meta.resource_name, trailing_slash()), self.wrap_view('post_append'), name="api_dispatch_append"),
+        ]
+
+    def get_data_table(self, request, action, **kwargs):
+        """
+        Returns table of detail request, if user may take action ('view' or 'modify') on its data.
+        """
+        bundle = self.build_bundle(request=request)
+        md = self.obj_get(bundle=bundle, **self.remove_api_resource_names(kwargs))
+        if not get_table_permissions(request.user).check_data(md, action):
+            raise ImmediateHttpResponse(response=http.HttpUnauthorized())
+        return md
+
+    def deserialize_body(self, request):
+        if not request.body:
+            return {}
+        return self.deserialize(request, request.body, format=request.META.get('CONTENT_TYPE', 'application/json'))
+
+    def post_clone(self, request, **kwargs):
+        """
+        Creates copy of table: fields are cloned from its definitions and rows are copied by one INSERT ... SELECT.
+        """
+        self.method_check(request, allowed=['post'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        source = self.get_data_table(request, 'view', **kwargs)
+        data = self.deserialize_body(request)
+        fields = []
+        geometry_def = None
+        for field_def in FieldDefinition.objects.select_subclasses().filter(model_def=source):
+            if field_def.name == DEFAULT_MD_GEOMETRY_FIELD_NAME and isinstance(field_def, GeometryFieldDefinition):
+                geometry_def = field_def
+            else:
+                fields.append(Bundle(obj=field_def.clone()))
+        table_data = {'name': data.get('name') or u'%s copy' % source.verbose_name, 'fields': fields}
+        if geometry_def is not None:
+            table_data.update(geometry_type=FIELD_TYPE_NAMES[type(geometry_def)], is_3d=geometry_def.dim == GeometryFieldDefinition.DIM_3D)
+        source_model = source.model_class()
+        with transaction.atomic():
+            bundle = self.obj_create(self.build_bundle(request=request, data=table_data))
+            target_model = bundle.obj.model_class()
+            columns = [(target_model._meta.pk.name, source_model._meta.pk.name)]
+            columns += map_columns(target_model, source_model)[0]
+            rows = copy_rows(target_model, source_model, columns)
+            cursor = connection.cursor()
+            for sql in connection.ops.sequence_reset_sql(no_style(), [target_model]):
+                cursor.execute(sql)
+            table_summary.rebuild(bundle.obj.pk, target_model.objects.all(), DEFAULT_MD_GEOMETRY_FIELD_NAME)
+        self.log_throttled_access(request)
+        logger.info('"%s" cloned table "%s" into table "%s", %s rows' % (request.user, source.db_table, bundle.obj.db_table, rows))
+        location = self.get_resource_uri(bundle.obj)
+        data = {'table_uri': location, 'objects_uri': TableProxyResource().uri_for_table(bundle.obj.pk), 'rows_copied': rows}
+        return self.create_response(request, data, response_class=http.HttpCreated, location=location)
+
+    def post_append(self, request, **kwargs):
+        """
+        Appends rows of source table to table by one INSERT ... SELECT. Columns are mapped by "columns"
+        (column -> source column), by default columns of the same name are copied.
+        """
+        self.method_check(request, allowed=['post'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        md = self.get_data_table(request, 'modify', **kwargs)
+        data = self.deserialize_body(request)
+        try:
+            source_kwargs = self.resolve_source(data.get('source'))
+        except (Resolver404, ValueError):
+            raise BadRequest(u'source must be URI of table')
+        source = self.get_data_table(request, 'view', **source_kwargs)
+        mapping = data.get('columns')
+        if mapping is not None and not isinstance(mapping, dict):
+            raise BadRequest(u'columns must map columns of table to columns of source table')
+        model_class = md.model_class()
+        columns, errors = map_columns(model_class, source.model_class(), mapping)
+        if errors:
+            return self.error_response(request, {'columns': errors})
+        with transaction.atomic():
+            lock_table(model_class)
+            last_pk = model_class.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            rows = copy_rows(model_class, source.model_class(), columns)
+            data_versions.bump(md.pk)
+            change_log.record_queryset(md.pk, model_class.objects.filter(pk__gt=last_pk), TableChange.ACTION_CREATE)
+            table_summary.rebuild(md.pk, model_class.objects.all(), DEFAULT_MD_GEOMETRY_FIELD_NAME)
+        self.log_throttled_access(request)
+        logger.info('"%s" appended %s rows of table "%s" to table "%s"' % (request.user, rows, source.db_table, md.db_table))
+        return self.create_response(request, {'rows_copied': rows, 'columns': dict(columns)})
+
+    def resolve_source(self, uri):
+        if not isinstance(uri, basestring):
+            raise ValueError(uri)
+        prefix = get_script_prefix()
+        if uri.startswith(prefix):
+            uri = uri[len(prefix) - 1:]
+        view, args, kwargs = resolve(uri)
+        if kwargs.get('resource_name') != self._meta.resource_name or 'pk' not in kwargs:
+            raise ValueError(uri)
+        return kwargs
+
     def dehydrate(self, bundle):
-        bundle.data['objects_uri'] = TableProxyResource().uri_for_table(bundle.obj.pk)
+        proxy = TableProxyResource()
+        bundle.data['objects_uri'] = proxy.uri_for_table(bundle.obj.pk)
+        bundle.data['tiles_uri'] = proxy.uri_for_tiles(bundle.obj.pk)
+        bundle.data['changes_uri'] = proxy.uri_for_changes(bundle.obj.pk)
+        bundle.data['stats_uri'] = proxy.uri_for_stats(bundle.obj.pk)
+        bundle.data['indexes_uri'] = proxy.uri_for_indexes(bundle.obj.pk)
+        try:
+            state = bundle.obj.state
+        except ObjectDoesNotExist:
+            state = None
+        bundle.data.update(table_summary.get(state))
         return bundle
 
 class TableProxyResource(Resource):
     pattern = r'^tablesdata/(?P<table_pk>\d+)/data'
+    tiles_pattern = r'^tablesdata/(?P<table_pk>\d+)/tiles'
+    changes_pattern = r'^tablesdata/(?P<table_pk>\d+)/changes'
+    stats_pattern = r'^tablesdata/(?P<table_pk>\d+)/stats'
+    indexes_pattern = r'^tablesdata/(?P<table_pk>\d+)/indexes'
     
     class Meta:
         resource_name = 'tablesdata'
@@ -175,8 +571,24 @@ class TableProxyResource(Resource):
         authentication = SessionAuthentication()
 
     def uri_for_table(self, table_pk):
-        return reverse('api_dispatch_list', kwargs=dict(table_pk=table_pk, api_name=self._meta.api_name))
+        return get_uri_template('api_dispatch_list', 'table_pk', api_name=self._meta.api_name) % table_pk
+    
+    def uri_for_batch(self, table_pk):
+        return reverse('api_dispatch_batch', kwargs=dict(table_pk=table_pk, api_name=self._meta.api_name))
     
+    def uri_for_changes(self, table_pk):
+        return reverse('api_dispatch_changes', kwargs=dict(table_pk=table_pk, api_name=self._meta.api_name))
+
+    def uri_for_stats(self, table_pk):
+        return reverse('api_dispatch_stats', kwargs=dict(table_pk=table_pk, api_name=self._meta.api_name))
+
+    def uri_for_indexes(self, table_pk):
+        return reverse('api_dispatch_indexes', kwargs=dict(table_pk=table_pk, api_name=self._meta.api_name))
+
+    def uri_for_tiles(self, table_pk):
+        uri = get_uri_template('api_dispatch_tile', 'table_pk', api_name=self._meta.api_name, z=0, x=0, y=0) % table_pk
+        return uri.replace('/0/0/0.mvt', '/{z}/{x}/{y}.mvt')
+
     def uri_for_file_list(self, table_pk, object_pk):
         return reverse('api_dispatch_files_list', kwargs=dict(table_pk=table_pk, api_name=self._meta.api_name, pk=object_pk))
     
@@ -184,11 +596,22 @@ class TableProxyResource(Resource):
         return reverse('api_dispatch_files_detail', kwargs=dict(table_pk=table_pk, api_name=self._meta.api_name, pk=object_pk, file_pk=file_pk))
     
     def get_objects_resource(self, table_pk):
-        try:
-            md = ModelDefinition.objects.get(pk=table_pk)
-        except ModelDefinition.DoesNotExist:
-            return http.HttpNotFound()
-        
+        table_pk = int(table_pk)
+        R = resource_cache.get(table_pk)
+        if R is None:
+            try:
+                md = ModelDefinition.objects.get(pk=table_pk)
+            except ModelDefinition.DoesNotExist:
+                #wrap_view turns it into response of every dispatch_* view
+                raise ImmediateHttpResponse(response=http.HttpNotFound())
+            R = self.build_objects_resource(md)
+            resource_cache.set(table_pk, R)
+        return R
+    
+    def build_objects_resource(self, md):
+        table_pk = md.pk
+        #db_table is part of model checksum, other attributes of definition are read by every request
+        db_table = md.db_table
         Model = md.model_class()
         
         GeomModelField = Model._meta.get_field_by_name(DEFAULT_MD_GEOMETRY_FIELD_NAME)[0]
@@ -197,34 +620,66 @@ class TableProxyResource(Resource):
         gr.contribute_to_class(Model, 'files')
         
         proxy = self
+        error_serializer = Serializer()
+        dbf_fields = dbf_fields_for_model(Model)
+        data_fields = [f for f in Model._meta.fields if not f.primary_key and f is not GeomModelField]
+        #schema of binary formats, which declare columns and geometry type up front
+        columns = [(f.name, COLUMN_TYPES.get(f.get_internal_type(), STRING)) for f in data_fields]
+        geometry_type = GeomModelField.geom_type if GeomModelField.geom_type != 'GEOMETRY' else None
+        has_z = GeomModelField.dim == 3
         
         class AttachedFilesInlineResource(ModelResource):
             class Meta:
                 queryset = AttachedFile.objects.all()
                 
             def get_resource_uri(self, bundle):
-                kwargs = dict(table_pk=md.pk, object_pk=bundle.obj.object_id, file_pk=bundle.obj.pk)
+                kwargs = dict(table_pk=table_pk, object_pk=bundle.obj.object_id, file_pk=bundle.obj.pk)
                 return proxy.uri_for_file_detail(**kwargs)
         
+        class DataPaginator(TableDataPaginator):
+            def get_data_version(self):
+                return data_versions.get(table_pk)
+        
         class R(ModelResource):
             logger = logging.getLogger('userlayers.api.data')
             
             class Meta:
                 queryset = Model.objects.all()
-                authorization = get_table_data_auth(md)()
+                authorization = get_table_data_auth(table_pk)()
                 serializer = GeoJsonSerializer()
                 max_limit = None
-                validation = FormValidation(form_class=modelform_factory(md.model_class(), exclude=('id',)))
+                paginator_class = DataPaginator
+                validation = FormValidation(form_class=modelform_factory(Model, exclude=('id',)))
+                filtering = dict(attribute_filtering(data_fields), id=COMPARISON_LOOKUPS)
+                ordering = ['id'] + [f.name for f in data_fields]
 
-            def dispatch(self, *args, **kwargs):
-                response = super(R, self).dispatch(*args, **kwargs)
-                ct = response.get('Content-Type')
-                if ct and ct.startswith('application/zip'):
-                    response['Content-Disposition'] = 'attachment; filename=%s.zip' % md.name
+            def dispatch(self, request_type, request, **kwargs):
+                try:
+                    response = super(R, self).dispatch(request_type, request, **kwargs)
+                except ImmediateHttpResponse as e:
+                    #streaming responses are not HttpResponse instances, so they can't be returned from
+                    #view methods directly: tastypie replaces them with HttpNoContent
+                    response = e.response
+                validators = getattr(self, '_validators', None)
+                if validators and response.status_code == 200:
+                    set_validators(response, *validators)
+                ct = (response.get('Content-Type') or '').split(';')[0]
+                extension = self._meta.serializer.file_extensions.get(ct)
+                md = self.get_model_definition(request)
+                if extension and md is not None:
+                    response['Content-Disposition'] = 'attachment; filename=%s.%s' % (md.name, extension)
                 return response
         
-            def get_model_definition(self):
-                return md
+            def get_model_definition(self, request):
+                #class is cached between requests, definition is read by every request
+                return get_table_permissions(request.user).get_table(table_pk)
+
+            def check_data(self, request, operation):
+                return get_table_permissions(request.user).check_table_data(table_pk, operation)
+
+            def get_layer_name(self, request):
+                md = self.get_model_definition(request)
+                return translit_and_slugify(unicode(md.verbose_name or '')) or 'layer'
         
             def get_resource_uri(self, bundle_or_obj=None, **kwargs):
                 url = proxy.uri_for_table(table_pk)
@@ -233,16 +688,307 @@ class TableProxyResource(Resource):
                     url += '%s%s' % (kw['pk'], trailing_slash())
                 return url
         
+            def plain_response(self, request, data, response_class=HttpResponse):
+                #data that are not features is rendered with plain serializer. Don't touch self._meta.serializer here,
+                #Meta is shared by every request served by the cached resource class
+                desired_format = determine_format(request, error_serializer, default_format=self._meta.default_format)
+                serialized = error_serializer.serialize(data, desired_format)
+                return response_class(content=serialized, content_type=build_content_type(desired_format))
+
             def error_response(self, request, errors, response_class=None):
-                if isinstance(self._meta.serializer, GeoJsonSerializer):
-                    self._meta.serializer = Serializer()
-                return super(R, self).error_response(request, errors, response_class=None)
+                return self.plain_response(request, errors, http.HttpBadRequest)
         
+            def get_geometry_options(self, request):
+                #resource instance serves one request
+                if not hasattr(self, '_geometry_options'):
+                    self._geometry_options = parse_geometry_options(request.GET)
+                return self._geometry_options
+
+            def get_sparse_fields(self, request):
+                """
+                Returns data fields selected by fields= parameter of GET request and whether geometry is selected.
+                """
+                if not hasattr(self, '_sparse_fields'):
+                    if request.method == 'GET':
+                        names, with_geometry = parse_sparse_fields(request.GET, [f.name for f in data_fields])
+                        self._sparse_fields = ([f for f in data_fields if names is None or f.name in names], with_geometry)
+                    else:
+                        self._sparse_fields = (data_fields, True)
+                return self._sparse_fields
+
+            def get_serialize_options(self, request):
+                tolerance, precision = self.get_geometry_options(request)
+                selected = set(f.name for f in self.get_sparse_fields(request)[0])
+                return {'geometry_field': DEFAULT_MD_GEOMETRY_FIELD_NAME, 'name': self.get_layer_name(request), 'precision': precision,
+                        'fields': dict((k, v) for k, v in dbf_fields.items() if k in selected),
+                        'columns': [c for c in columns if c[0] in selected], 'geometry_type': geometry_type, 'has_z': has_z}
+
+            def get_object_list(self, request):
+                """
+                Columns left out by fields= and geometry=false are not read from database.
+                """
+                objects = super(R, self).get_object_list(request)
+                fields, with_geometry = self.get_sparse_fields(request)
+                if len(fields) < len(data_fields) or not with_geometry:
+                    names = [f.name for f in fields] + ([DEFAULT_MD_GEOMETRY_FIELD_NAME] if with_geometry else [])
+                    objects = objects.only('pk', *names)
+                return objects
+
+            def build_filters(self, filters=None, **kwargs):
+                #geometry=false selects fields, spatial filters are applied by apply_filters
+                filters = (filters or {}).copy()
+                filters.pop(DEFAULT_MD_GEOMETRY_FIELD_NAME, None)
+                return super(R, self).build_filters(filters, **kwargs)
+
             def serialize(self, request, data, format, options=None):
                 options = options or {}
-                options['geometry_field'] = DEFAULT_MD_GEOMETRY_FIELD_NAME
+                options.update(self.get_serialize_options(request))
                 return super(R, self).serialize(request, data, format, options)
 
+            def full_dehydrate(self, bundle, for_list=False):
+                fields, with_geometry = self.get_sparse_fields(bundle.request)
+                if not hasattr(self, '_sparse_applied'):
+                    #fields are copied for resource instance, which serves one request
+                    skipped = set(f.name for f in data_fields) - set(f.name for f in fields)
+                    if not with_geometry:
+                        skipped.add(DEFAULT_MD_GEOMETRY_FIELD_NAME)
+                    for name in skipped:
+                        self.fields.pop(name, None)
+                    self._sparse_applied = True
+                tolerance, precision = self.get_geometry_options(bundle.request)
+                if tolerance and with_geometry:
+                    #object isn't saved after dehydration, simplified geometry only goes to output
+                    geometry = getattr(bundle.obj, DEFAULT_MD_GEOMETRY_FIELD_NAME)
+                    setattr(bundle.obj, DEFAULT_MD_GEOMETRY_FIELD_NAME, simplify_geometry(geometry, tolerance))
+                return super(R, self).full_dehydrate(bundle, for_list)
+
+            def get_state(self):
+                #resource instance serves one request
+                if not hasattr(self, '_state'):
+                    self._state = data_versions.get_state(table_pk)
+                return self._state
+
+            def get_validators(self, request):
+                """
+                ETag and Last-Modified of response to request, they are known without querying table.
+                """
+                state = self.get_state()
+                key = (resource_cache.get_schema_version(table_pk), state.token, request.get_full_path(), self.determine_format(request))
+                return hashlib.md5(repr(key)).hexdigest(), state.modified
+
+            def check_not_modified(self, request):
+                """
+                Answers conditional request with 304 if response would not change, validators of
+                response are kept to be set on it by dispatch().
+                """
+                if not self.check_data(request, 'view'):
+                    return
+                self._validators = self.get_validators(request)
+                if is_not_modified(request, *self._validators):
+                    response = http.HttpNotModified()
+                    set_validators(response, *self._validators)
+                    raise ImmediateHttpResponse(response=response)
+
+            def get_detail(self, request, **kwargs):
+                self.check_not_modified(request)
+                return super(R, self).get_detail(request, **kwargs)
+
+            def get_list(self, request, **kwargs):
+                self.check_not_modified(request)
+                if self.check_data(request, 'view'):
+                    advised = index_advisor.record(table_pk, request.GET, data_fields)
+                    if advised and index_advisor.auto_create:
+                        FieldsResource().queue_index(request.user, table_pk, advised)
+                    if self.get_state().row_count is None:
+                        #table created before summaries were kept
+                        table_summary.rebuild(table_pk, Model.objects.all(), DEFAULT_MD_GEOMETRY_FIELD_NAME)
+                desired_format = self.determine_format(request)
+                if 'cursor' in request.GET:
+                    #cursor pages are bounded by limit, they are serialized as usual
+                    return super(R, self).get_list(request, **kwargs)
+                for format_name in ('shapefile', 'flatgeobuf', 'geobuf'):
+                    if desired_format == self._meta.serializer.get_mime_for_format(format_name):
+                        return self.get_file_list(request, desired_format, format_name, **kwargs)
+                if desired_format == self._meta.serializer.get_mime_for_format('geojsonseq'):
+                    #sequence has no meta, pages are streamed as well
+                    objects, meta = self.get_list_objects(request, **kwargs)
+                    content = self._meta.serializer.iter_geojsonseq(self.iter_bundles(request, objects, meta), self.get_serialize_options(request))
+                    raise ImmediateHttpResponse(response=StreamingHttpResponse(content, content_type=build_content_type(desired_format)))
+                if desired_format != self._meta.serializer.get_mime_for_format('geojson') or not is_streaming_request(request):
+                    return super(R, self).get_list(request, **kwargs)
+                objects, meta = self.get_list_objects(request, **kwargs)
+                content = self._meta.serializer.iter_geojson(self.iter_bundles(request, objects, meta), meta, self.get_serialize_options(request))
+                raise ImmediateHttpResponse(response=StreamingHttpResponse(content, content_type=build_content_type(desired_format)))
+
+            def apply_filters(self, request, applicable_filters):
+                objects = super(R, self).apply_filters(request, applicable_filters)
+                return apply_spatial_filters(objects, request.GET, DEFAULT_MD_GEOMETRY_FIELD_NAME)
+
+            def get_list_objects(self, request, **kwargs):
+                base_bundle = self.build_bundle(request=request)
+                objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+                objects = self.apply_sorting(objects, options=request.GET)
+                paginator = self._meta.paginator_class(request.GET, objects, resource_uri=self.get_resource_uri(), limit=self._meta.limit, max_limit=self._meta.max_limit, collection_name=self._meta.collection_name)
+                return objects, paginator.page()['meta']
+
+            def iter_bundles(self, request, objects, meta):
+                for obj in queryset_iterator(objects, offset=meta['offset'], limit=meta['limit']):
+                    yield self.full_dehydrate(self.build_bundle(obj=obj, request=request), for_list=True)
+
+            def iter_features(self, request, objects, meta):
+                """
+                GeoJSON-like features made straight of model objects, for binary formats that don't need
+                dehydrated (JSON-ready) data.
+                """
+                tolerance, precision = self.get_geometry_options(request)
+                fields, with_geometry = self.get_sparse_fields(request)
+                for obj in queryset_iterator(objects, offset=meta['offset'], limit=meta['limit']):
+                    geometry = getattr(obj, DEFAULT_MD_GEOMETRY_FIELD_NAME) if with_geometry else None
+                    if tolerance:
+                        geometry = simplify_geometry(geometry, tolerance)
+                    geometry = geometry_to_simple(geometry)
+                    if geometry and precision is not None:
+                        geometry = round_geometry(geometry, precision)
+                    properties = dict((f.name, f.value_from_object(obj)) for f in fields)
+                    yield {'id': obj.pk, 'properties': properties, 'geometry': geometry}
+
+            def get_file_list(self, request, desired_format, format_name, **kwargs):
+                objects, meta = self.get_list_objects(request, **kwargs)
+                key = None
+                if isinstance(objects, QuerySet):
+                    sql, params = objects.query.sql_with_params()
+                    key = (format_name, resource_cache.get_schema_version(table_pk), meta['offset'], meta['limit'], sql,
+                           [force_text(p) for p in params], self.get_geometry_options(request))
+                
+                def write(fileobj):
+                    options = self.get_serialize_options(request)
+                    if format_name == 'shapefile':
+                        self._meta.serializer.write_shapefile(fileobj, self.iter_bundles(request, objects, meta), options)
+                    else:
+                        write_format = getattr(self._meta.serializer, 'write_%s' % format_name)
+                        write_format(fileobj, self.iter_features(request, objects, meta), options)
+                
+                fileobj = export_cache.get_or_build(write, table_pk, data_versions.get(table_pk), key)
+                response = StreamingHttpResponse(FileWrapper(fileobj), content_type=build_content_type(desired_format))
+                response['Content-Length'] = os.fstat(fileobj.fileno()).st_size
+                raise ImmediateHttpResponse(response=response)
+
+            def data_changed(self, changes=()):
+                """
+                Called after table rows are written, changes are (action, object pk) to record in change log.
+                """
+                data_versions.bump(table_pk)
+                change_log.record(table_pk, changes)
+
+            def get_changes(self, request, **kwargs):
+                self.method_check(request, allowed=['get'])
+                self.is_authenticated(request)
+                self.throttle_check(request)
+                if not self.check_data(request, 'view'):
+                    raise ImmediateHttpResponse(response=http.HttpUnauthorized())
+                if not request.GET.get('since'):
+                    #token to start with, it must be taken before table is downloaded
+                    return self.create_response(request, {'meta': {'token': change_log.get_token(table_pk)}, 'objects': []})
+                try:
+                    since = int(request.GET['since'])
+                    limit = min(int(request.GET.get('limit') or CHANGES_PAGE_SIZE), CHANGES_PAGE_SIZE)
+                    if since < 0 or limit <= 0:
+                        raise ValueError
+                except ValueError:
+                    raise BadRequest(u'since must be change token, limit positive integer')
+                try:
+                    pks, token, more = change_log.get_changes(table_pk, since, limit)
+                except ChangesExpired:
+                    return self.plain_response(request, {'since': [u'token has expired, download table again']}, http.HttpGone)
+                base_bundle = self.build_bundle(request=request)
+                objects = self.authorized_read_list(self.get_object_list(request), base_bundle)
+                bundles = []
+                for chunk in chunks(pks, IMPORT_BATCH_SIZE):
+                    for obj in objects.filter(pk__in=chunk).order_by('pk'):
+                        bundles.append(self.full_dehydrate(self.build_bundle(obj=obj, request=request), for_list=True))
+                #objects which are not found were deleted after their last logged change
+                found = set(b.obj.pk for b in bundles)
+                meta = {
+                    'token': token,
+                    'deleted': [pk for pk in pks if pk not in found],
+                    'next': '%s?since=%s' % (proxy.uri_for_changes(table_pk), token) if more else None,
+                }
+                self.log_throttled_access(request)
+                return self.create_response(request, {'meta': meta, 'objects': bundles})
+
+            def post_batch(self, request, **kwargs):
+                self.method_check(request, allowed=['post'])
+                self.is_authenticated(request)
+                self.throttle_check(request)
+                if not self.check_data(request, 'modify'):
+                    raise ImmediateHttpResponse(response=http.HttpUnauthorized())
+                data = self.deserialize(request, request.body, format=request.META.get('CONTENT_TYPE', 'application/json'))
+                writer = BatchWriter(Model, DEFAULT_MD_GEOMETRY_FIELD_NAME)
+                if not writer.validate(data):
+                    return self.plain_response(request, {'results': writer.results}, http.HttpBadRequest)
+                try:
+                    with transaction.atomic():
+                        moved = [r['id'] for r, values in writer.updates if DEFAULT_MD_GEOMETRY_FIELD_NAME in values]
+                        touched = any(self.touches_extent(Model.objects.filter(pk__in=chunk))
+                                      for chunk in chunks(moved + [r['id'] for r in writer.deletes], writer.chunk_size))
+                        counts = writer.apply()
+                        self.data_changed([(r['action'], r['id']) for r in writer.results])
+                        geometries = [values.get(DEFAULT_MD_GEOMETRY_FIELD_NAME) for result, values in writer.creates + writer.updates]
+                        self.update_summary(counts['created'] - counts['deleted'], geometries, touched)
+                except IntegrityError:
+                    return self.error_response(request, {'error': u'values of unique fields are duplicated'})
+                self.log_throttled_access(request)
+                self.logger.info('"%s" changed table data by batch, table "%s", created %s, updated %s, deleted %s objects' % (
+                    request.user, db_table, counts['created'], counts['updated'], counts['deleted']))
+                counts['results'] = writer.results
+                return self.plain_response(request, counts)
+
+            def get_stats(self, request, **kwargs):
+                self.method_check(request, allowed=['get'])
+                self.is_authenticated(request)
+                self.throttle_check(request)
+                if not self.check_data(request, 'view'):
+                    raise ImmediateHttpResponse(response=http.HttpUnauthorized())
+                bins = parse_bins(request.GET)
+                #filters of list apply to statistics as well
+                objects = self.obj_get_list(bundle=self.build_bundle(request=request), **self.remove_api_resource_names(kwargs))
+                stats = table_stats(objects, data_fields, DEFAULT_MD_GEOMETRY_FIELD_NAME, bins)
+                self.log_throttled_access(request)
+                return self.plain_response(request, stats)
+
+            def get_indexes(self, request, **kwargs):
+                self.method_check(request, allowed=['get'])
+                self.is_authenticated(request)
+                self.throttle_check(request)
+                if not self.check_data(request, 'view'):
+                    raise ImmediateHttpResponse(response=http.HttpUnauthorized())
+                report = index_advisor.report(table_pk, data_fields)
+                self.log_throttled_access(request)
+                return self.plain_response(request, report)
+
+            def get_tile(self, request, z, x, y, **kwargs):
+                self.method_check(request, allowed=['get'])
+                self.is_authenticated(request)
+                self.throttle_check(request)
+                if not self.check_data(request, 'view'):
+                    raise ImmediateHttpResponse(response=http.HttpUnauthorized())
+                z, x, y = int(z), int(x), int(y)
+                if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+                    return http.HttpNotFound()
+                self.check_not_modified(request)
+                
+                def build():
+                    objects = self.authorized_read_list(self.get_object_list(request), self.build_bundle(request=request))
+                    objects = filter_intersects(objects, DEFAULT_MD_GEOMETRY_FIELD_NAME, TileBuilder(z, x, y).bbox).order_by('pk')
+                    return render_tile(objects, z, x, y, self.get_layer_name(request), DEFAULT_MD_GEOMETRY_FIELD_NAME, data_fields)
+                
+                version = '%s-%s' % (resource_cache.get_schema_version(table_pk), data_versions.get(table_pk))
+                content = tile_cache.get_or_build(build, table_pk, version, z, x, y)
+                self.log_throttled_access(request)
+                response = HttpResponse(content, content_type=TILE_CONTENT_TYPE)
+                set_validators(response, *self._validators)
+                return response
+
             def full_hydrate(self, bundle):
                 bundle = super(R, self).full_hydrate(bundle)
                 try:
@@ -256,19 +1002,68 @@ class TableProxyResource(Resource):
                 
                 return bundle
 
+            def save(self, bundle, *args, **kwargs):
+                #values of unique fields are checked by database
+                try:
+                    with transaction.atomic():
+                        return super(R, self).save(bundle, *args, **kwargs)
+                except IntegrityError:
+                    raise ImmediateHttpResponse(response=self.error_response(bundle.request, {'error': u'value of unique field already exists'}))
+
             def obj_create(self, bundle, **kwargs):
                 bundle = super(R, self).obj_create(bundle, **kwargs)
-                self.logger.info('"%s" created table data, table "%s", object pk "%s"' % (bundle.request.user, md.db_table, bundle.obj.pk))
+                self.data_changed([(TableChange.ACTION_CREATE, bundle.obj.pk)])
+                table_summary.add(table_pk, 1, [bundle.obj.geometry])
+                self.logger.info('"%s" created table data, table "%s", object pk "%s"' % (bundle.request.user, db_table, bundle.obj.pk))
                 return bundle
 
+            def touches_extent(self, objects):
+                return isinstance(objects, QuerySet) and table_summary.touches_extent(table_pk, objects, DEFAULT_MD_GEOMETRY_FIELD_NAME)
+
+            def update_summary(self, count, geometries=(), touched=False):
+                """
+                Updates summary of table after write, it is rebuilt if deleted or updated rows reached bounds of its extent.
+                """
+                if touched:
+                    table_summary.rebuild(table_pk, Model.objects.all(), DEFAULT_MD_GEOMETRY_FIELD_NAME)
+                else:
+                    table_summary.add(table_pk, count, geometries)
+
             def obj_update(self, bundle, **kwargs):
+                pk = kwargs.get(self._meta.detail_uri_name) or bundle.obj.pk
+                touched = pk is not None and self.touches_extent(Model.objects.filter(pk=pk))
                 bundle = super(R, self).obj_update(bundle, **kwargs)
-                self.logger.info('"%s" updated table data, table "%s", object pk "%s"' % (bundle.request.user, md.db_table, bundle.obj.pk))
+                self.data_changed([(TableChange.ACTION_UPDATE, bundle.obj.pk)])
+                self.update_summary(0, [bundle.obj.geometry], touched)
+                self.logger.info('"%s" updated table data, table "%s", object pk "%s"' % (bundle.request.user, db_table, bundle.obj.pk))
                 return bundle
             
             def obj_delete(self, bundle, **kwargs):
+                touched = self.touches_extent(Model.objects.filter(pk=kwargs[self._meta.detail_uri_name]))
                 super(R, self).obj_delete(bundle, **kwargs)
-                self.logger.info('"%s" deleted table data, table "%s", object pk "%s"' % (bundle.request.user, md.db_table, bundle.obj.pk))
+                #pk of deleted object is reset
+                pk = int(kwargs[self._meta.detail_uri_name])
+                self.data_changed([(TableChange.ACTION_DELETE, pk)])
+                self.update_summary(-1, touched=touched)
+                self.logger.info('"%s" deleted table data, table "%s", object pk "%s"' % (bundle.request.user, db_table, pk))
+
+            def obj_delete_list(self, bundle, **kwargs):
+                objects = self.obj_get_list(bundle=bundle, **kwargs)
+                deleted = objects.count() if isinstance(objects, QuerySet) else len(objects)
+                touched = self.touches_extent(objects)
+                change_log.record_queryset(table_pk, objects, TableChange.ACTION_DELETE)
+                super(R, self).obj_delete_list(bundle, **kwargs)
+                self.data_changed()
+                self.update_summary(-deleted, touched=touched)
+
+            def obj_delete_list_for_update(self, bundle, **kwargs):
+                objects = self.obj_get_list(bundle=bundle, **kwargs)
+                deleted = objects.count() if isinstance(objects, QuerySet) else len(objects)
+                touched = self.touches_extent(objects)
+                change_log.record_queryset(table_pk, objects, TableChange.ACTION_DELETE)
+                super(R, self).obj_delete_list_for_update(bundle, **kwargs)
+                self.data_changed()
+                self.update_summary(-deleted, touched=touched)
                 
             def dehydrate(self, bundle):
                 bundle.data['files_uri'] = proxy.uri_for_file_list(table_pk, bundle.obj.pk)
@@ -280,6 +1075,26 @@ class TableProxyResource(Resource):
         R = self.get_objects_resource(table_pk=kwargs.get('table_pk'))
         return R().dispatch(request_type, request, **kwargs)
     
+    def dispatch_batch(self, request, **kwargs):
+        R = self.get_objects_resource(table_pk=kwargs.get('table_pk'))
+        return R().post_batch(request, **kwargs)
+
+    def dispatch_tile(self, request, **kwargs):
+        R = self.get_objects_resource(table_pk=kwargs.get('table_pk'))
+        return R().get_tile(request, **kwargs)
+
+    def dispatch_changes(self, request, **kwargs):
+        R = self.get_objects_resource(table_pk=kwargs.get('table_pk'))
+        return R().get_changes(request, **kwargs)
+
+    def dispatch_stats(self, request, **kwargs):
+        R = self.get_objects_resource(table_pk=kwargs.get('table_pk'))
+        return R().get_stats(request, **kwargs)
+
+    def dispatch_indexes(self, request, **kwargs):
+        R = self.get_objects_resource(table_pk=kwargs.get('table_pk'))
+        return R().get_indexes(request, **kwargs)
+
     def dispatch_files_list(self, request, **kwargs):
         return self.dispatch_files('list', request, **kwargs)
     
@@ -297,7 +1112,7 @@ class TableProxyResource(Resource):
             return http.HttpMultipleChoices("More than one resource is found at this URI.")
         
         proxy = self
-        md = obj_res.get_model_definition()
+        md = obj_res.get_model_definition(request)
         
         class R(ModelResource):
             
@@ -345,13 +1160,16 @@ class TableProxyResource(Resource):
             url(r"%s/(?P<%s>.*?)/files/(?P<file_pk>\d+)%s$" % (self.pattern, self._meta.detail_uri_name, trailing_slash()), self.wrap_view('dispatch_files_detail'), name="api_dispatch_files_detail"),
             url(r"%s/(?P<%s>.*?)/files%s$" % (self.pattern, self._meta.detail_uri_name, trailing_slash()), self.wrap_view('dispatch_files_list'), name="api_dispatch_files_list"),
             
+            url(r"%s/batch%s$" % (self.pattern, trailing_slash()), self.wrap_view('dispatch_batch'), name="api_dispatch_batch"),
+            url(r"%s/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$" % self.tiles_pattern, self.wrap_view('dispatch_tile'), name="api_dispatch_tile"),
+            url(r"%s%s$" % (self.changes_pattern, trailing_slash()), self.wrap_view('dispatch_changes'), name="api_dispatch_changes"),
+            url(r"%s%s$" % (self.stats_pattern, trailing_slash()), self.wrap_view('dispatch_stats'), name="api_dispatch_stats"),
+            url(r"%s%s$" % (self.indexes_pattern, trailing_slash()), self.wrap_view('dispatch_indexes'), name="api_dispatch_indexes"),
+
             url(r"%s%s$" % (self.pattern, trailing_slash()), self.wrap_view('dispatch_list'), name="api_dispatch_list"),
             url(r"%s/(?P<%s>.*?)%s$" % (self.pattern, self._meta.detail_uri_name, trailing_slash()), self.wrap_view('dispatch_detail'), name="api_dispatch_detail"),
         ]
 
-class FileImportError(Exception):
-    pass
-
 class FileImportResource(Resource):
     file = fields.FileField()
     
@@ -361,100 +1179,282 @@ class FileImportResource(Resource):
         authorization = FullAccessForLoginedUsers()
         authentication = SessionAuthentication()
 
-    def get_geometry_type(self, geojson_data):
-        type_map = {
-            'Point': 'point',
-            'MultiPoint': 'multi_point',
-            'LineString': 'line_string',
-            'MultiLineString': 'multi_line_string',
-            'Polygon': 'polygon',
-            'MultiPolygon': 'multi_polygon',
-            'GeometryCollection': 'geometry_collection',
-        }
-        types = []
-        is_3d = False
-        for f in geojson_data['features']:
-            geom = GEOSGeometry(json.dumps(f['geometry']))
-            t = geom.geom_type
-            if t not in types:
-                types.append(t)
-            if not is_3d and geom.hasz:
-                is_3d = True
-        if len(types) == 1:
-            geom_type = type_map.get(types[0])
-        else:
-            geom_type = 'geometry'
-        
-        return geom_type, is_3d
-
-    def create_table(self, request, name, geojson_data):
+    def create_table(self, request, name, fields, geom_type, is_3d):
         tr = TablesResource()
-        feature = geojson_data['features'][0]
-        props = feature['properties']
-        geom_type, is_3d = self.get_geometry_type(geojson_data)
-        fields = []
-        for k, v in props.iteritems():
-            if isinstance(v, (int, long)):
-                ftype = 'integer'
-            elif isinstance(v, (float)):
-                ftype = 'float'
-            else:
-                ftype = 'text'
-            fields.append({'name': k, 'type': ftype,})
         bundle = tr.build_bundle(request=request, data=dict(name=name, geometry_type=geom_type, is_3d=is_3d, fields=fields))
         return tr.obj_create(bundle)
 
-    def fill_table(self, model_class, geojson_data):
-        objects = []
+    def fill_table(self, model_class, features, batch_size=IMPORT_BATCH_SIZE, progress=None, write=None):
+        """
+        Inserts features into table by batches of batch_size objects, so only one batch is kept in memory.
+        write(objects), if given, writes batch instead and returns count of created rows and count of updated ones.
+        progress is called with stats after every batch.
+        """
+        stats = ImportStats()
         field_name_map = {}
-        for f in geojson_data['features']:
-            for k in f['properties'].keys():
+        objects = []
+
+        def write_batch(objects):
+            if write is None:
+                model_class.objects.bulk_create(objects)
+                stats.add_batch(len(objects))
+            else:
+                stats.add_batch(len(objects), *write(objects))
+
+        for props, geometry in features:
+            data = {}
+            for k, v in props.iteritems():
                 if k not in field_name_map:
                     field_name_map[k] = normalize_field_name(k)
-                normalized_name = field_name_map[k]
-                if normalized_name != k:
-                    f['properties'][normalized_name] = f['properties'].pop(k)
-            obj = model_class(**f['properties'])
-            if f['geometry']:
-                try:
-                    obj.geometry = GEOSGeometry(json.dumps(f['geometry']))
-                except GEOSException:
-                    raise FileImportError(u'file contains wrong geometry')
+                data[field_name_map[k]] = v
+            obj = model_class(**data)
+            setattr(obj, DEFAULT_MD_GEOMETRY_FIELD_NAME, geometry)
             objects.append(obj)
-        model_class.objects.bulk_create(objects)
+            if len(objects) >= batch_size:
+                write_batch(objects)
+                objects = []
+                if progress:
+                    progress(stats)
+        if objects:
+            write_batch(objects)
+        stats.finish()
+        if progress:
+            progress(stats)
+        return stats
 
-    def process_file(self, request, name, uploaded_file):
+    def save_file(self, f, filename):
         tmp_dir = TempDir()
-        dst_file = open(os.path.join(tmp_dir.path, uploaded_file.name), 'w')
-        for c in uploaded_file.chunks():
-            dst_file.write(c)
-        dst_file.close()
-        try:
-            geojson_data = convert_to_geojson_data(dst_file.name, unicode_errors='replace')
-            not_empty_layers = [l for l in geojson_data if len(l['features'])]
-            if not not_empty_layers:
+        path = os.path.join(tmp_dir.path, os.path.basename(filename))
+        with open(path, 'wb') as dst_file:
+            for c in f.chunks():
+                dst_file.write(c)
+        return tmp_dir, path
+
+    def import_file(self, request, name, path, job=None):
+        reader = get_feature_reader(path, unicode_errors='replace')
+        schema = ImportSchema(reader)
+        if not schema.sample:
+            raise FileImportError(u'file does not contain any features')
+        bundle = self.create_table(request, name, schema.fields, schema.geometry_type, schema.is_3d)
+        progress = None
+        if job is not None:
+            job.md = bundle.obj
+            job.features_total = reader.get_feature_count()
+            job.save(update_fields=['md', 'features_total', 'updated'])
+            progress = lambda stats: ImportJob.objects.filter(pk=job.pk).update(features_imported=stats.features, updated=timezone.now())
+        model_class = bundle.obj.model_ct.model_class()
+        bundle.import_stats = self.fill_table(model_class, schema, progress=progress)
+        change_log.record_queryset(bundle.obj.pk, model_class.objects.all(), TableChange.ACTION_CREATE)
+        table_summary.rebuild(bundle.obj.pk, model_class.objects.all(), DEFAULT_MD_GEOMETRY_FIELD_NAME)
+        data_versions.bump(bundle.obj.pk)
+        stats = bundle.import_stats
+        stats.invalid_values = schema.invalid_values
+        logger.info('"%s" imported file "%s" into table "%s", %s features in %.3f s (%.1f features/s)' % (
+            request.user, os.path.basename(path), bundle.obj.db_table, stats.features, stats.seconds, stats.features_per_second))
+        return bundle
+
+    def import_into_table(self, request, path, md, mode, key=None, job=None):
+        """
+        Imports file into existing table md in one transaction: rows are appended, upserted by key column or
+        replace all rows of table. Batches are written by set-based queries, see KeyedWriter.
+        """
+        model_class = md.model_class()
+        schema = TableImportSchema(get_feature_reader(path, unicode_errors='replace'), model_class, DEFAULT_MD_GEOMETRY_FIELD_NAME)
+        if mode == ImportJob.MODE_UPSERT and key not in [f.name for f in schema.columns.values()]:
+            raise FileImportError(u'file has no attribute of key column "%s"' % key)
+        if job is not None:
+            job.features_total = schema.reader.get_feature_count()
+            job.save(update_fields=['features_total', 'updated'])
+        write = None
+        if mode == ImportJob.MODE_UPSERT:
+            writer = KeyedWriter(model_class, key, [f.name for f in schema.columns.values()] + [DEFAULT_MD_GEOMETRY_FIELD_NAME])
+
+            def write(objects):
+                created, updated = writer.write(objects)
+                change_log.record(md.pk, [(TableChange.ACTION_UPDATE, pk) for pk in updated])
+                return created, len(updated)
+
+        with transaction.atomic():
+            lock_table(model_class)
+            last_pk = model_class.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            deleted = 0
+            if mode == ImportJob.MODE_REPLACE:
+                deleted = self.delete_rows(md, model_class)
+            #progress would be invisible until commit and would lock job row against heartbeat of worker pool
+            stats = self.fill_table(model_class, schema, write=write)
+            if not stats.features:
                 raise FileImportError(u'file does not contain any features')
-            geojson_data = not_empty_layers[0]
-            for l in not_empty_layers[1:]:
-                geojson_data['features'].extend(l['features'])
-        except VectorReaderError:
-            raise FileImportError(u'wrong file format')
-        bundle = self.create_table(request, name, geojson_data)
-        self.fill_table(bundle.obj.model_ct.model_class(), geojson_data)
+            change_log.record_queryset(md.pk, model_class.objects.filter(pk__gt=last_pk), TableChange.ACTION_CREATE)
+            table_summary.rebuild(md.pk, model_class.objects.all(), DEFAULT_MD_GEOMETRY_FIELD_NAME)
+            data_versions.bump(md.pk)
+        stats.deleted = deleted
+        stats.invalid_values = schema.invalid_values
+        logger.info('"%s" imported file "%s" into table "%s" (%s), created %s, updated %s, deleted %s rows in %.3f s' % (
+            request.user, os.path.basename(path), md.db_table, mode, stats.created, stats.updated, stats.deleted, stats.seconds))
+        bundle = Bundle(obj=md, request=request)
+        bundle.import_stats = stats
+        bundle.existing_table = True
         return bundle
 
-    @transaction.atomic
-    def create_bundle(self, request):
+    def delete_rows(self, md, model_class):
+        """
+        Deletes all rows of table and their attached files by two queries, returns count of deleted rows.
+        """
+        objects = model_class.objects.all()
+        change_log.record_queryset(md.pk, objects, TableChange.ACTION_DELETE)
+        AttachedFile.objects.filter(content_type=md.model_ct).delete()
+        cursor = connection.cursor()
+        cursor.execute('DELETE FROM %s' % connection.ops.quote_name(model_class._meta.db_table))
+        return cursor.rowcount
+
+    def get_target_table(self, request, uri):
+        """
+        Returns existing table of URI, if user may modify its data.
+        """
+        tr = TablesResource()
+        try:
+            kwargs = tr.resolve_source(uri)
+        except (Resolver404, ValueError):
+            raise ImmediateHttpResponse(response=self.error_response(request, {'table': [u'table must be URI of table']}))
+        return tr.get_data_table(request, 'modify', **kwargs)
+
+    def process_file(self, request, name, uploaded_file):
+        tmp_dir, path = self.save_file(uploaded_file, uploaded_file.name)
+        return self.import_file(request, name, path)
+
+    def get_form(self, request):
         form = TableFromFileForm(request.POST, request.FILES)
         if not form.is_valid():
             raise ImmediateHttpResponse(response=self.error_response(request, form.errors))
+        return form
+
+    @transaction.atomic
+    def create_bundle(self, request):
+        form = self.get_form(request)
+        data = form.cleaned_data
         try:
-            bundle = self.process_file(request, form.cleaned_data['name'], form.cleaned_data['file'])
+            if data['mode'] == ImportJob.MODE_CREATE:
+                return self.process_file(request, data['name'], data['file'])
+            md = self.get_target_table(request, data['table'])
+            tmp_dir, path = self.save_file(data['file'], data['file'].name)
+            return self.import_into_table(request, path, md, data['mode'], data['key'])
         except FileImportError as e:
             raise ImmediateHttpResponse(response=self.error_response(request, {'file': [e.message]}))
-        return bundle
+
+    def create_job(self, request):
+        form = self.get_form(request)
+        if import_pool.is_full():
+            raise ImmediateHttpResponse(response=self.error_response(request, {'file': [u'too many files are waiting for import, try again later']},
+                                                                     response_class=http.HttpTooManyRequests))
+        data = form.cleaned_data
+        uploaded_file = data['file']
+        job = ImportJob(user=request.user, name=data['name'], filename=os.path.basename(uploaded_file.name), mode=data['mode'], key=data['key'])
+        if job.mode != ImportJob.MODE_CREATE:
+            job.md = self.get_target_table(request, data['table'])
+        job.file.save(job.filename, uploaded_file, save=False)
+        job.save()
+        logger.info('"%s" queued import of file "%s", job "%s"' % (request.user, job.filename, job.pk))
+        return job
+
+    def run_job(self, job_pk):
+        """
+        Imports file of claimed job. Batches of new table are committed as they are inserted, so progress is
+        visible while job runs; table of failed job is removed. Import into existing table is one transaction.
+        """
+        job = ImportJob.objects.select_related('user').get(pk=job_pk)
+        request = HttpRequest()
+        request.user = job.user
+        try:
+            job.file.open('rb')
+            try:
+                tmp_dir, path = self.save_file(job.file, job.filename)
+            finally:
+                job.file.close()
+            if job.mode == ImportJob.MODE_CREATE:
+                bundle = self.import_file(request, job.name, path, job=job)
+            else:
+                bundle = self.import_into_table(request, path, job.md, job.mode, job.key, job=job)
+        except Exception as e:
+            if isinstance(e, FileImportError):
+                job.error = e.message
+            elif isinstance(e, ImmediateHttpResponse):
+                job.error = force_text(e.response.content)
+            else:
+                logger.exception('import job "%s" failed' % job.pk)
+                job.error = u'internal error'
+            job.status = ImportJob.STATUS_FAILED
+            if job.md_id and job.mode == ImportJob.MODE_CREATE:
+                job.md.delete()
+                job.md = None
+        else:
+            job.status = ImportJob.STATUS_DONE
+            job.features_imported = bundle.import_stats.features
+            job.invalid_values = bundle.import_stats.invalid_values
+        job.file.delete(save=False)
+        job.save()
+
+    def abandon_job(self, job_pk):
+        """
+        Cleans up after job failed by worker pool because its process died: table of new layer is removed.
+        """
+        job = ImportJob.objects.select_related('md').get(pk=job_pk)
+        if job.md_id and job.mode == ImportJob.MODE_CREATE:
+            job.md.delete()
+            job.md = None
+        job.file.delete(save=False)
+        job.save(update_fields=['md', 'file'])
+
+    def is_async_request(self, request):
+        return request.GET.get('async', request.POST.get('async', '')).lower() in ('1', 'true')
 
     def post_list(self, request, **kwargs):
+        if self.is_async_request(request):
+            job = self.create_job(request)
+            import_pool.submit(job)
+            location = ImportJobsResource().get_resource_uri(job)
+            return self.create_response(request, {'job_uri': location}, response_class=http.HttpAccepted, location=location)
         bundle = self.create_bundle(request)
+        if getattr(bundle, 'existing_table', False):
+            return self.create_response(request, bundle.import_stats.as_dict())
         location = TablesResource().get_resource_uri(bundle)
-        return http.HttpCreated(location=location)
+        return self.create_response(request, bundle.import_stats.as_dict(), response_class=http.HttpCreated, location=location)
+
+class ImportJobsResource(ModelResource):
+    class Meta:
+        queryset = ImportJob.objects.all()
+        resource_name = 'importjobs'
+        list_allowed_methods = ['get']
+        detail_allowed_methods = ['get']
+        authorization = ImportJobAuthorization()
+        authentication = SessionAuthentication()
+        fields = ['id', 'name', 'filename', 'mode', 'key', 'status', 'features_total', 'features_imported', 'invalid_values', 'error',
+                  'created', 'updated']
+
+    def dehydrate(self, bundle):
+        md_id = bundle.obj.md_id
+        if md_id and bundle.obj.status == ImportJob.STATUS_DONE:
+            bundle.data['table_uri'] = TablesResource().get_resource_uri(ModelDefinition(pk=md_id))
+            bundle.data['objects_uri'] = TableProxyResource().uri_for_table(md_id)
+        return bundle
+
+class SchemaChangesResource(ModelResource):
+    class Meta:
+        queryset = SchemaChange.objects.all()
+        resource_name = 'schemachanges'
+        list_allowed_methods = ['get']
+        detail_allowed_methods = ['get']
+        authorization = SchemaChangeAuthorization()
+        authentication = SessionAuthentication()
+        fields = ['id', 'operation', 'field_name', 'field_type', 'status', 'rows_total', 'rows_copied', 'invalid_values', 'error', 'created', 'updated']
+
+    def dehydrate(self, bundle):
+        bundle.data['table_uri'] = TablesResource().get_resource_uri(ModelDefinition(pk=bundle.obj.md_id))
+        return bundle
+
+import_pool = WorkerPool(lambda job_pk: FileImportResource().run_job(job_pk), abandon=lambda job_pk: FileImportResource().abandon_job(job_pk))
+schema_change_pool = WorkerPool(lambda change_pk: FieldsResource().run_schema_change(change_pk), model=SchemaChange, name='schema',
+                                workers=SCHEMA_CHANGE_WORKERS, abandon=lambda change_pk: FieldsResource().abandon_schema_change(change_pk))
+
+def start_pools(**kwargs):
+    import_pool.start()
+    schema_change_pool.start()
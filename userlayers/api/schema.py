@@ -0,0 +1,16 @@
+from django.db import connections, transaction
+from mutant.utils import allow_migrate
+
+def add_columns(model_class, fields):
+    """
+    Adds columns of fields to table of model_class (model state without them) by one schema editor,
+    so all ALTERs run in one transaction and deferred statements (indexes) are executed once at its end.
+    """
+    if model_class._meta.managed or not fields:
+        return
+    for alias in allow_migrate(model_class):
+        connection = connections[alias]
+        with transaction.atomic(alias), connection.schema_editor() as editor:
+            for field in fields:
+                field.model = model_class
+                editor.add_field(model_class, field)
@@ -1,94 +1,270 @@
+import math
+import tempfile
 from tastypie.serializers import Serializer
+from tastypie.exceptions import BadRequest
 from django.core.serializers import json
-from shapeutils.convert import geojson_to_zipshape
+from .export import write_zipped_shapefile
+from .flatgeobuf import write_flatgeobuf, CONTENT_TYPE as FLATGEOBUF_CONTENT_TYPE
+from .geobuf import write_geobuf, CONTENT_TYPE as GEOBUF_CONTENT_TYPE
+from .tiles import MAX_ZOOM
+from userlayers.settings import STREAMING_BUFFER_SIZE
+
+CRS = {
+    "type": "name",
+    "properties": {
+      "name": "urn:ogc:def:crs:OGC:1.3:CRS84"
+    }
+}
+
+MAX_PRECISION = 15
+
+GEOJSONSEQ_CONTENT_TYPE = 'application/geo+json-seq'
+#RFC 8142 record separator
+RECORD_SEPARATOR = u'\x1e'
+
+def zoom_tolerance(zoom):
+    """
+    Degrees per pixel of 256 pixels tile at zoom.
+    """
+    return 360.0 / 256 / 2 ** zoom
+
+def parse_geometry_options(params):
+    """
+    Returns simplification tolerance and coordinate precision from simplify=<tolerance> or zoom=<z>
+    and precision=<digits> parameters. Precision of zoom is enough to tell apart its pixels.
+    """
+    tolerance = precision = None
+    try:
+        if params.get('simplify'):
+            tolerance = float(params['simplify'])
+            if tolerance < 0:
+                raise ValueError
+        elif params.get('zoom'):
+            zoom = int(params['zoom'])
+            if not 0 <= zoom <= MAX_ZOOM:
+                raise ValueError
+            tolerance = zoom_tolerance(zoom)
+            precision = int(math.ceil(-math.log10(tolerance)))
+        if params.get('precision'):
+            precision = int(params['precision'])
+            if not 0 <= precision <= MAX_PRECISION:
+                raise ValueError
+    except ValueError:
+        raise BadRequest(u'simplify must be positive number, zoom integer from 0 to %s, precision integer from 0 to %s' % (MAX_ZOOM, MAX_PRECISION))
+    return tolerance or None, precision
+
+def simplify_geometry(geometry, tolerance):
+    if geometry is None or geometry.dims == 0:
+        return geometry
+    return geometry.simplify(tolerance, preserve_topology=geometry.dims == 2)
+
+def geometry_to_simple(geometry):
+    """
+    GeoJSON-like dict of GEOS geometry made of its coordinate tuples, without GeoJSON text.
+    """
+    if geometry is None or geometry.empty:
+        return None
+    if geometry.geom_type == 'GeometryCollection':
+        return {'type': geometry.geom_type, 'geometries': [geometry_to_simple(g) for g in geometry]}
+    return {'type': geometry.geom_type, 'coordinates': geometry.coords}
+
+def round_coordinates(coordinates, precision):
+    if coordinates and isinstance(coordinates[0], (list, tuple)):
+        return [round_coordinates(c, precision) for c in coordinates]
+    return [round(c, precision) for c in coordinates]
+
+def round_geometry(geometry, precision):
+    if geometry.get('type') == 'GeometryCollection':
+        return dict(geometry, geometries=[round_geometry(g, precision) for g in geometry['geometries']])
+    return dict(geometry, coordinates=round_coordinates(geometry['coordinates'], precision))
 
 class GeoJsonSerializer(Serializer):
-    formats = ['geojson', 'shapefile']
+    formats = ['geojson', 'geojsonseq', 'shapefile', 'flatgeobuf', 'geobuf']
      
     content_types = {
         'geojson': 'application/json',
+        'geojsonseq': GEOJSONSEQ_CONTENT_TYPE,
         'shapefile': 'application/zip',
+        'flatgeobuf': FLATGEOBUF_CONTENT_TYPE,
+        'geobuf': GEOBUF_CONTENT_TYPE,
+    }
+
+    #formats written to files, content type -> file extension
+    file_extensions = {
+        'application/zip': 'zip',
+        FLATGEOBUF_CONTENT_TYPE: 'fgb',
+        GEOBUF_CONTENT_TYPE: 'pbf',
     }
     
     def from_geojson(self, *args, **kwargs):
         return self.from_json(*args, **kwargs)
     
-    def to_geojson(self, data, options=None):
+    def build_feature(self, obj, options=None):
         """
-        Given some Python data, produces GeoJSON output.
+        Given simplified object data, produces GeoJSON feature dict.
         """
         options = options or {}
         process_value = options.get('process_value', lambda x: x)
 
-        def _build_feature(obj):
-            f = {
-              "type": "Feature",
-              "properties": {},
-              "geometry": None,
-            }
-          
-            def recurse(key, value):
-                if key == 'id':
-                    f[key] = value
-                    return
-                if type(value)==type({}):
-                    if 'type' in value.keys():
-                        if value['type'] == 'GeometryCollection' or 'coordinates' in value.keys():
-                            if f['geometry']:
-                                f['properties'][key] = process_value(value)
-                            else:
-                                f['geometry'] = value
-                            return
-                    for k in value:
-                        recurse(k, value[k])
-                else:
-                    f['properties'][key] = process_value(value)
-          
-            geometry_field = options.get('geometry_field')
-            if geometry_field and geometry_field in obj:
-                f['geometry'] = obj.pop(geometry_field)
-            for key, value in obj.iteritems():
-                recurse(key, value)
-            return f
-    
-        def _build_feature_collection(objs, meta):
-            fc = {
-                "type": "FeatureCollection",
-                "crs": {
-                    "type": "name",
-                    "properties": {
-                      "name": "urn:ogc:def:crs:OGC:1.3:CRS84"
-                    }
-                },
-                "features": []
-            }
-            if(meta):
-                fc["meta"] = meta
-            for obj in objs:
-                fc['features'].append(_build_feature(obj))
-            return fc
-    
+        f = {
+          "type": "Feature",
+          "properties": {},
+          "geometry": None,
+        }
+      
+        def recurse(key, value):
+            if key == 'id':
+                f[key] = value
+                return
+            if type(value)==type({}):
+                if 'type' in value.keys():
+                    if value['type'] == 'GeometryCollection' or 'coordinates' in value.keys():
+                        if f['geometry']:
+                            f['properties'][key] = process_value(value)
+                        else:
+                            f['geometry'] = value
+                        return
+                for k in value:
+                    recurse(k, value[k])
+            else:
+                f['properties'][key] = process_value(value)
+      
+        geometry_field = options.get('geometry_field')
+        if geometry_field and geometry_field in obj:
+            f['geometry'] = obj.pop(geometry_field)
+        for key, value in obj.iteritems():
+            recurse(key, value)
+        if f['geometry'] and options.get('precision') is not None:
+            f['geometry'] = round_geometry(f['geometry'], options['precision'])
+        return f
+
+    def build_feature_collection(self, objs, meta, options=None):
+        fc = {
+            "type": "FeatureCollection",
+            "crs": CRS,
+            "features": []
+        }
+        if(meta):
+            fc["meta"] = meta
+        for obj in objs:
+            fc['features'].append(self.build_feature(obj, options))
+        return fc
+
+    def dumps(self, data):
+        return json.json.dumps(data, cls=json.DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+
+    def to_geojson(self, data, options=None):
+        """
+        Given some Python data, produces GeoJSON output.
+        """
         options = options or {}    
         data = self.to_simple(data, options)
         meta = data.get('meta')
         
         if 'objects' in data:
-            data = _build_feature_collection(data['objects'], meta)
+            data = self.build_feature_collection(data['objects'], meta, options)
         else:
-            data = _build_feature(data)
-        return json.json.dumps(data, cls=json.DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)   
+            data = self.build_feature(data, options)
+        return self.dumps(data)
+
+    def iter_geojson(self, objects, meta, options=None):
+        """
+        Produces the same output as to_geojson for a feature collection, but yields it
+        piece by piece while consuming objects (bundles or simple data) one at a time,
+        so memory use does not depend on the number of objects.
+        Chunks of about STREAMING_BUFFER_SIZE characters are yielded.
+        """
+        options = options or {}
+        #keys order must match sort_keys=True of dumps: crs, features, meta, type
+        buf = [u'{"crs": %s, "features": [' % self.dumps(CRS)]
+        size = 0
+        separator = u''
+        for obj in objects:
+            chunk = separator + self.dumps(self.build_feature(self.to_simple(obj, options), options))
+            buf.append(chunk)
+            size += len(chunk)
+            separator = u', '
+            if size >= STREAMING_BUFFER_SIZE:
+                yield u''.join(buf)
+                buf = []
+                size = 0
+        buf.append(u']')
+        if meta:
+            buf.append(u', "meta": %s' % self.dumps(self.to_simple(meta, options)))
+        buf.append(u', "type": "FeatureCollection"}')
+        yield u''.join(buf)
     
+    def to_geojsonseq(self, data, options=None):
+        """
+        Given some Python data, produces GeoJSON text sequence: one feature per line, meta is omitted.
+        """
+        options = options or {}
+        data = self.to_simple(data, options)
+        objects = data['objects'] if 'objects' in data else [data]
+        return u''.join(self.iter_geojsonseq(objects, options))
+
+    def iter_geojsonseq(self, objects, options=None):
+        """
+        Yields GeoJSON text sequence of objects (bundles or simple data) consuming them one at a time,
+        in chunks of about STREAMING_BUFFER_SIZE characters.
+        """
+        options = options or {}
+        buf = []
+        size = 0
+        for obj in objects:
+            chunk = u'%s%s\n' % (RECORD_SEPARATOR, self.dumps(self.build_feature(self.to_simple(obj, options), options)))
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= STREAMING_BUFFER_SIZE:
+                yield u''.join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield u''.join(buf)
+
+    def write_shapefile(self, fileobj, objects, options=None):
+        """
+        Writes zipped shapefile of objects (bundles or simple data) into fileobj. Objects are
+        consumed one at a time.
+        """
+        options = options or {}
+        features = (self.build_feature(self.to_simple(obj, options), options) for obj in objects)
+        write_zipped_shapefile(fileobj, options.get('name', 'layer'), features, fields=options.get('fields'),
+                               encoding=options.get('encoding', 'utf8'), size=options.get('size', 254))
+
     def to_shapefile(self, data, options=None):
+        return self.to_file(self.write_shapefile, data, options)
+
+    def write_flatgeobuf(self, fileobj, features, options=None):
+        """
+        Writes FlatGeobuf of GeoJSON-like features into fileobj. Features are consumed one at a time.
+        """
         options = options or {}
-        size = options.pop('size', 254)
-        encoding = options.pop('encoding', 'utf8')
+        write_flatgeobuf(fileobj, options.get('name', 'layer'), features, options.get('columns', []),
+                         options.get('geometry_type'), options.get('has_z', False))
 
-        def trunc_value(value, size=size, encoding=encoding):
-            if isinstance(value, basestring):
-                encoded = value.encode(encoding)[:size]
-                return encoded.decode(encoding, 'ignore')
-            else:
-                return value
+    def to_flatgeobuf(self, data, options=None):
+        return self.to_file(self.write_flatgeobuf, data, options, features=True)
 
-        options.update({'process_value': trunc_value})
-        return geojson_to_zipshape(self.to_geojson(data, options))
+    def write_geobuf(self, fileobj, features, options=None):
+        """
+        Writes geobuf of GeoJSON-like features into fileobj. Features are consumed one at a time.
+        """
+        options = options or {}
+        precision = options.get('precision')
+        write_geobuf(fileobj, features, [name for name, column_type in options.get('columns', [])],
+                     3 if options.get('has_z') else 2, 6 if precision is None else precision)
+
+    def to_geobuf(self, data, options=None):
+        return self.to_file(self.write_geobuf, data, options, features=True)
+
+    def to_file(self, write, data, options=None, features=False):
+        options = options or {}
+        data = self.to_simple(data, options)
+        objects = data['objects'] if 'objects' in data else [data]
+        if features:
+            objects = (self.build_feature(obj, options) for obj in objects)
+        fileobj = tempfile.TemporaryFile()
+        write(fileobj, objects, options)
+        fileobj.seek(0)
+        return fileobj.read()
@@ -0,0 +1,126 @@
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.migrations.state import ModelState
+from mutant.compat import StateApps
+from userlayers.settings import SCHEMA_CHANGE_BATCH_SIZE, SCHEMA_CHANGE_THROTTLE
+from .batch import lock_table, chunks
+from .cache import data_versions
+from .changes import change_log
+from .streaming import queryset_iterator
+
+def shadow_table_name(db_table, suffix):
+    suffix = '_%s' % suffix
+    return db_table[:63 - len(suffix)] + suffix
+
+def build_shadow_model(model_class, db_table, field_name, new_field=None):
+    """
+    Model of table db_table with schema of model_class where field_name is replaced by new_field
+    or left out if new_field is None. It is rendered in its own apps, so model of table is kept.
+    """
+    state = model_class.get_model_state()
+    fields = []
+    for name, field in state.fields:
+        if name == field_name:
+            if new_field is None:
+                continue
+            field = new_field
+        fields.append((name, field))
+    state = ModelState(state.app_label, state.name, fields, dict(state.options, db_table=db_table), state.bases)
+    apps = StateApps([], {})
+    apps.render_multiple([state])
+    return apps.get_model(state.app_label, state.name)
+
+class ShadowTableCopy(object):
+    """
+    Changes column of user table without locking it for the whole change. Rows are copied into shadow
+    table with new schema by batches of batch_size rows, each in its own transaction, sleeping throttle
+    seconds between them. Rows written meanwhile are found in change log and copied again in the final
+    transaction, which blocks writers of the table, then shadow table replaces the table.
+    Values which can't be converted to type of altered column are stored as null and counted.
+    """
+    def __init__(self, md, field_name, new_field=None, suffix='shadow', batch_size=SCHEMA_CHANGE_BATCH_SIZE,
+                 throttle=SCHEMA_CHANGE_THROTTLE):
+        self.model_class = md.model_class()
+        self.table_pk = md.pk
+        self.db_table = self.model_class._meta.db_table
+        self.field_name = field_name
+        self.shadow = build_shadow_model(self.model_class, shadow_table_name(self.db_table, suffix), field_name, new_field)
+        self.batch_size = batch_size
+        self.throttle = throttle
+        self.rows_copied = 0
+        self.invalid_values = 0
+
+    def convert(self, obj):
+        values = {}
+        for f in self.shadow._meta.concrete_fields:
+            value = getattr(obj, f.attname)
+            if f.name == self.field_name and value is not None:
+                try:
+                    value = f.to_python(value)
+                except (ValidationError, ValueError, TypeError):
+                    value = None
+                    self.invalid_values += 1
+            values[f.attname] = value
+        return self.shadow(**values)
+
+    def copy(self, objects):
+        self.shadow.objects.bulk_create([self.convert(obj) for obj in objects])
+
+    def copy_rows(self, progress=None):
+        batch = []
+        for obj in queryset_iterator(self.model_class.objects.all(), chunk_size=self.batch_size):
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                self.copy(batch)
+                self.rows_copied += len(batch)
+                batch = []
+                if progress:
+                    progress(self)
+                time.sleep(self.throttle)
+        if batch:
+            self.copy(batch)
+            self.rows_copied += len(batch)
+            if progress:
+                progress(self)
+
+    def copy_changed(self, since):
+        """
+        Copies again rows changed after change token since, rows deleted from table are deleted from shadow table.
+        """
+        more = True
+        while more:
+            pks, since, more = change_log.get_changes(self.table_pk, since, self.batch_size)
+            for chunk in chunks(pks, self.batch_size):
+                self.shadow.objects.filter(pk__in=chunk).delete()
+                self.copy(self.model_class.objects.filter(pk__in=chunk))
+        return since
+
+    def run(self, swap, progress=None):
+        """
+        Copies table and replaces it by shadow table, swap is called in the final transaction to update
+        definition of table.
+        """
+        with connection.schema_editor() as editor:
+            editor.create_model(self.shadow)
+        since = change_log.get_token(self.table_pk)
+        try:
+            self.copy_rows(progress)
+            with transaction.atomic():
+                lock_table(self.model_class)
+                #the first write takes lock of SQLite database before changes are read
+                data_versions.bump(self.table_pk)
+                #changes committed since the start are copied, later ones wait for the lock
+                self.copy_changed(since)
+                cursor = connection.cursor()
+                for sql in connection.ops.sequence_reset_sql(no_style(), [self.shadow]):
+                    cursor.execute(sql)
+                with connection.schema_editor() as editor:
+                    editor.delete_model(self.model_class)
+                    editor.alter_db_table(self.shadow, self.shadow._meta.db_table, self.db_table)
+                swap()
+        except Exception:
+            with connection.schema_editor() as editor:
+                editor.delete_model(self.shadow)
+            raise
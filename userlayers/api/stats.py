@@ -0,0 +1,87 @@
+from django.db.models import F, Min, Max, Avg, Count, Case, When, Value, Func, IntegerField
+from django.contrib.gis.db.models import Extent
+from tastypie.exceptions import BadRequest
+
+NUMERIC_TYPES = ('IntegerField', 'BigIntegerField', 'SmallIntegerField', 'PositiveIntegerField',
+                 'PositiveSmallIntegerField', 'FloatField', 'DecimalField')
+#types with min and max, but no average
+ORDERED_TYPES = ('DateField', 'DateTimeField', 'TimeField', 'CharField', 'TextField', 'EmailField', 'URLField', 'SlugField')
+BOOLEAN_TYPES = ('BooleanField', 'NullBooleanField')
+DEFAULT_BINS = 10
+MAX_BINS = 100
+
+class FloorInteger(Func):
+    """
+    Integer part of non-negative number, SQLite truncates it by CAST, PostgreSQL rounds.
+    """
+    template = 'CAST(%(expressions)s AS INTEGER)'
+
+    def __init__(self, expression):
+        super(FloorInteger, self).__init__(expression, output_field=IntegerField())
+
+    def as_postgresql(self, compiler, connection):
+        return self.as_sql(compiler, connection, template='CAST(FLOOR(%(expressions)s) AS INTEGER)')
+
+def parse_bins(params):
+    try:
+        bins = int(params.get('bins', DEFAULT_BINS))
+        if not 0 <= bins <= MAX_BINS:
+            raise ValueError
+    except ValueError:
+        raise BadRequest(u'bins must be integer from 0 to %s' % MAX_BINS)
+    return bins
+
+def get_aggregates(fields, geometry_field_name):
+    aggregates = {'count': Count('pk'), 'extent': Extent(geometry_field_name)}
+    for f in fields:
+        internal_type = f.get_internal_type()
+        aggregates['%s__values' % f.name] = Count(f.name)
+        aggregates['%s__distinct' % f.name] = Count(f.name, distinct=True)
+        if internal_type in NUMERIC_TYPES or internal_type in ORDERED_TYPES:
+            aggregates['%s__min' % f.name] = Min(f.name)
+            aggregates['%s__max' % f.name] = Max(f.name)
+        if internal_type in NUMERIC_TYPES:
+            aggregates['%s__avg' % f.name] = Avg(f.name)
+        if internal_type in BOOLEAN_TYPES:
+            aggregates['%s__true' % f.name] = Count(Case(When(**{f.name: True, 'then': Value(1)}), output_field=IntegerField()))
+    return aggregates
+
+def get_histogram(queryset, field_name, minimum, maximum, bins):
+    """
+    Returns bin edges and counts of values in bins of equal width, counted by one grouped query.
+    """
+    minimum, maximum = float(minimum), float(maximum)
+    width = (maximum - minimum) / bins
+    edges = [minimum + width * i for i in range(bins)] + [maximum]
+    counts = [0] * bins
+    if not width:
+        counts[0] = queryset.exclude(**{field_name: None}).count()
+        return {'edges': edges, 'counts': counts}
+    bucket = FloorInteger((F(field_name) - Value(minimum)) / Value(width))
+    rows = queryset.exclude(**{field_name: None}).annotate(bucket=bucket).values('bucket').annotate(n=Count('pk')).order_by()
+    for row in rows:
+        #maximum falls into the last bin
+        counts[min(max(row['bucket'], 0), bins - 1)] += row['n']
+    return {'edges': edges, 'counts': counts}
+
+def table_stats(queryset, fields, geometry_field_name, bins=DEFAULT_BINS):
+    """
+    Statistics of rows of queryset computed by database: row count, extent of geometries, count of
+    nulls and distinct values of every field, min, max and average of ordered (numeric) fields and
+    histograms of numeric fields. All but histograms are computed by one query.
+    """
+    queryset = queryset.order_by()
+    result = queryset.aggregate(**get_aggregates(fields, geometry_field_name))
+    count = result['count']
+    stats = {'count': count, 'extent': list(result['extent']) if result['extent'] else None, 'fields': {}}
+    for f in fields:
+        values = result['%s__values' % f.name]
+        field_stats = {'nulls': count - values, 'distinct': result['%s__distinct' % f.name]}
+        for key in ('min', 'max', 'avg', 'true'):
+            name = '%s__%s' % (f.name, key)
+            if name in result:
+                field_stats[key] = result[name]
+        if f.get_internal_type() in NUMERIC_TYPES and bins and values:
+            field_stats['histogram'] = get_histogram(queryset, f.name, field_stats['min'], field_stats['max'], bins)
+        stats['fields'][f.name] = field_stats
+    return stats
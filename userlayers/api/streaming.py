@@ -0,0 +1,70 @@
+from django.db.models.query import QuerySet
+from userlayers.settings import STREAMING_CHUNK_SIZE
+
+def queryset_iterator(queryset, chunk_size=STREAMING_CHUNK_SIZE, offset=0, limit=None):
+    """
+    Iterates over queryset in its order (primary key order if it has none) fetching chunk_size rows
+    per query. Django has no server-side cursors here and QuerySet.iterator() still loads the whole
+    result into the db driver's memory, so rows are paged instead: by primary key when rows are
+    ordered by it, then every chunk query is an index range scan; by offset otherwise, with primary
+    key breaking ties of the ordering so that chunks don't overlap. Only one chunk is held in memory
+    at a time.
+    """
+    if not isinstance(queryset, QuerySet):
+        #authorization may replace queryset with plain list
+        for obj in queryset[offset:offset + limit if limit else None]:
+            yield obj
+        return
+    ordering = list(queryset.query.order_by or (queryset.query.default_ordering and queryset.model._meta.ordering) or [])
+    pk_names = ('pk', queryset.model._meta.pk.name)
+    if ordering and ordering[0].lstrip('-') not in pk_names:
+        if not any(name.lstrip('-') in pk_names for name in ordering):
+            ordering.append('pk')
+        chunks = iter_offset_chunks(queryset.order_by(*ordering), chunk_size, offset, limit)
+    else:
+        descending = bool(ordering) and ordering[0].startswith('-')
+        chunks = iter_pk_chunks(queryset, chunk_size, offset, limit, descending)
+    for chunk in chunks:
+        for obj in chunk:
+            yield obj
+
+def iter_pk_chunks(queryset, chunk_size, offset, limit, descending=False):
+    queryset = queryset.order_by('-pk' if descending else 'pk')
+    after = 'pk__lt' if descending else 'pk__gt'
+    if offset:
+        try:
+            first_pk = queryset.values_list('pk', flat=True)[offset]
+        except IndexError:
+            return
+        queryset = queryset.filter(**{'pk__lte' if descending else 'pk__gte': first_pk})
+    remaining = limit or None
+    last_pk = None
+    while True:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        qs = queryset if last_pk is None else queryset.filter(**{after: last_pk})
+        chunk = list(qs[:size])
+        yield chunk
+        if len(chunk) < size:
+            return
+        last_pk = chunk[-1].pk
+        if remaining is not None:
+            remaining -= len(chunk)
+            if not remaining:
+                return
+
+def iter_offset_chunks(queryset, chunk_size, offset, limit):
+    remaining = limit or None
+    while True:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        chunk = list(queryset[offset:offset + size])
+        yield chunk
+        if len(chunk) < size:
+            return
+        offset += len(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+            if not remaining:
+                return
+
+def is_streaming_request(request):
+    return request.GET.get('stream', '').lower() in ('1', 'true') or request.GET.get('limit') == '0'
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import F, Count, Func, CharField
+from django.contrib.gis.db.models import Extent
+from userlayers.models import TableState
+from .cache import data_versions
+
+def merge_extents(a, b):
+    if not a or not b:
+        return a or b
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+def get_type_name(value):
+    #PostGIS and SpatiaLite name types in upper case, SpatiaLite adds dimensions ("POINT Z")
+    return value.split()[0].upper() if value else None
+
+class TableSummary(object):
+    """
+    Row count, extent and geometry types of user tables kept in TableState. Writes of rows update them
+    incrementally: created rows are counted and their geometries merged into extent and types; deleted
+    rows are subtracted from count. Summary is rebuilt when deleted or updated rows reach bounds of
+    extent, so extent stays exact; geometry types are not narrowed otherwise, they may list types of
+    deleted rows until the next rebuild. Tables created before summaries were kept have null row count,
+    their summary is rebuilt by next authorized request for table data.
+    """
+    def get(self, state):
+        if state is None or state.row_count is None:
+            return {'row_count': None, 'extent': None, 'geometry_types': None, 'modified': state.modified if state else None}
+        return {
+            'row_count': state.row_count,
+            'extent': state.extent,
+            'geometry_types': [t for t in state.geometry_types.split(',') if t],
+            'modified': state.modified,
+        }
+
+    def reset(self, table_pk):
+        """
+        Summary of empty table.
+        """
+        data_versions.get_state(table_pk)
+        TableState.objects.filter(md_id=table_pk).update(row_count=0, extent_minx=None, extent_miny=None,
+                                                         extent_maxx=None, extent_maxy=None, geometry_types='')
+
+    @transaction.atomic
+    def add(self, table_pk, count=0, geometries=()):
+        """
+        Adds count (negative for deletes) to row count and merges geometries into extent and types.
+        """
+        geometries = [g for g in geometries if g is not None and not g.empty]
+        if not geometries:
+            #null row count stays null
+            TableState.objects.filter(md_id=table_pk).update(row_count=F('row_count') + count)
+            return
+        data_versions.get_state(table_pk)
+        state = TableState.objects.select_for_update().get(md_id=table_pk)
+        if state.row_count is None:
+            return
+        extent = state.extent
+        types = set(t for t in state.geometry_types.split(',') if t)
+        for geometry in geometries:
+            extent = merge_extents(extent, list(geometry.extent))
+            types.add(get_type_name(geometry.geom_type))
+        state.row_count += count
+        state.extent = extent
+        state.geometry_types = ','.join(sorted(types))
+        state.save(update_fields=['row_count', 'extent_minx', 'extent_miny', 'extent_maxx', 'extent_maxy', 'geometry_types'])
+
+    def touches_extent(self, table_pk, queryset, geometry_field_name):
+        """
+        Whether geometries of rows of queryset, which are about to be deleted or updated, reach bounds of
+        extent of table, summary has to be rebuilt after the write then.
+        """
+        extent = data_versions.get_state(table_pk).extent
+        if extent is None:
+            return False
+        removed = queryset.order_by().aggregate(extent=Extent(geometry_field_name))['extent']
+        if not removed:
+            return False
+        return removed[0] <= extent[0] or removed[1] <= extent[1] or removed[2] >= extent[2] or removed[3] >= extent[3]
+
+    def rebuild(self, table_pk, queryset, geometry_field_name):
+        """
+        Computes summary of table rows by two queries.
+        """
+        queryset = queryset.order_by()
+        result = queryset.aggregate(count=Count('pk'), extent=Extent(geometry_field_name))
+        geometry_type = Func(F(geometry_field_name), function='GeometryType', output_field=CharField())
+        types = queryset.exclude(**{geometry_field_name: None}).annotate(geometry_type=geometry_type)
+        types = set(get_type_name(t) for t in types.values_list('geometry_type', flat=True).distinct())
+        data_versions.get_state(table_pk)
+        state = TableState(md_id=table_pk, row_count=result['count'], geometry_types=','.join(sorted(t for t in types if t)))
+        state.extent = list(result['extent']) if result['extent'] else None
+        TableState.objects.filter(md_id=table_pk).update(row_count=state.row_count, geometry_types=state.geometry_types,
+                                                         extent_minx=state.extent_minx, extent_miny=state.extent_miny,
+                                                         extent_maxx=state.extent_maxx, extent_maxy=state.extent_maxy)
+
+table_summary = TableSummary()
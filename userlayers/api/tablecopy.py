@@ -0,0 +1,59 @@
+from django.db import connection
+from django.contrib.gis.db.models import GeometryField
+
+def get_column_error(target_field, source_field):
+    """
+    Returns why values of source_field can't be inserted into target_field as they are, None if they can.
+    """
+    if target_field.get_internal_type() != source_field.get_internal_type():
+        return u'column "%s" is %s, column "%s" is %s' % (target_field.name, target_field.get_internal_type(),
+                                                         source_field.name, source_field.get_internal_type())
+    if isinstance(target_field, GeometryField):
+        if target_field.geom_type not in ('GEOMETRY', source_field.geom_type) or target_field.dim != source_field.dim \
+                or target_field.srid != source_field.srid:
+            return u'geometries of column "%s" don\'t fit column "%s"' % (source_field.name, target_field.name)
+    if target_field.max_length and (not source_field.max_length or source_field.max_length > target_field.max_length):
+        return u'values of column "%s" may be longer than column "%s"' % (source_field.name, target_field.name)
+    return None
+
+def map_columns(target_model, source_model, mapping=None):
+    """
+    Returns (target field name, source field name) pairs of columns copied from source_model table into
+    target_model table and errors of mapping. Without mapping (target field name -> source field name)
+    columns of the same name are copied. Primary keys are never copied.
+    """
+    target_fields = dict((f.name, f) for f in target_model._meta.fields if not f.primary_key)
+    source_fields = dict((f.name, f) for f in source_model._meta.fields if not f.primary_key)
+    if mapping is None:
+        mapping = dict((name, name) for name in target_fields if name in source_fields)
+    columns, errors = [], {}
+    for target_name, source_name in sorted(mapping.items()):
+        if target_name not in target_fields:
+            errors[target_name] = u'table has no column "%s"' % target_name
+        elif source_name not in source_fields:
+            errors[target_name] = u'source table has no column "%s"' % source_name
+        else:
+            error = get_column_error(target_fields[target_name], source_fields[source_name])
+            if error:
+                errors[target_name] = error
+            else:
+                columns.append((target_name, source_name))
+    return columns, errors
+
+def copy_rows(target_model, source_model, columns):
+    """
+    Copies all rows of source_model table into target_model table by one INSERT ... SELECT, columns are
+    (target field name, source field name) pairs. Rows never leave database, so geometries are copied
+    as they are stored. Returns count of copied rows.
+    """
+    qn = connection.ops.quote_name
+    target_opts = target_model._meta
+    source_opts = source_model._meta
+    cursor = connection.cursor()
+    cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s ORDER BY %s' % (
+        qn(target_opts.db_table),
+        ', '.join(qn(target_opts.get_field(t).column) for t, s in columns),
+        ', '.join(qn(source_opts.get_field(s).column) for t, s in columns),
+        qn(source_opts.db_table),
+        qn(source_opts.pk.column)))
+    return cursor.rowcount
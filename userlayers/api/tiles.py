@@ -0,0 +1,271 @@
+import math
+import struct
+import decimal
+from django.core.cache import caches
+from django.contrib.gis.geos import Polygon
+from django.contrib.gis.geos.error import GEOSException
+from django.utils.encoding import force_text
+from userlayers.settings import TILE_CACHE_ALIAS, TILE_CACHE_TIMEOUT
+from .export import signed_area, orient
+from .pbf import write_varint, write_key, write_bytes, write_packed, zigzag
+
+CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+EXTENT = 4096
+#tile coordinates features are kept beyond tile edges, so lines and polygon edges don't show at tile joins
+BUFFER = 64
+MAX_ZOOM = 24
+EARTH_RADIUS = 6378137.0
+MAX_LATITUDE = 85.0511287798066
+
+#vector_tile.proto GeomType
+POINT, LINESTRING, POLYGON = 1, 2, 3
+#geometry commands
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+COLLECTION_TYPES = ('MultiPoint', 'MultiLineString', 'MultiPolygon', 'GeometryCollection')
+
+def command(cmd, count):
+    return cmd | (count << 3)
+
+def encode_value(value):
+    buf = bytearray()
+    if isinstance(value, bool):
+        write_key(buf, 7, 0)
+        write_varint(buf, int(value))
+    elif isinstance(value, (int, long)):
+        write_key(buf, 6, 0)
+        write_varint(buf, zigzag(value))
+    elif isinstance(value, (float, decimal.Decimal)):
+        write_key(buf, 3, 1)
+        buf.extend(struct.pack('<d', float(value)))
+    else:
+        write_bytes(buf, 1, force_text(value).encode('utf8'))
+    return buf
+
+class TileLayer(object):
+    """
+    Layer of Mapbox Vector Tile (version 2) encoded into protobuf without generated classes.
+    Keys and values of feature properties are shared by all features of the layer.
+    """
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.keys = []
+        self.values = []
+        self.key_index = {}
+        self.value_index = {}
+        self.features = []
+
+    def get_tags(self, properties):
+        tags = []
+        for key in sorted(properties.keys()):
+            value = properties[key]
+            if value is None:
+                continue
+            if key not in self.key_index:
+                self.key_index[key] = len(self.keys)
+                self.keys.append(key)
+            #True == 1, so type is a part of the value key
+            value_key = (type(value), value)
+            if value_key not in self.value_index:
+                self.value_index[value_key] = len(self.values)
+                self.values.append(encode_value(value))
+            tags.extend((self.key_index[key], self.value_index[value_key]))
+        return tags
+
+    def add_feature(self, pk, properties, geom_type, commands):
+        buf = bytearray()
+        if pk is not None:
+            write_key(buf, 1, 0)
+            write_varint(buf, pk)
+        tags = self.get_tags(properties)
+        if tags:
+            write_packed(buf, 2, tags)
+        write_key(buf, 3, 0)
+        write_varint(buf, geom_type)
+        write_packed(buf, 4, commands)
+        self.features.append(buf)
+
+    def encode(self):
+        buf = bytearray()
+        write_key(buf, 15, 0)
+        write_varint(buf, 2)
+        write_bytes(buf, 1, force_text(self.name).encode('utf8'))
+        for feature in self.features:
+            write_bytes(buf, 2, feature)
+        for key in self.keys:
+            write_bytes(buf, 3, force_text(key).encode('utf8'))
+        for value in self.values:
+            write_bytes(buf, 4, value)
+        write_key(buf, 5, 0)
+        write_varint(buf, self.extent)
+        tile = bytearray()
+        write_bytes(tile, 3, buf)
+        return bytes(tile)
+
+def tile_bounds(z, x, y):
+    """
+    Returns (minx, miny, maxx, maxy) of tile in web mercator meters.
+    """
+    size = 2 * math.pi * EARTH_RADIUS / 2 ** z
+    origin = math.pi * EARTH_RADIUS
+    minx = x * size - origin
+    maxy = origin - y * size
+    return minx, maxy - size, minx + size, maxy
+
+def mercator_to_lonlat(mx, my):
+    lon = math.degrees(mx / EARTH_RADIUS)
+    lat = math.degrees(2 * math.atan(math.exp(my / EARTH_RADIUS)) - math.pi / 2)
+    return max(min(lon, 180), -180), lat
+
+def iter_parts(geometry):
+    if geometry.geom_type in COLLECTION_TYPES:
+        for child in geometry:
+            for part in iter_parts(child):
+                yield part
+    else:
+        yield geometry
+
+class TileBuilder(object):
+    """
+    Renders features of one tile. Geometries in WGS 84 are clipped by buffered tile bounds and simplified
+    with tolerance of one tile pixel by GEOS, then projected to web mercator and quantized to tile extent
+    coordinates while encoding.
+    """
+    def __init__(self, z, x, y, extent=EXTENT, buffer=BUFFER):
+        self.extent = extent
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        self.minx, self.maxy = minx, maxy
+        self.scale = extent / (maxx - minx)
+        margin = (maxx - minx) * buffer / extent
+        west, south = mercator_to_lonlat(minx - margin, miny - margin)
+        east, north = mercator_to_lonlat(maxx + margin, maxy + margin)
+        self.bounds = (west, south, east, north)
+        self.bbox = Polygon.from_bbox(self.bounds)
+        self.bbox.srid = 4326
+        #degrees of longitude per pixel shrunk by latitude scale of mercator
+        self.tolerance = (360.0 / 2 ** z / extent) * math.cos(math.radians((south + north) / 2))
+
+    def project(self, coords):
+        lon, lat = coords[0], max(min(coords[1], MAX_LATITUDE), -MAX_LATITUDE)
+        mx = math.radians(lon) * EARTH_RADIUS
+        my = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * EARTH_RADIUS
+        return int(round((mx - self.minx) * self.scale)), int(round((self.maxy - my) * self.scale))
+
+    def project_line(self, coords):
+        points = []
+        for c in coords:
+            point = self.project(c)
+            if not points or point != points[-1]:
+                points.append(point)
+        return points
+
+    def clip(self, geometry):
+        if geometry.empty:
+            return None
+        if geometry.srid and geometry.srid != 4326:
+            geometry = geometry.transform(4326, clone=True)
+        xmin, ymin, xmax, ymax = geometry.extent
+        west, south, east, north = self.bounds
+        if xmin >= west and ymin >= south and xmax <= east and ymax <= north:
+            clipped = geometry
+        else:
+            try:
+                clipped = geometry.intersection(self.bbox)
+            except GEOSException:
+                #invalid polygons are repaired by zero buffer
+                clipped = geometry.buffer(0).intersection(self.bbox)
+        if clipped.empty:
+            return None
+        if clipped.dims > 0:
+            clipped = clipped.simplify(self.tolerance, preserve_topology=clipped.dims == 2)
+        return clipped
+
+    def encode_geometry(self, geometry, dims):
+        commands = []
+        cursor = [0, 0]
+
+        def move(points, cmd):
+            commands.append(command(cmd, len(points)))
+            for px, py in points:
+                commands.append(zigzag(px - cursor[0]))
+                commands.append(zigzag(py - cursor[1]))
+                cursor[0], cursor[1] = px, py
+
+        parts = [p for p in iter_parts(geometry) if p.dims == dims and not p.empty]
+        if dims == 0:
+            points = [self.project(p.coords) for p in parts]
+            if points:
+                move(points, MOVE_TO)
+        elif dims == 1:
+            for part in parts:
+                points = self.project_line(part.coords)
+                if len(points) > 1:
+                    move(points[:1], MOVE_TO)
+                    move(points[1:], LINE_TO)
+        else:
+            for part in parts:
+                for i, ring in enumerate(part):
+                    points = self.project_line(ring.coords)
+                    if len(points) > 1 and points[0] == points[-1]:
+                        points.pop()
+                    if len(points) < 3 or not signed_area(points + points[:1]):
+                        if i == 0:
+                            break
+                        continue
+                    #exterior rings have positive area in tile coordinates (y axis points down)
+                    points = orient(points + points[:1], clockwise=i > 0)[:-1]
+                    move(points[:1], MOVE_TO)
+                    move(points[1:], LINE_TO)
+                    commands.append(command(CLOSE_PATH, 1))
+        return commands
+
+    def add(self, layer, pk, properties, geometry):
+        if geometry is None:
+            return
+        clipped = self.clip(geometry)
+        if clipped is None:
+            return
+        dims = geometry.dims
+        commands = self.encode_geometry(clipped, dims)
+        if commands:
+            layer.add_feature(pk, properties, (POINT, LINESTRING, POLYGON)[dims], commands)
+
+def render_tile(objects, z, x, y, name, geometry_field_name, fields):
+    """
+    Returns tile with one layer of objects, fields are model fields written into feature properties.
+    Empty tile is empty string.
+    """
+    builder = TileBuilder(z, x, y)
+    layer = TileLayer(name)
+    for obj in objects:
+        properties = dict((f.name, getattr(obj, f.attname)) for f in fields)
+        builder.add(layer, obj.pk, properties, getattr(obj, geometry_field_name))
+    if not layer.features:
+        return b''
+    return layer.encode()
+
+class TileCache(object):
+    """
+    Rendered tiles kept in django cache. Keys include schema and data versions of the table, so tiles
+    of changed tables are never served; they are evicted by the cache backend, whose limits (MAX_ENTRIES,
+    memcached memory) bound the space taken by tiles.
+    """
+    key = 'userlayers-tile-%s-%s-%s-%s-%s-%s'
+
+    def __init__(self, alias=TILE_CACHE_ALIAS, timeout=TILE_CACHE_TIMEOUT):
+        self.alias = alias
+        self.timeout = timeout
+
+    def get_or_build(self, build, table_pk, version, z, x, y):
+        if not self.timeout:
+            return build()
+        cache = caches[self.alias]
+        key = self.key % (table_pk, version, z, x, y, EXTENT)
+        content = cache.get(key)
+        if content is None:
+            content = build()
+            cache.set(key, content, self.timeout)
+        return content
+
+tile_cache = TileCache()
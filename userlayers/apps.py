@@ -5,3 +5,9 @@ class UserlayersConfig(AppConfig):
     name = u'userlayers'
     verbose_name = u'Пользовательские слои'
 
+    def ready(self):
+        #workers of background jobs are started by the first request, not by management commands
+        from django.core.signals import request_started
+        from userlayers.api.resources import start_pools
+        request_started.connect(start_pools, dispatch_uid='userlayers-start-pools')
+
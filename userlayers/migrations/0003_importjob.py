@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+import django.db.models.deletion
+import userlayers.files
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mutant', '0001_initial'),
+        ('userlayers', '0002_attachedfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=255)),
+                ('file', models.FileField(upload_to=userlayers.files.UuidHashFilenameUploadTo(b'import_jobs/'), blank=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('status', models.CharField(default='queued', max_length=16, choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')])),
+                ('features_total', models.PositiveIntegerField(null=True)),
+                ('features_imported', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('md', models.ForeignKey(on_delete=django.db.models.deletion.SET_NULL, to='mutant.ModelDefinition', null=True)),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+    ]
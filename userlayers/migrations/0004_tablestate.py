@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mutant', '0001_initial'),
+        ('userlayers', '0003_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableState',
+            fields=[
+                ('md', models.OneToOneField(related_name='state', primary_key=True, serialize=False, to='mutant.ModelDefinition')),
+                ('version', models.BigIntegerField(default=0)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mutant', '0001_initial'),
+        ('userlayers', '0004_tablestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablestate',
+            name='changes_floor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='TableChange',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('object_id', models.PositiveIntegerField()),
+                ('action', models.CharField(max_length=16, choices=[('create', 'create'), ('update', 'update'), ('delete', 'delete')])),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('md', models.ForeignKey(related_name='changes', to='mutant.ModelDefinition')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='tablechange',
+            index_together=set([('md', 'created')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userlayers', '0005_tablechange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablestate',
+            name='row_count',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='tablestate',
+            name='extent_minx',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='tablestate',
+            name='extent_miny',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='tablestate',
+            name='extent_maxx',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='tablestate',
+            name='extent_maxy',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='tablestate',
+            name='geometry_types',
+            field=models.CharField(max_length=255, blank=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mutant', '0001_initial'),
+        ('userlayers', '0006_tablestate_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemaChange',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('operation', models.CharField(max_length=16, choices=[('alter', 'alter'), ('drop', 'drop')])),
+                ('field_name', models.CharField(max_length=255)),
+                ('field_type', models.CharField(max_length=32, blank=True)),
+                ('status', models.CharField(default='queued', max_length=16, choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')])),
+                ('rows_total', models.PositiveIntegerField(null=True)),
+                ('rows_copied', models.PositiveIntegerField(default=0)),
+                ('invalid_values', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('md', models.ForeignKey(related_name='schema_changes', to='mutant.ModelDefinition')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+    ]
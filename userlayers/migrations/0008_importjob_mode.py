@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userlayers', '0007_schemachange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='mode',
+            field=models.CharField(default='create', max_length=16, choices=[('create', 'create'), ('append', 'append'), ('upsert', 'upsert'), ('replace', 'replace')]),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='key',
+            field=models.CharField(max_length=255, blank=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userlayers', '0008_importjob_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='invalid_values',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_changes(apps, schema_editor):
+    #ids of existing entries stay valid as tokens
+    TableChange = apps.get_model('userlayers', 'TableChange')
+    TableState = apps.get_model('userlayers', 'TableState')
+    TableChange.objects.update(seq=F('id'))
+    for row in TableChange.objects.values('md_id').annotate(last=Max('id')).order_by():
+        state, created = TableState.objects.get_or_create(md_id=row['md_id'])
+        TableState.objects.filter(md_id=row['md_id']).update(changes_seq=max(row['last'], state.changes_floor))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userlayers', '0009_importjob_invalid_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablestate',
+            name='changes_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tablechange',
+            name='seq',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='tablechange',
+            index_together=set([('md', 'created'), ('md', 'seq')]),
+        ),
+        migrations.RunPython(number_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('userlayers', '0010_tablechange_seq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='schemachange',
+            name='operation',
+            field=models.CharField(max_length=16, choices=[('alter', 'alter'), ('drop', 'drop'), ('index', 'index')]),
+        ),
+        migrations.AlterField(
+            model_name='schemachange',
+            name='user',
+            field=models.ForeignKey(to=settings.AUTH_USER_MODEL, null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from mutant.models import ModelDefinition
@@ -19,3 +20,151 @@ class AttachedFile(models.Model):
     object_id = models.PositiveIntegerField()
     file = models.FileField(upload_to=attached_file_upload_to)
     object = GenericForeignKey()
+
+import_job_upload_to = UuidHashFilenameUploadTo('import_jobs/')
+
+class ImportJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, STATUS_QUEUED),
+        (STATUS_RUNNING, STATUS_RUNNING),
+        (STATUS_DONE, STATUS_DONE),
+        (STATUS_FAILED, STATUS_FAILED),
+    )
+    #new table is created or rows are appended, upserted by key column or replace rows of existing table md
+    MODE_CREATE = 'create'
+    MODE_APPEND = 'append'
+    MODE_UPSERT = 'upsert'
+    MODE_REPLACE = 'replace'
+    MODE_CHOICES = (
+        (MODE_CREATE, MODE_CREATE),
+        (MODE_APPEND, MODE_APPEND),
+        (MODE_UPSERT, MODE_UPSERT),
+        (MODE_REPLACE, MODE_REPLACE),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    name = models.CharField(max_length=255)
+    file = models.FileField(upload_to=import_job_upload_to, blank=True)
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    features_total = models.PositiveIntegerField(null=True)
+    features_imported = models.PositiveIntegerField(default=0)
+    #values that didn't fit column types and were imported as null
+    invalid_values = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    md = models.ForeignKey(ModelDefinition, null=True, on_delete=models.SET_NULL)
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES, default=MODE_CREATE)
+    #column rows are matched by in upsert mode
+    key = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-created',)
+
+class TableState(models.Model):
+    """
+    Data version of user table: version is incremented and modified is set by every write of table rows.
+    Summary of rows (count, extent, geometry types) is kept here as well, so catalog doesn't query user tables.
+    """
+    md = models.OneToOneField(ModelDefinition, primary_key=True, related_name='state')
+    version = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+    #last change removed from change log, older change tokens can't be served
+    changes_floor = models.BigIntegerField(default=0)
+    #last change token given out, tokens are taken under lock of this row in order of commits
+    changes_seq = models.BigIntegerField(default=0)
+    #summary of table rows, row_count is null if it has to be rebuilt
+    row_count = models.BigIntegerField(null=True)
+    extent_minx = models.FloatField(null=True)
+    extent_miny = models.FloatField(null=True)
+    extent_maxx = models.FloatField(null=True)
+    extent_maxy = models.FloatField(null=True)
+    #comma separated OGC names of geometry types of rows
+    geometry_types = models.CharField(max_length=255, blank=True)
+
+    @property
+    def extent(self):
+        if self.extent_minx is None:
+            return None
+        return [self.extent_minx, self.extent_miny, self.extent_maxx, self.extent_maxy]
+
+    @extent.setter
+    def extent(self, value):
+        self.extent_minx, self.extent_miny, self.extent_maxx, self.extent_maxy = value or (None,) * 4
+
+    @property
+    def token(self):
+        #table pk of deleted table may be reused, modified tells apart versions of old and new table
+        return '%s.%s' % (self.version, self.modified.strftime('%Y%m%d%H%M%S%f'))
+
+class TableChange(models.Model):
+    """
+    Change log entry of user table row, seq is change token. It is null until the writing transaction
+    numbers its entries under lock of TableState row held to commit, so tokens follow order of commits
+    unlike ids.
+    """
+    ACTION_CREATE = 'create'
+    ACTION_UPDATE = 'update'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = (
+        (ACTION_CREATE, ACTION_CREATE),
+        (ACTION_UPDATE, ACTION_UPDATE),
+        (ACTION_DELETE, ACTION_DELETE),
+    )
+
+    md = models.ForeignKey(ModelDefinition, related_name='changes')
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    created = models.DateTimeField(default=timezone.now)
+    seq = models.BigIntegerField(null=True)
+
+    class Meta:
+        index_together = (('md', 'created'), ('md', 'seq'))
+
+class SchemaChange(models.Model):
+    """
+    Change of column of user table made online: rows are copied into shadow table with new schema,
+    which replaces the table at the end. Indexes advised by index advisor are created by changes too,
+    so they are not built by the read request which made them advised.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, STATUS_QUEUED),
+        (STATUS_RUNNING, STATUS_RUNNING),
+        (STATUS_DONE, STATUS_DONE),
+        (STATUS_FAILED, STATUS_FAILED),
+    )
+    OPERATION_ALTER = 'alter'
+    OPERATION_DROP = 'drop'
+    OPERATION_INDEX = 'index'
+    OPERATION_CHOICES = (
+        (OPERATION_ALTER, OPERATION_ALTER),
+        (OPERATION_DROP, OPERATION_DROP),
+        (OPERATION_INDEX, OPERATION_INDEX),
+    )
+
+    #null for advised indexes queued by anonymous requests
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True)
+    md = models.ForeignKey(ModelDefinition, related_name='schema_changes')
+    operation = models.CharField(max_length=16, choices=OPERATION_CHOICES)
+    field_name = models.CharField(max_length=255)
+    #api type of altered field
+    field_type = models.CharField(max_length=32, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    rows_total = models.PositiveIntegerField(null=True)
+    rows_copied = models.PositiveIntegerField(default=0)
+    invalid_values = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-created',)
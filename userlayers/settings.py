@@ -1,7 +1,103 @@
+import os
+import tempfile
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from mutant.contrib.geo.models import GeometryFieldDefinition
 
 SETTINGS_DEFAULT_MD_GEOMETRY_FIELD_NAME = 'USERLAYERS_DEFAULT_MD_GEOMETRY_FIELD_NAME'
 SETTINGS_DEFAULT_MD_GEOMETRY_FIELD_TYPE = 'USERLAYERS_DEFAULT_MD_GEOMETRY_FIELD_TYPE'
 DEFAULT_MD_GEOMETRY_FIELD_NAME = getattr(settings, SETTINGS_DEFAULT_MD_GEOMETRY_FIELD_NAME, 'geometry')
-DEFAULT_MD_GEOMETRY_FIELD_TYPE = getattr(settings, SETTINGS_DEFAULT_MD_GEOMETRY_FIELD_TYPE, GeometryFieldDefinition)
\ No newline at end of file
+DEFAULT_MD_GEOMETRY_FIELD_TYPE = getattr(settings, SETTINGS_DEFAULT_MD_GEOMETRY_FIELD_TYPE, GeometryFieldDefinition)
+
+SETTINGS_STREAMING_CHUNK_SIZE = 'USERLAYERS_STREAMING_CHUNK_SIZE'
+SETTINGS_STREAMING_BUFFER_SIZE = 'USERLAYERS_STREAMING_BUFFER_SIZE'
+#rows fetched from db per query while streaming
+STREAMING_CHUNK_SIZE = getattr(settings, SETTINGS_STREAMING_CHUNK_SIZE, 2000)
+#approximate size in characters of chunks sent to client while streaming
+STREAMING_BUFFER_SIZE = getattr(settings, SETTINGS_STREAMING_BUFFER_SIZE, 64 * 1024)
+
+SETTINGS_CACHE_ALIAS = 'USERLAYERS_CACHE_ALIAS'
+SETTINGS_EXPORT_CACHE = 'USERLAYERS_EXPORT_CACHE'
+SETTINGS_EXPORT_CACHE_DIR = 'USERLAYERS_EXPORT_CACHE_DIR'
+#django cache used to share table versions between processes
+CACHE_ALIAS = getattr(settings, SETTINGS_CACHE_ALIAS, 'default')
+#keep finished export archives on disk until table data changes
+EXPORT_CACHE = getattr(settings, SETTINGS_EXPORT_CACHE, True)
+EXPORT_CACHE_DIR = getattr(settings, SETTINGS_EXPORT_CACHE_DIR, os.path.join(tempfile.gettempdir(), 'userlayers_exports'))
+
+SETTINGS_IMPORT_BATCH_SIZE = 'USERLAYERS_IMPORT_BATCH_SIZE'
+#objects written to db per query by file import and batch writes
+IMPORT_BATCH_SIZE = getattr(settings, SETTINGS_IMPORT_BATCH_SIZE, 1000)
+
+SETTINGS_IMPORT_WORKERS = 'USERLAYERS_IMPORT_WORKERS'
+SETTINGS_IMPORT_QUEUE_SIZE = 'USERLAYERS_IMPORT_QUEUE_SIZE'
+SETTINGS_IMPORT_POLL_INTERVAL = 'USERLAYERS_IMPORT_POLL_INTERVAL'
+#background threads per process running asynchronous imports, 0 runs them in request thread
+IMPORT_WORKERS = getattr(settings, SETTINGS_IMPORT_WORKERS, 2)
+#maximum count of queued import jobs, further asynchronous imports are rejected
+IMPORT_QUEUE_SIZE = getattr(settings, SETTINGS_IMPORT_QUEUE_SIZE, 20)
+#seconds idle worker waits before looking for queued jobs of other processes
+IMPORT_POLL_INTERVAL = getattr(settings, SETTINGS_IMPORT_POLL_INTERVAL, 5)
+
+SETTINGS_JOB_TIMEOUT = 'USERLAYERS_JOB_TIMEOUT'
+#seconds running job (import or schema change) may go without heartbeat before it's failed as abandoned by dead process
+JOB_TIMEOUT = getattr(settings, SETTINGS_JOB_TIMEOUT, 300)
+
+SETTINGS_IMPORT_TYPE_SAMPLE_SIZE = 'USERLAYERS_IMPORT_TYPE_SAMPLE_SIZE'
+#features examined to infer column types of imported file, they are kept in memory until table is created
+IMPORT_TYPE_SAMPLE_SIZE = getattr(settings, SETTINGS_IMPORT_TYPE_SAMPLE_SIZE, 1000)
+#upper limit of sample, so memory used by import doesn't depend on file size
+MAX_IMPORT_TYPE_SAMPLE_SIZE = 100000
+if not 0 < IMPORT_TYPE_SAMPLE_SIZE <= MAX_IMPORT_TYPE_SAMPLE_SIZE:
+    raise ImproperlyConfigured('%s must be between 1 and %s' % (SETTINGS_IMPORT_TYPE_SAMPLE_SIZE, MAX_IMPORT_TYPE_SAMPLE_SIZE))
+
+SETTINGS_BATCH_MAX_FEATURES = 'USERLAYERS_BATCH_MAX_FEATURES'
+#maximum count of features in one batch write request
+BATCH_MAX_FEATURES = getattr(settings, SETTINGS_BATCH_MAX_FEATURES, 10000)
+
+SETTINGS_AUTH_CACHE_TIMEOUT = 'USERLAYERS_AUTH_CACHE_TIMEOUT'
+#seconds sets of tables available to user are cached between requests, 0 resolves them once per request
+AUTH_CACHE_TIMEOUT = getattr(settings, SETTINGS_AUTH_CACHE_TIMEOUT, 0)
+
+SETTINGS_TILE_CACHE_ALIAS = 'USERLAYERS_TILE_CACHE_ALIAS'
+SETTINGS_TILE_CACHE_TIMEOUT = 'USERLAYERS_TILE_CACHE_TIMEOUT'
+#django cache keeping rendered vector tiles, limits of its backend bound memory or disk taken by tiles
+TILE_CACHE_ALIAS = getattr(settings, SETTINGS_TILE_CACHE_ALIAS, CACHE_ALIAS)
+#seconds rendered vector tiles are kept, tiles of changed tables are never served, 0 disables the cache
+TILE_CACHE_TIMEOUT = getattr(settings, SETTINGS_TILE_CACHE_TIMEOUT, 24 * 3600)
+
+SETTINGS_CHANGES_RETENTION = 'USERLAYERS_CHANGES_RETENTION'
+SETTINGS_CHANGES_COMPACT_INTERVAL = 'USERLAYERS_CHANGES_COMPACT_INTERVAL'
+SETTINGS_CHANGES_PAGE_SIZE = 'USERLAYERS_CHANGES_PAGE_SIZE'
+#seconds changes of table rows are kept, clients with older change tokens have to download table again
+CHANGES_RETENTION = getattr(settings, SETTINGS_CHANGES_RETENTION, 30 * 24 * 3600)
+#minimal seconds between removals of expired changes of one table
+CHANGES_COMPACT_INTERVAL = getattr(settings, SETTINGS_CHANGES_COMPACT_INTERVAL, 3600)
+#maximum count of changed objects in one response of change feed
+CHANGES_PAGE_SIZE = getattr(settings, SETTINGS_CHANGES_PAGE_SIZE, 1000)
+
+SETTINGS_SCHEMA_CHANGE_WORKERS = 'USERLAYERS_SCHEMA_CHANGE_WORKERS'
+SETTINGS_SCHEMA_CHANGE_BATCH_SIZE = 'USERLAYERS_SCHEMA_CHANGE_BATCH_SIZE'
+SETTINGS_SCHEMA_CHANGE_THROTTLE = 'USERLAYERS_SCHEMA_CHANGE_THROTTLE'
+#background threads per process running online schema changes, 0 runs them in request thread
+SCHEMA_CHANGE_WORKERS = getattr(settings, SETTINGS_SCHEMA_CHANGE_WORKERS, 1)
+#rows copied into shadow table per transaction by online schema changes
+SCHEMA_CHANGE_BATCH_SIZE = getattr(settings, SETTINGS_SCHEMA_CHANGE_BATCH_SIZE, IMPORT_BATCH_SIZE)
+#seconds online schema change sleeps between batches, leaving database to requests
+SCHEMA_CHANGE_THROTTLE = getattr(settings, SETTINGS_SCHEMA_CHANGE_THROTTLE, 0.1)
+
+SETTINGS_INDEX_ADVISOR = 'USERLAYERS_INDEX_ADVISOR'
+SETTINGS_INDEX_ADVISOR_WINDOW = 'USERLAYERS_INDEX_ADVISOR_WINDOW'
+SETTINGS_INDEX_ADVISOR_MIN_QUERIES = 'USERLAYERS_INDEX_ADVISOR_MIN_QUERIES'
+SETTINGS_INDEX_ADVISOR_THRESHOLD = 'USERLAYERS_INDEX_ADVISOR_THRESHOLD'
+SETTINGS_INDEX_ADVISOR_AUTO_CREATE = 'USERLAYERS_INDEX_ADVISOR_AUTO_CREATE'
+#count columns filtered and ordered by list queries of table data to advise indexes
+INDEX_ADVISOR = getattr(settings, SETTINGS_INDEX_ADVISOR, False)
+#seconds query counters are kept in django cache
+INDEX_ADVISOR_WINDOW = getattr(settings, SETTINGS_INDEX_ADVISOR_WINDOW, 7 * 24 * 3600)
+#queries of table counted before any index is advised
+INDEX_ADVISOR_MIN_QUERIES = getattr(settings, SETTINGS_INDEX_ADVISOR_MIN_QUERIES, 100)
+#share of queries of table filtering or ordering by column which makes its index advised
+INDEX_ADVISOR_THRESHOLD = getattr(settings, SETTINGS_INDEX_ADVISOR_THRESHOLD, 0.2)
+#create advised indexes automatically
+INDEX_ADVISOR_AUTO_CREATE = getattr(settings, SETTINGS_INDEX_ADVISOR_AUTO_CREATE, False)
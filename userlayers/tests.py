@@ -1,9 +1,36 @@
+import io
+import os
+import struct
+import tempfile
+import glob
 import json
+import zipfile
+import datetime
+from django.core.urlresolvers import resolve
+from django.db import connection
+from django.core.cache import caches
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from tastypie.test import ResourceTestCase
-from userlayers.api.resources import TablesResource, FieldsResource
+from userlayers.api.resources import TablesResource, FieldsResource, TableProxyResource, FileImportResource, import_pool, schema_change_pool
+from userlayers.api import batch
+from userlayers.api.cache import resource_cache
+from userlayers.api.advisor import index_advisor
+from userlayers.api.streaming import queryset_iterator
+from userlayers.api.changes import change_log
+from userlayers.api.authorization import get_table_auth, TableAuthorization
+from userlayers.models import UserToTable, TableState, TableChange, SchemaChange, ImportJob
+from mutant.models import ModelDefinition
+from userlayers.api.export import export_cache
+from userlayers.api.imports import ImportSchema, GeoJSONSeqReader
+from userlayers.settings import IMPORT_TYPE_SAMPLE_SIZE, MAX_IMPORT_TYPE_SAMPLE_SIZE
+from userlayers.api.flatgeobuf import MAGIC as FLATGEOBUF_MAGIC, CONTENT_TYPE as FLATGEOBUF_CONTENT_TYPE, write_flatgeobuf
+from userlayers.api.flatgeobuf import BOOL as FLATGEOBUF_BOOL, LONG as FLATGEOBUF_LONG, DOUBLE as FLATGEOBUF_DOUBLE, STRING as FLATGEOBUF_STRING
+from userlayers.api.geobuf import CONTENT_TYPE as GEOBUF_CONTENT_TYPE, write_geobuf
 from django.contrib.gis.geos.geometry import GEOSGeometry
+from osgeo import ogr
 
 TABLE_META = {
     'name': 'foo',
@@ -28,6 +55,184 @@ TABLE_META = {
 }
 
 
+class PublicTableAuthorization(TableAuthorization):
+    def check_data_view(self, md, user):
+        return md.verbose_name.startswith('public') or super(PublicTableAuthorization, self).check_data_view(md, user)
+
+
+class FlatBufferTable(object):
+    """
+    Reads fields of FlatBuffers table at pos of buf, independently of the writer.
+    """
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        self.vtable = pos - struct.unpack_from('<i', buf, pos)[0]
+        self.vtable_size = struct.unpack_from('<H', buf, self.vtable)[0]
+
+    def offset(self, index):
+        o = 4 + 2 * index
+        return struct.unpack_from('<H', self.buf, self.vtable + o)[0] if o < self.vtable_size else 0
+
+    def scalar(self, index, fmt, default=0):
+        o = self.offset(index)
+        return struct.unpack_from(fmt, self.buf, self.pos + o)[0] if o else default
+
+    def ref(self, index):
+        o = self.offset(index)
+        if not o:
+            return None
+        return self.pos + o + struct.unpack_from('<I', self.buf, self.pos + o)[0]
+
+    def string(self, index):
+        pos = self.ref(index)
+        return bytes(self.buf[pos + 4:pos + 4 + struct.unpack_from('<I', self.buf, pos)[0]]).decode('utf8')
+
+    def vector(self, index, code):
+        pos = self.ref(index)
+        if pos is None:
+            return []
+        count = struct.unpack_from('<I', self.buf, pos)[0]
+        return list(struct.unpack_from('<%d%s' % (count, code), self.buf, pos + 4))
+
+    def table(self, index):
+        pos = self.ref(index)
+        return None if pos is None else FlatBufferTable(self.buf, pos)
+
+    def tables(self, index):
+        pos = self.ref(index)
+        items = [pos + 4 + 4 * i for i in range(struct.unpack_from('<I', self.buf, pos)[0])]
+        return [FlatBufferTable(self.buf, item + struct.unpack_from('<I', self.buf, item)[0]) for item in items]
+
+def read_size_prefixed(data, pos):
+    """
+    Returns root table of size prefixed FlatBuffer at pos of data and position following it.
+    """
+    size = struct.unpack_from('<I', data, pos)[0]
+    buf = bytearray(data[pos:pos + 4 + size])
+    return FlatBufferTable(buf, 4 + struct.unpack_from('<I', buf, 4)[0]), pos + 4 + size
+
+def read_flatgeobuf(data):
+    """
+    Decodes FlatGeobuf: returns header (name, columns, count, index node size) and features (id, properties, coordinates)
+    in file order, checking that leaves of index point to them.
+    """
+    assert data[:8] == FLATGEOBUF_MAGIC
+    header, pos = read_size_prefixed(data, 8)
+    columns = [(c.string(0), c.scalar(1, '<B')) for c in header.tables(7)]
+    count = header.scalar(8, '<Q')
+    node_size = header.scalar(9, '<H', 16)
+    nodes = level = count
+    while node_size and count:
+        #root is counted even if it is the only leaf
+        level = (level + node_size - 1) // node_size
+        nodes += level
+        if level == 1:
+            break
+    leaves = [struct.unpack_from('<ddddQ', data, pos + 40 * i)[4] for i in range(nodes - count, nodes)] if node_size else []
+    pos += 40 * nodes if node_size else 0
+    features_start = pos
+    offsets, features = [], []
+    while pos < len(data):
+        offsets.append(pos - features_start)
+        feature, pos = read_size_prefixed(data, pos)
+        properties = {}
+        buf = bytearray(feature.vector(1, 'B'))
+        i = 0
+        while i < len(buf):
+            name, column_type = columns[struct.unpack_from('<H', buf, i)[0]]
+            i += 2
+            if column_type == FLATGEOBUF_BOOL:
+                properties[name] = bool(struct.unpack_from('<B', buf, i)[0])
+                i += 1
+            elif column_type in (FLATGEOBUF_LONG, FLATGEOBUF_DOUBLE):
+                properties[name] = struct.unpack_from('<q' if column_type == FLATGEOBUF_LONG else '<d', buf, i)[0]
+                i += 8
+            else:
+                length = struct.unpack_from('<I', buf, i)[0]
+                properties[name] = buf[i + 4:i + 4 + length].decode('utf8')
+                i += 4 + length
+        geometry = feature.table(0)
+        xy = geometry.vector(1, 'd') if geometry else []
+        features.append((properties.pop('id'), properties, zip(xy[::2], xy[1::2])))
+    assert not node_size or sorted(leaves) == offsets
+    return {'name': header.string(0), 'columns': columns, 'count': count, 'index_node_size': node_size}, features
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+def read_pbf(data):
+    """
+    Yields (field, value) of protocol buffers message, length delimited values are bytearrays.
+    """
+    data = bytearray(data)
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        wire_type = key & 7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        else:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        yield key >> 3, value
+
+def read_packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def read_geobuf(data):
+    """
+    Decodes geobuf: returns keys, dimensions, precision and features (id, properties, coordinates of first point).
+    """
+    keys, dimensions, precision, features = [], 2, 6, []
+    for field, value in read_pbf(data):
+        if field == 1:
+            keys.append(bytes(value).decode('utf8'))
+        elif field == 2:
+            dimensions = value
+        elif field == 3:
+            precision = value
+        elif field == 4:
+            for field, feature in read_pbf(value):
+                pk, values, indexes, coords = None, [], [], []
+                for field, value in read_pbf(feature):
+                    if field == 1:
+                        coords = [unzigzag(v) for f, packed in read_pbf(value) if f == 3 for v in read_packed(packed)]
+                    elif field == 12:
+                        pk = unzigzag(value)
+                    elif field == 13:
+                        kind, v = next(read_pbf(value))
+                        if kind == 1:
+                            v = bytes(v).decode('utf8')
+                        elif kind == 2:
+                            v = struct.unpack('<d', bytes(v))[0]
+                        elif kind == 4:
+                            v = -v
+                        values.append(v)
+                    elif field == 14:
+                        indexes = read_packed(value)
+                properties = dict((keys[indexes[i]], values[indexes[i + 1]]) for i in range(0, len(indexes), 2))
+                point = tuple(c / 10.0 ** precision for c in coords[:dimensions]) or None
+                features.append((pk, properties, point))
+    return {'keys': keys, 'dimensions': dimensions, 'precision': precision}, features
+
+
 class TableMixin(object):
     uri = TablesResource().get_resource_uri()
 
@@ -42,6 +247,9 @@ class TableMixin(object):
         self.assertTrue(resp.has_header('Location'))
         return resp.get('Location')
 
+    def get_table_pk(self, table_uri):
+        return int(table_uri.rstrip('/').split('/')[-1])
+
     def get_objects_uri(self, table_uri=None):
         table_uri = table_uri or self.create_table()
         resp = self.api_client.get(table_uri)
@@ -73,6 +281,14 @@ class TableMixin(object):
             payload['objects'] += map(lambda i: {k: i}, v)
         return self.api_client.put(objects_uri, data=payload)
 
+    def create_points(self, count):
+        objects_uri = self.get_objects_uri()
+        payload = {
+            'geometry': [{"type": "Point", "coordinates": [37.6 + i * 0.01, 55.7]} for i in range(count)],
+        }
+        self.assertHttpAccepted(self.create_objects_in_table(payload, objects_uri))
+        return objects_uri
+
     def get_object_uri(self):
         objects_uri = self.get_objects_uri()
         payload = {
@@ -102,6 +318,19 @@ class TableApiTests(TableMixin, ResourceTestCase):
     def test_get_table_list(self):
         self.assertValidJSONResponse(self.api_client.get(self.uri))
 
+    def test_table_list_query_count(self):
+        self.create_table()
+        #warm up content type cache
+        self.api_client.get(self.uri)
+        with CaptureQueriesContext(connection) as one_table:
+            self.assertValidJSONResponse(self.api_client.get(self.uri))
+        for i in range(3):
+            self.create_table(dict(TABLE_META, name='foo%s' % i))
+        with CaptureQueriesContext(connection) as four_tables:
+            resp = self.api_client.get(self.uri)
+        self.assertEqual(len(self.deserialize(resp)['objects']), 4)
+        self.assertEqual(len(one_table), len(four_tables))
+
     def test_table_rename(self):
         table = self.create_table()
         newtablename = 'newtablename'
@@ -111,6 +340,28 @@ class TableApiTests(TableMixin, ResourceTestCase):
         resp = self.api_client.get(table)
         self.assertEqual(newtablename, json.loads(resp.content).get('name'))
 
+    def test_create_table_by_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.create_table()
+        ddl = [q['sql'].upper() for q in queries if 'CREATE TABLE' in q['sql'].upper() or 'ALTER TABLE' in q['sql'].upper()]
+        self.assertEqual(len(ddl), 1)
+        self.assertIn('CREATE TABLE', ddl[0])
+
+    def test_duplicate_field_names(self):
+        payload = dict(TABLE_META, fields=TABLE_META['fields'] + [{'name': 'text_field', 'type': 'integer'}])
+        self.assertHttpBadRequest(self.api_client.post(self.uri, data=payload))
+
+    def test_add_fields_with_table_update(self):
+        table = self.create_table()
+        fields = self.deserialize(self.api_client.get(table))['fields']
+        fields += [{'name': 'extra_integer', 'type': 'integer'}, {'name': 'extra_text', 'type': 'text'}]
+        resp = self.api_client.patch(table, data={'fields': fields})
+        self.assertIn(resp.status_code, [202, 204])
+        data = self.deserialize(self.api_client.get(table))
+        self.assertEqual(len(data['fields']), len(fields))
+        payload = {'extra_integer': 1, 'extra_text': 'foo'}
+        self.assertHttpCreated(self.api_client.post(data['objects_uri'], data=payload))
+
 class FieldApiTests(TableMixin, ResourceTestCase):
 
     fields_uri = FieldsResource().get_resource_uri()
@@ -228,6 +479,912 @@ class TableDataTests(TableMixin, ResourceTestCase):
             self.assertTrue(geom.hasz)
 
 
+class StreamingTests(TableMixin, ResourceTestCase):
+    def test_streaming_output_matches_serializer(self):
+        objects_uri = self.create_points(5)
+        resp = self.api_client.get(objects_uri, data={'limit': 3, 'offset': 1})
+        self.assertValidJSONResponse(resp)
+        streamed = self.api_client.get(objects_uri, data={'limit': 3, 'offset': 1, 'stream': 'true'})
+        self.assertHttpOK(streamed)
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(resp.content, b''.join(streamed.streaming_content))
+
+    def test_unlimited_list_is_streamed(self):
+        objects_uri = self.create_points(5)
+        resp = self.api_client.get(objects_uri, data={'limit': 0})
+        self.assertTrue(resp.streaming)
+        data = json.loads(b''.join(resp.streaming_content))
+        self.assertEqual(len(data['features']), 5)
+        self.assertEqual(data['meta']['total_count'], 5)
+        self.assertIn('crs', data)
+
+    def test_geojsonseq_export(self):
+        objects_uri = self.create_points(5)
+        resp = self.api_client.get(objects_uri, data={'format': 'geojsonseq', 'limit': 0})
+        self.assertHttpOK(resp)
+        self.assertTrue(resp.streaming)
+        self.assertTrue('application/geo+json-seq' in resp.get('Content-Type'))
+        lines = b''.join(resp.streaming_content).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(all(line.startswith(b'\x1e') for line in lines))
+        self.assertEqual(json.loads(lines[0][1:])['type'], 'Feature')
+
+    def test_streamed_list_ordering(self):
+        objects_uri = self.get_objects_uri()
+        for value in [2, 5, 1, 4, 3]:
+            payload = {'integer_field': value, 'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7]}}
+            self.assertHttpCreated(self.api_client.post(objects_uri, data=payload))
+        resp = self.api_client.get(objects_uri, data={'stream': 'true', 'order_by': '-integer_field'})
+        self.assertTrue(resp.streaming)
+        features = json.loads(b''.join(resp.streaming_content))['features']
+        self.assertEqual([f['properties']['integer_field'] for f in features], [5, 4, 3, 2, 1])
+        resp = self.api_client.get(objects_uri, data={'stream': 'true', 'order_by': 'integer_field', 'offset': 1, 'limit': 2})
+        features = json.loads(b''.join(resp.streaming_content))['features']
+        self.assertEqual([f['properties']['integer_field'] for f in features], [2, 3])
+        resp = self.api_client.get(objects_uri, data={'format': 'geojsonseq', 'limit': 0, 'order_by': '-integer_field'})
+        lines = b''.join(resp.streaming_content).splitlines()
+        self.assertEqual([json.loads(line[1:])['properties']['integer_field'] for line in lines], [5, 4, 3, 2, 1])
+
+    def test_queryset_iterator_chunks(self):
+        User = get_user_model()
+        for name in ['c', 'a', 'e', 'b', 'd']:
+            User.objects.create(username=name)
+        users = User.objects.filter(username__in=['a', 'b', 'c', 'd', 'e'])
+        names = [u.username for u in queryset_iterator(users.order_by('-username'), chunk_size=2, offset=1, limit=3)]
+        self.assertEqual(names, ['d', 'c', 'b'])
+        pks = list(users.order_by('-pk').values_list('pk', flat=True))
+        self.assertEqual([u.pk for u in queryset_iterator(users.order_by('-pk'), chunk_size=2)], pks)
+
+
+class SpatialFilterTests(TableMixin, ResourceTestCase):
+    def get_features(self, objects_uri, **params):
+        resp = self.api_client.get(objects_uri, data=params)
+        self.assertValidJSONResponse(resp)
+        return self.deserialize(resp)['features']
+
+    def test_bbox_filter(self):
+        objects_uri = self.create_points(5)
+        features = self.get_features(objects_uri, bbox='37.605,55.6,37.625,55.8')
+        self.assertEqual(len(features), 2)
+        for feature in features:
+            self.assertTrue(37.605 < feature['geometry']['coordinates'][0] < 37.625)
+        self.assertEqual(len(self.get_features(objects_uri, bbox='0,0,1,1')), 0)
+        self.assertHttpBadRequest(self.api_client.get(objects_uri, data={'bbox': '1,2,3'}))
+
+    def test_intersects_filter(self):
+        objects_uri = self.create_points(5)
+        polygon = {"type": "Polygon", "coordinates": [[[37.595, 55.6], [37.615, 55.6], [37.615, 55.8], [37.595, 55.8], [37.595, 55.6]]]}
+        self.assertEqual(len(self.get_features(objects_uri, intersects=json.dumps(polygon))), 2)
+        self.assertEqual(len(self.get_features(objects_uri, intersects='POINT(37.6 55.7)')), 1)
+        self.assertHttpBadRequest(self.api_client.get(objects_uri, data={'intersects': 'foo'}))
+
+
+class GeometryOutputTests(TableMixin, ResourceTestCase):
+    def create_line(self):
+        objects_uri = self.get_objects_uri()
+        coordinates = [[37.6 + i * 0.0001, 55.7 + (i % 2) * 0.00001] for i in range(100)]
+        resp = self.api_client.post(objects_uri, data={'geometry': {"type": "LineString", "coordinates": coordinates}})
+        self.assertHttpCreated(resp)
+        return objects_uri, resp.get('Location')
+
+    def get_geometry(self, uri, **params):
+        resp = self.api_client.get(uri, data=params)
+        self.assertValidJSONResponse(resp)
+        data = self.deserialize(resp)
+        return data['features'][0]['geometry'] if 'features' in data else data['geometry']
+
+    def test_simplify(self):
+        objects_uri, location = self.create_line()
+        self.assertEqual(len(self.get_geometry(objects_uri)['coordinates']), 100)
+        self.assertEqual(len(self.get_geometry(objects_uri, simplify='0.001')['coordinates']), 2)
+        self.assertTrue(len(self.get_geometry(location, zoom='5')['coordinates']) < 100)
+        self.assertHttpBadRequest(self.api_client.get(objects_uri, data={'zoom': 'foo'}))
+
+    def test_precision(self):
+        objects_uri, location = self.create_line()
+        coordinates = self.get_geometry(objects_uri, precision='2')['coordinates']
+        self.assertEqual(coordinates[1], [37.6, 55.7])
+        self.assertEqual(len(coordinates), 100)
+
+
+class CursorPaginationTests(TableMixin, ResourceTestCase):
+    def test_cursor_pages(self):
+        objects_uri = self.create_points(5)
+        resp = self.api_client.get(objects_uri, data={'cursor': '', 'limit': 2})
+        coordinates = []
+        while True:
+            self.assertValidJSONResponse(resp)
+            data = self.deserialize(resp)
+            self.assertTrue(len(data['features']) <= 2)
+            self.assertIsNone(data['meta']['total_count'])
+            coordinates += [f['geometry']['coordinates'][0] for f in data['features']]
+            if not data['meta']['next']:
+                break
+            resp = self.api_client.get(data['meta']['next'])
+        self.assertEqual(len(coordinates), 5)
+        self.assertEqual(coordinates, sorted(coordinates))
+
+    def test_cursor_total_count(self):
+        objects_uri = self.create_points(3)
+        for count in ('exact', 'cached', 'estimate'):
+            resp = self.api_client.get(objects_uri, data={'cursor': '', 'count': count})
+            self.assertEqual(self.deserialize(resp)['meta']['total_count'], 3)
+
+    def test_invalid_cursor(self):
+        objects_uri = self.create_points(1)
+        self.assertHttpBadRequest(self.api_client.get(objects_uri, data={'cursor': 'foo'}))
+        self.assertHttpBadRequest(self.api_client.get(objects_uri, data={'cursor': '', 'cursor_field': 'text_field'}))
+
+    def test_cursor_ordering(self):
+        objects_uri = self.create_points(3)
+        resp = self.api_client.get(objects_uri, data={'cursor': '', 'order_by': 'id'})
+        self.assertValidJSONResponse(resp)
+        self.assertEqual(len(self.deserialize(resp)['features']), 3)
+        self.assertHttpBadRequest(self.api_client.get(objects_uri, data={'cursor': '', 'order_by': '-id'}))
+        self.assertHttpBadRequest(self.api_client.get(objects_uri, data={'cursor': '', 'order_by': 'text_field'}))
+
+
+class VectorTileTests(TableMixin, ResourceTestCase):
+    def get_tiles_uri(self):
+        table_uri = self.create_table()
+        data = self.deserialize(self.api_client.get(table_uri))
+        payload = {'text_field': 'foo', 'geometry': {"type": "Point", "coordinates": [37.6, 55.7]}}
+        self.assertHttpCreated(self.api_client.post(data['objects_uri'], data=payload))
+        return data['tiles_uri'], data['objects_uri']
+
+    def get_tile(self, tiles_uri, z, x, y):
+        resp = self.api_client.client.get(tiles_uri.format(z=z, x=x, y=y))
+        self.assertHttpOK(resp)
+        self.assertEqual(resp['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        return resp.content
+
+    def test_tiles(self):
+        tiles_uri, objects_uri = self.get_tiles_uri()
+        tile = self.get_tile(tiles_uri, 0, 0, 0)
+        #layers field of Tile message
+        self.assertEqual(tile[:1], b'\x1a')
+        self.assertIn(b'text_field', tile)
+        self.assertEqual(self.get_tile(tiles_uri, 2, 0, 0), b'')
+        self.assertHttpNotFound(self.api_client.client.get(tiles_uri.format(z=1, x=2, y=0)))
+
+    def test_tile_cache_invalidated_by_writes(self):
+        tiles_uri, objects_uri = self.get_tiles_uri()
+        tile = self.get_tile(tiles_uri, 0, 0, 0)
+        self.assertEqual(tile, self.get_tile(tiles_uri, 0, 0, 0))
+        self.assertHttpCreated(self.api_client.post(objects_uri, data={'text_field': 'bar', 'geometry': {"type": "Point", "coordinates": [10, 10]}}))
+        self.assertNotEqual(tile, self.get_tile(tiles_uri, 0, 0, 0))
+
+
+class ConditionalRequestTests(TableMixin, ResourceTestCase):
+    def test_list_etag(self):
+        objects_uri = self.create_points(3)
+        resp = self.api_client.get(objects_uri)
+        self.assertValidJSONResponse(resp)
+        etag = resp['ETag']
+        self.assertTrue(resp.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.api_client.get(objects_uri, HTTP_IF_NONE_MATCH=etag)
+        self.assertHttpNotModified(resp)
+        self.assertFalse(resp.content)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+        self.assertHttpCreated(self.api_client.post(objects_uri, data={'text_field': 'bar'}))
+        resp = self.api_client.get(objects_uri, HTTP_IF_NONE_MATCH=etag)
+        self.assertValidJSONResponse(resp)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_detail_etag(self):
+        location = self.get_object_uri()
+        etag = self.api_client.get(location)['ETag']
+        self.assertHttpNotModified(self.api_client.get(location, HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(self.api_client.put(location, data={'text_field': 'baz'}).status_code, 204)
+        self.assertValidJSONResponse(self.api_client.get(location, HTTP_IF_NONE_MATCH=etag))
+
+
+class ChangeFeedTests(TableMixin, ResourceTestCase):
+    def get_changes_uri(self, objects_uri):
+        return TableProxyResource().uri_for_changes(resolve(objects_uri).kwargs['table_pk'])
+
+    def get_changes(self, changes_uri, **params):
+        resp = self.api_client.get(changes_uri, data=params)
+        self.assertValidJSONResponse(resp)
+        return self.deserialize(resp)
+
+    def test_changes_since_token(self):
+        objects_uri = self.create_points(3)
+        changes_uri = self.get_changes_uri(objects_uri)
+        token = self.get_changes(changes_uri)['meta']['token']
+        self.assertEqual(self.get_changes(changes_uri, since=token)['features'], [])
+
+        pks = sorted(f['id'] for f in self.deserialize(self.api_client.get(objects_uri))['features'])
+        self.assertEqual(self.api_client.put('%s%s/' % (objects_uri, pks[0]), data={'text_field': 'changed'}).status_code, 204)
+        self.assertEqual(self.api_client.delete('%s%s/' % (objects_uri, pks[1])).status_code, 204)
+        self.assertHttpCreated(self.api_client.post(objects_uri, data={'text_field': 'new'}))
+
+        data = self.get_changes(changes_uri, since=token)
+        self.assertEqual(sorted(f['properties']['text_field'] for f in data['features']), ['changed', 'new'])
+        self.assertEqual(data['meta']['deleted'], [pks[1]])
+        self.assertEqual(self.get_changes(changes_uri, since=data['meta']['token'])['features'], [])
+
+        page = self.get_changes(changes_uri, since=token, limit=1)
+        self.assertEqual(len(page['features']), 1)
+        self.assertTrue(page['meta']['next'])
+
+    def test_expired_token(self):
+        objects_uri = self.create_points(1)
+        changes_uri = self.get_changes_uri(objects_uri)
+        table_pk = resolve(objects_uri).kwargs['table_pk']
+        TableState.objects.filter(md_id=table_pk).update(changes_floor=10 ** 9)
+        self.assertHttpGone(self.api_client.get(changes_uri, data={'since': 1}))
+
+    def test_token_follows_commit_order(self):
+        objects_uri = self.create_points(2)
+        changes_uri = self.get_changes_uri(objects_uri)
+        table_pk = resolve(objects_uri).kwargs['table_pk']
+        pks = sorted(f['id'] for f in self.deserialize(self.api_client.get(objects_uri))['features'])
+        token = self.get_changes(changes_uri)['meta']['token']
+
+        #the first transaction takes id of its entry, the second one takes greater id and commits first
+        first_id = TableChange.objects.create(md_id=table_pk, object_id=pks[0], action=TableChange.ACTION_UPDATE).pk
+        TableChange.objects.filter(pk=first_id).delete()
+        change_log.record(table_pk, [(TableChange.ACTION_UPDATE, pks[1])])
+        data = self.get_changes(changes_uri, since=token)
+        self.assertEqual([f['id'] for f in data['features']], [pks[1]])
+
+        #the first transaction commits after the client has got token of the second one
+        TableChange.objects.create(id=first_id, md_id=table_pk, object_id=pks[0], action=TableChange.ACTION_UPDATE)
+        change_log.number(table_pk)
+        data = self.get_changes(changes_uri, since=data['meta']['token'])
+        self.assertEqual([f['id'] for f in data['features']], [pks[0]])
+
+
+class TableStatsTests(TableMixin, ResourceTestCase):
+    def test_stats(self):
+        objects_uri = self.get_objects_uri()
+        payload = {
+            'integer_field': [1, 2, 3, None],
+            'geometry': [{"type": "Point", "coordinates": [37.6 + i * 0.1, 55.7]} for i in range(4)],
+        }
+        self.assertHttpAccepted(self.create_objects_in_table(payload, objects_uri))
+        stats_uri = TableProxyResource().uri_for_stats(resolve(objects_uri).kwargs['table_pk'])
+        resp = self.api_client.get(stats_uri, data={'bins': 2})
+        self.assertValidJSONResponse(resp)
+        stats = self.deserialize(resp)
+        self.assertEqual(stats['count'], 8)
+        self.assertAlmostEqual(stats['extent'][2], 37.9)
+        integer_stats = stats['fields']['integer_field']
+        self.assertEqual((integer_stats['min'], integer_stats['max'], integer_stats['distinct']), (1, 3, 3))
+        self.assertEqual(integer_stats['nulls'], 5)
+        self.assertAlmostEqual(integer_stats['avg'], 2)
+        self.assertEqual(integer_stats['histogram']['counts'], [1, 2])
+
+        filtered = self.deserialize(self.api_client.get(stats_uri, data={'bbox': '37.55,55.6,37.65,55.8'}))
+        self.assertEqual(filtered['count'], 1)
+
+    def test_stats_access(self):
+        objects_uri = self.create_points(1)
+        stats_uri = TableProxyResource().uri_for_stats(resolve(objects_uri).kwargs['table_pk'])
+        self.create_user_and_login('other')
+        self.assertHttpUnauthorized(self.api_client.get(stats_uri))
+
+
+class TableSummaryTests(TableMixin, ResourceTestCase):
+    def get_table(self, table_uri):
+        resp = self.api_client.get(table_uri)
+        self.assertValidJSONResponse(resp)
+        return self.deserialize(resp)
+
+    def test_summary_maintained_by_writes(self):
+        table_uri = self.create_table()
+        self.assertEqual(self.get_table(table_uri)['row_count'], 0)
+        objects_uri = self.get_objects_uri(table_uri)
+        batch_uri = objects_uri.rstrip('/') + '/batch/'
+        features = [{'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Point', 'coordinates': [37.6 + i * 0.1, 55.7]}} for i in range(3)]
+        resp = self.api_client.post(batch_uri, data={'type': 'FeatureCollection', 'features': features})
+        self.assertHttpOK(resp)
+        table = self.get_table(table_uri)
+        self.assertEqual(table['row_count'], 3)
+        self.assertEqual(table['geometry_types'], ['POINT'])
+        self.assertAlmostEqual(table['extent'][0], 37.6)
+        self.assertAlmostEqual(table['extent'][2], 37.8)
+
+        pk = self.deserialize(resp)['results'][0]['id']
+        self.assertEqual(self.api_client.delete('%s%s/' % (objects_uri, pk)).status_code, 204)
+        table = self.get_table(table_uri)
+        self.assertEqual(table['row_count'], 2)
+        #deleted row was on the bound of extent
+        self.assertAlmostEqual(table['extent'][0], 37.7)
+
+    def test_missing_summary_rebuilt(self):
+        table_uri = self.create_table()
+        objects_uri = self.get_objects_uri(table_uri)
+        self.assertHttpCreated(self.api_client.post(objects_uri, data={'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7]}}))
+        TableState.objects.filter(md_id=self.get_table_pk(table_uri)).update(row_count=None)
+        self.assertEqual(self.get_table(table_uri)['row_count'], None)
+        self.api_client.get(objects_uri)
+        self.assertEqual(self.get_table(table_uri)['row_count'], 1)
+
+    def test_missing_summary_not_rebuilt_without_access(self):
+        table_uri = self.create_table()
+        objects_uri = self.get_objects_uri(table_uri)
+        table_pk = self.get_table_pk(table_uri)
+        TableState.objects.filter(md_id=table_pk).update(row_count=None)
+        self.create_user_and_login('other')
+        self.api_client.get(objects_uri)
+        self.assertIsNone(TableState.objects.get(md_id=table_pk).row_count)
+
+
+class AttributeFilterTests(TableMixin, ResourceTestCase):
+    def setUp(self):
+        super(AttributeFilterTests, self).setUp()
+        self.objects_uri = self.get_objects_uri()
+        for i, text in enumerate(['foo', 'bar', 'foobar']):
+            payload = {'text_field': text, 'integer_field': i, 'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7]}}
+            self.assertHttpCreated(self.api_client.post(self.objects_uri, data=payload))
+
+    def get_objects(self, **params):
+        resp = self.api_client.get(self.objects_uri, data=params)
+        self.assertValidJSONResponse(resp)
+        return self.deserialize(resp)['features']
+
+    def test_filters(self):
+        self.assertEqual(len(self.get_objects(integer_field__gte=1)), 2)
+        features = self.get_objects(text_field__icontains='bar', integer_field__lt=2)
+        self.assertEqual([f['properties']['text_field'] for f in features], ['bar'])
+        self.assertHttpBadRequest(self.api_client.get(self.objects_uri, data={'text_field__gt': 'a'}))
+
+    def test_ordering(self):
+        features = self.get_objects(order_by='-integer_field')
+        self.assertEqual([f['properties']['integer_field'] for f in features], [2, 1, 0])
+
+    def test_sparse_fields(self):
+        features = self.get_objects(fields='text_field', geometry='false')
+        self.assertEqual(len(features), 3)
+        self.assertIsNone(features[0]['geometry'])
+        self.assertIn('text_field', features[0]['properties'])
+        self.assertNotIn('integer_field', features[0]['properties'])
+        streamed = self.get_objects(fields='integer_field', limit=0)
+        self.assertIsNotNone(streamed[0]['geometry'])
+        self.assertNotIn('text_field', streamed[0]['properties'])
+        self.assertHttpBadRequest(self.api_client.get(self.objects_uri, data={'fields': 'missing'}))
+
+
+class SchemaChangeTests(TableMixin, ResourceTestCase):
+    def setUp(self):
+        super(SchemaChangeTests, self).setUp()
+        self.table_uri = self.create_table()
+        self.objects_uri = self.get_objects_uri(self.table_uri)
+        for text in ['12', 'foo']:
+            self.assertHttpCreated(self.api_client.post(self.objects_uri, data={'text_field': text, 'integer_field': 1}))
+
+    def get_field_uri(self, name):
+        fields = self.deserialize(self.api_client.get(self.table_uri))['fields']
+        return [f['resource_uri'] for f in fields if f['name'] == name][0]
+
+    def get_change(self, resp):
+        self.assertHttpAccepted(resp)
+        change = self.deserialize(self.api_client.get(resp.get('Location')))
+        self.assertEqual(change['status'], 'done')
+        self.assertEqual(change['rows_copied'], 2)
+        return change
+
+    def get_properties(self):
+        resp = self.api_client.get(self.objects_uri, data={'order_by': 'id'})
+        self.assertValidJSONResponse(resp)
+        return [f['properties'] for f in self.deserialize(resp)['features']]
+
+    def test_alter_field_type(self):
+        field_uri = self.get_field_uri('text_field')
+        change = self.get_change(self.api_client.patch(field_uri, data={'type': 'integer'}))
+        self.assertEqual(change['invalid_values'], 1)
+        self.assertEqual(self.deserialize(self.api_client.get(self.get_field_uri('text_field')))['type'], 'integer')
+        self.assertEqual([p['text_field'] for p in self.get_properties()], [12, None])
+        self.assertHttpCreated(self.api_client.post(self.objects_uri, data={'text_field': 3}))
+        self.assertHttpBadRequest(self.api_client.patch(self.get_field_uri('geometry'), data={'type': 'integer'}))
+
+    def test_online_drop_field(self):
+        self.get_change(self.api_client.delete(self.get_field_uri('integer_field') + '?online=true'))
+        properties = self.get_properties()
+        self.assertEqual([p['text_field'] for p in properties], ['12', 'foo'])
+        self.assertNotIn('integer_field', properties[0])
+        self.assertHttpCreated(self.api_client.post(self.objects_uri, data={'text_field': 'bar'}))
+
+    def test_stale_change_does_not_block_table(self):
+        user = get_user_model().objects.get(username='user')
+        stuck = SchemaChange.objects.create(user=user, md_id=self.get_table_pk(self.table_uri), operation=SchemaChange.OPERATION_DROP,
+                                            field_name='text_field', status=SchemaChange.STATUS_RUNNING)
+        field_uri = self.get_field_uri('integer_field')
+        self.assertEqual(self.api_client.delete(field_uri + '?online=true').status_code, 409)
+        SchemaChange.objects.filter(pk=stuck.pk).update(updated=timezone.now() - datetime.timedelta(seconds=schema_change_pool.timeout + 1))
+        self.get_change(self.api_client.delete(field_uri + '?online=true'))
+        self.assertEqual(SchemaChange.objects.get(pk=stuck.pk).status, 'failed')
+
+
+class IndexTests(TableMixin, ResourceTestCase):
+    def setUp(self):
+        super(IndexTests, self).setUp()
+        fields = TABLE_META['fields'] + [{'name': 'code', 'type': 'integer', 'unique': True}]
+        self.table_uri = self.create_table(dict(TABLE_META, fields=fields))
+        self.objects_uri = self.get_objects_uri(self.table_uri)
+        self.advisor = index_advisor.__dict__.copy()
+        caches[index_advisor.alias].clear()
+
+    def tearDown(self):
+        index_advisor.__dict__.update(self.advisor)
+        super(IndexTests, self).tearDown()
+
+    def get_field(self, name):
+        fields = self.deserialize(self.api_client.get(self.table_uri))['fields']
+        return [f for f in fields if f['name'] == name][0]
+
+    def get_indexed_columns(self):
+        md = ModelDefinition.objects.get(pk=self.get_table_pk(self.table_uri))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, md.db_table)
+        return set(c['columns'][0] for c in constraints.values() if len(c['columns']) == 1 and (c['index'] or c['unique']) and not c['primary_key'])
+
+    def test_unique_field(self):
+        self.assertTrue(self.get_field('code')['unique'])
+        self.assertIn('code', self.get_indexed_columns())
+        self.assertHttpCreated(self.api_client.post(self.objects_uri, data={'code': 1}))
+        self.assertHttpBadRequest(self.api_client.post(self.objects_uri, data={'code': 1}))
+        field_uri = self.get_field('code')['resource_uri']
+        self.assertHttpAccepted(self.api_client.patch(field_uri, data={'unique': False}))
+        self.assertHttpCreated(self.api_client.post(self.objects_uri, data={'code': 1}))
+        self.assertHttpBadRequest(self.api_client.patch(field_uri, data={'unique': True}))
+        self.assertFalse(self.get_field('code')['unique'])
+
+    def test_indexed_field(self):
+        field_uri = self.get_field('integer_field')['resource_uri']
+        self.assertHttpAccepted(self.api_client.patch(field_uri, data={'indexed': True}))
+        self.assertTrue(self.get_field('integer_field')['indexed'])
+        self.assertIn('integer_field', self.get_indexed_columns())
+        self.assertHttpAccepted(self.api_client.patch(field_uri, data={'indexed': False}))
+        self.assertNotIn('integer_field', self.get_indexed_columns())
+        self.assertHttpBadRequest(self.api_client.patch(self.get_field('geometry')['resource_uri'], data={'indexed': True}))
+
+    def test_index_advisor(self):
+        index_advisor.__dict__.update(enabled=True, min_queries=3, threshold=0.5, auto_create=False)
+        indexes_uri = self.deserialize(self.api_client.get(self.table_uri))['indexes_uri']
+        for i in range(3):
+            self.api_client.get(self.objects_uri, data={'integer_field__gte': i})
+        report = self.deserialize(self.api_client.get(indexes_uri))
+        self.assertEqual(report['queries'], 3)
+        columns = dict((c['name'], c) for c in report['columns'])
+        self.assertEqual(columns['integer_field']['filters'], 3)
+        self.assertTrue(columns['integer_field']['advised'])
+        self.assertFalse(columns['text_field']['advised'])
+        self.assertFalse(columns['code']['advised'])
+        index_advisor.auto_create = True
+        self.api_client.get(self.objects_uri, data={'integer_field__gte': 0})
+        change = SchemaChange.objects.get(md_id=self.get_table_pk(self.table_uri))
+        self.assertEqual((change.operation, change.field_name, change.status), ('index', 'integer_field', 'done'))
+        self.assertTrue(self.get_field('integer_field')['indexed'])
+        self.assertIn('integer_field', self.get_indexed_columns())
+
+    def test_index_advisor_counts_authorized_queries(self):
+        index_advisor.__dict__.update(enabled=True, min_queries=1, threshold=0.5, auto_create=True)
+        indexes_uri = self.deserialize(self.api_client.get(self.table_uri))['indexes_uri']
+        self.create_user_and_login('other')
+        self.api_client.get(self.objects_uri, data={'integer_field__gte': 0})
+        self.assertFalse(SchemaChange.objects.exists())
+        self.api_client.client.login(username='user', password='password')
+        self.assertEqual(self.deserialize(self.api_client.get(indexes_uri))['queries'], 0)
+
+
+class TableCopyTests(TableMixin, ResourceTestCase):
+    def setUp(self):
+        super(TableCopyTests, self).setUp()
+        self.table_uri = self.create_table()
+        self.objects_uri = self.get_objects_uri(self.table_uri)
+        for i, text in enumerate(['foo', 'bar']):
+            payload = {'text_field': text, 'integer_field': i, 'geometry': {'type': 'Point', 'coordinates': [37.6 + i, 55.7]}}
+            self.assertHttpCreated(self.api_client.post(self.objects_uri, data=payload))
+
+    def get_features(self, objects_uri):
+        resp = self.api_client.get(objects_uri, data={'order_by': 'id'})
+        self.assertValidJSONResponse(resp)
+        return self.deserialize(resp)['features']
+
+    def test_clone_table(self):
+        resp = self.api_client.post(self.table_uri + 'clone/', data={'name': 'foo copy'})
+        self.assertHttpCreated(resp)
+        data = self.deserialize(resp)
+        self.assertEqual(data['rows_copied'], 2)
+        table = self.deserialize(self.api_client.get(resp.get('Location')))
+        self.assertEqual(table['name'], 'foo copy')
+        self.assertEqual(table['row_count'], 2)
+        self.assertEqual(sorted(f['name'] for f in table['fields']), sorted(f['name'] for f in self.deserialize(self.api_client.get(self.table_uri))['fields']))
+        source, copied = self.get_features(self.objects_uri), self.get_features(data['objects_uri'])
+        self.assertEqual([(f['id'], f['properties']['text_field'], f['geometry']) for f in copied],
+                         [(f['id'], f['properties']['text_field'], f['geometry']) for f in source])
+        resp = self.api_client.post(data['objects_uri'], data={'text_field': 'baz'})
+        self.assertHttpCreated(resp)
+        self.assertEqual(resp.get('Location').rstrip('/').split('/')[-1], '3')
+
+    def test_append_table(self):
+        fields = [{'name': 'text_field', 'type': 'text'}, {'name': 'number', 'type': 'integer'}]
+        target_uri = self.create_table(dict(TABLE_META, name='bar', fields=fields))
+        append_uri = target_uri + 'append/'
+        resp = self.api_client.post(append_uri, data={'source': self.table_uri, 'columns': {'text_field': 'text_field', 'number': 'integer_field'}})
+        self.assertValidJSONResponse(resp)
+        self.assertEqual(self.deserialize(resp)['rows_copied'], 2)
+        self.assertHttpOK(self.api_client.post(append_uri, data={'source': self.table_uri}))
+        features = self.get_features(self.get_objects_uri(target_uri))
+        self.assertEqual([f['properties']['number'] for f in features], [0, 1, None, None])
+        self.assertEqual([f['properties']['text_field'] for f in features], ['foo', 'bar', 'foo', 'bar'])
+        self.assertIsNotNone(features[3]['geometry'])
+        self.assertEqual(self.deserialize(self.api_client.get(target_uri))['row_count'], 4)
+        self.assertHttpBadRequest(self.api_client.post(append_uri, data={'source': self.table_uri, 'columns': {'number': 'text_field'}}))
+        self.assertHttpBadRequest(self.api_client.post(append_uri, data={'source': 'foo'}))
+
+    def test_append_requires_access_to_source(self):
+        self.create_user_and_login('other')
+        target_uri = self.create_table()
+        self.assertHttpUnauthorized(self.api_client.post(target_uri + 'append/', data={'source': self.table_uri}))
+
+
+class ShapefileExportTests(TableMixin, ResourceTestCase):
+    def get_cached_exports(self, objects_uri):
+        table_pk = resolve(objects_uri).kwargs['table_pk']
+        return glob.glob(os.path.join(export_cache.path, '%s-*' % table_pk))
+
+    def test_shapefile_list_export(self):
+        location = self.get_object_uri()
+        objects_uri = location.rstrip('/').rsplit('/', 1)[0] + '/'
+        resp = self.api_client.get(objects_uri, data={'format': 'shapefile', 'limit': 0})
+        self.assertHttpOK(resp)
+        self.assertTrue('application/zip' in resp.get('Content-Type'))
+        self.assertTrue(resp.has_header('Content-Disposition'))
+        zf = zipfile.ZipFile(io.BytesIO(b''.join(resp.streaming_content)))
+        self.assertTrue(any(name.endswith('.shp') for name in zf.namelist()))
+        self.assertTrue(any(name.endswith('.dbf') for name in zf.namelist()))
+
+    def test_shapefile_export_cache(self):
+        location = self.get_object_uri()
+        objects_uri = location.rstrip('/').rsplit('/', 1)[0] + '/'
+        self.api_client.get(objects_uri, data={'format': 'shapefile', 'limit': 0})
+        cached = self.get_cached_exports(objects_uri)
+        self.assertEqual(len(cached), 1)
+        self.api_client.get(objects_uri, data={'format': 'shapefile', 'limit': 0})
+        self.assertEqual(cached, self.get_cached_exports(objects_uri))
+
+        self.assertHttpCreated(self.api_client.post(objects_uri, data={'text_field': 'bar'}))
+        self.api_client.get(objects_uri, data={'format': 'shapefile', 'limit': 0})
+        updated = self.get_cached_exports(objects_uri)
+        self.assertEqual(len(updated), 1)
+        self.assertNotEqual(cached, updated)
+
+    def test_binary_formats(self):
+        location = self.get_object_uri()
+        objects_uri = location.rstrip('/').rsplit('/', 1)[0] + '/'
+        pk = int(location.rstrip('/').split('/')[-1])
+        resp = self.api_client.get(objects_uri, data={'format': 'flatgeobuf', 'limit': 0})
+        self.assertHttpOK(resp)
+        self.assertTrue(FLATGEOBUF_CONTENT_TYPE in resp.get('Content-Type'))
+        header, features = read_flatgeobuf(b''.join(resp.streaming_content))
+        self.assertEqual([name for name, column_type in header['columns']], ['id', 'text_field', 'integer_field', 'float_field', 'boolean_field'])
+        self.assertEqual(header['count'], 1)
+        self.assertEqual(features, [(pk, {'text_field': 'foo', 'integer_field': 1, 'float_field': 1.1, 'boolean_field': True}, [])])
+
+        resp = self.api_client.get(objects_uri, data={'format': 'geobuf', 'limit': 0})
+        self.assertHttpOK(resp)
+        self.assertTrue(GEOBUF_CONTENT_TYPE in resp.get('Content-Type'))
+        header, features = read_geobuf(b''.join(resp.streaming_content))
+        self.assertEqual(header['keys'], ['text_field', 'integer_field', 'float_field', 'boolean_field'])
+        self.assertEqual(features, [(pk, {'text_field': 'foo', 'integer_field': 1, 'float_field': 1.1, 'boolean_field': True}, None)])
+
+        resp = self.client.get(location, HTTP_ACCEPT=FLATGEOBUF_CONTENT_TYPE)
+        self.assertHttpOK(resp)
+        self.assertTrue(resp.content.startswith(FLATGEOBUF_MAGIC))
+
+
+class BinaryFormatTests(ResourceTestCase):
+    columns = [('name', FLATGEOBUF_STRING), ('value', FLATGEOBUF_DOUBLE)]
+    features = [
+        {'id': 1, 'properties': {'name': u'\u0442\u043e\u0447\u043a\u0430', 'value': 1.5}, 'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7]}},
+        {'id': 2, 'properties': {'name': u'line', 'value': None}, 'geometry': {'type': 'LineString', 'coordinates': [[37.6, 55.7], [37.75, 55.8]]}},
+        {'id': 300, 'properties': {'name': None, 'value': -2.0}, 'geometry': None},
+    ]
+
+    def write(self, write_format, *args):
+        f = io.BytesIO()
+        write_format(f, *args)
+        return f.getvalue()
+
+    def test_flatgeobuf_round_trip(self):
+        data = self.write(write_flatgeobuf, 'layer', iter(self.features), self.columns)
+        header, features = read_flatgeobuf(data)
+        self.assertEqual(header['name'], 'layer')
+        self.assertEqual(header['columns'], [('id', FLATGEOBUF_LONG)] + self.columns)
+        self.assertEqual(header['count'], 3)
+        #features are written in Hilbert order of index
+        features = dict((pk, (properties, coordinates)) for pk, properties, coordinates in features)
+        self.assertEqual(features[1], ({'name': u'\u0442\u043e\u0447\u043a\u0430', 'value': 1.5}, [(37.6, 55.7)]))
+        self.assertEqual(features[2], ({'name': u'line'}, [(37.6, 55.7), (37.75, 55.8)]))
+        self.assertEqual(features[300], ({'value': -2.0}, []))
+
+    def test_flatgeobuf_reference_reader(self):
+        driver = ogr.GetDriverByName('FlatGeobuf')
+        if driver is None:
+            self.skipTest('GDAL has no FlatGeobuf driver')
+        with tempfile.NamedTemporaryFile(suffix='.fgb') as f:
+            f.write(self.write(write_flatgeobuf, 'layer', iter(self.features[:2]), self.columns))
+            f.flush()
+            layer = driver.Open(f.name).GetLayer(0)
+            self.assertEqual(layer.GetFeatureCount(), 2)
+            self.assertEqual([layer.GetLayerDefn().GetFieldDefn(i).GetName() for i in range(3)], ['id', 'name', 'value'])
+            points = dict((feature.GetField('id'), feature.GetGeometryRef().GetPoint_2D(0)) for feature in layer)
+            self.assertEqual(points, {1: (37.6, 55.7), 2: (37.6, 55.7)})
+
+    def test_geobuf_round_trip(self):
+        data = self.write(write_geobuf, iter(self.features), ['name', 'value'], 2, 6)
+        header, features = read_geobuf(data)
+        self.assertEqual(header, {'keys': ['name', 'value'], 'dimensions': 2, 'precision': 6})
+        self.assertEqual(features, [
+            (1, {'name': u'\u0442\u043e\u0447\u043a\u0430', 'value': 1.5}, (37.6, 55.7)),
+            (2, {'name': u'line'}, (37.6, 55.7)),
+            (300, {'value': -2.0}, None),
+        ])
+
+
+class BatchWriteTests(TableMixin, ResourceTestCase):
+    def get_batch_uri(self, objects_uri):
+        return objects_uri.rstrip('/') + '/batch/'
+
+    def post_batch(self, objects_uri, features):
+        return self.api_client.post(self.get_batch_uri(objects_uri), data={'type': 'FeatureCollection', 'features': features})
+
+    def test_batch_write(self):
+        location = self.get_object_uri()
+        objects_uri = location.rstrip('/').rsplit('/', 1)[0] + '/'
+        pk = int(location.rstrip('/').split('/')[-1])
+        features = [{
+            'type': 'Feature',
+            'properties': {'text_field': u'new %s' % i, 'integer_field': i},
+            'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7 + i * 0.01]},
+        } for i in range(3)]
+        resp = self.post_batch(objects_uri, features + [{'type': 'Feature', 'id': pk, 'properties': {'integer_field': 42}}])
+        self.assertHttpOK(resp)
+        data = json.loads(resp.content)
+        self.assertEqual((data['created'], data['updated'], data['deleted']), (3, 1, 0))
+        created_pks = [r['id'] for r in data['results'][:3]]
+        self.assertEqual(len(set(created_pks)), 3)
+        obj = self.deserialize(self.api_client.get(location))
+        self.assertEqual(obj['properties']['integer_field'], 42)
+        self.assertEqual(obj['properties']['text_field'], 'foo')
+        created = self.deserialize(self.api_client.get('%s%s/' % (objects_uri, created_pks[2])))
+        self.assertEqual(created['properties']['text_field'], 'new 2')
+
+        resp = self.post_batch(objects_uri, [{'type': 'Feature', 'id': pk, 'action': 'delete'}])
+        self.assertHttpOK(resp)
+        self.assertHttpNotFound(self.api_client.get(location))
+
+    def test_insert_rows_returns_ids_of_objects(self):
+        table_pk = resolve(self.get_objects_uri()).kwargs['table_pk']
+        model_class = TableProxyResource().get_objects_resource(table_pk)._meta.object_class
+        lock_table = batch.lock_table
+        for can_lock in (True, False):
+            #backends without table lock insert rows one by one
+            batch.lock_table = lambda model_class: can_lock and lock_table(model_class)
+            try:
+                pks = batch.insert_rows(model_class, [model_class(text_field=u'row %s' % i) for i in range(3)])
+            finally:
+                batch.lock_table = lock_table
+            self.assertEqual([model_class.objects.get(pk=pk).text_field for pk in pks], ['row 0', 'row 1', 'row 2'])
+
+    def test_batch_write_is_validated_up_front(self):
+        location = self.get_object_uri()
+        objects_uri = location.rstrip('/').rsplit('/', 1)[0] + '/'
+        features = [
+            {'type': 'Feature', 'properties': {'integer_field': 1}, 'geometry': None},
+            {'type': 'Feature', 'properties': {'integer_field': 'foo'}, 'geometry': None},
+            {'type': 'Feature', 'id': 100500, 'action': 'delete'},
+        ]
+        resp = self.post_batch(objects_uri, features)
+        self.assertHttpBadRequest(resp)
+        results = json.loads(resp.content)['results']
+        self.assertNotIn('errors', results[0])
+        self.assertIn('integer_field', results[1]['errors'])
+        self.assertIn('id', results[2]['errors'])
+        data = self.deserialize(self.api_client.get(objects_uri))
+        self.assertEqual(data['meta']['total_count'], 1)
+
+
+class FileImportTests(TableMixin, ResourceTestCase):
+    import_uri = FileImportResource().get_resource_uri()
+
+    def get_geojson_file(self, count):
+        features = [{
+            'type': 'Feature',
+            'properties': {'name': u'point %s' % i, 'value': i},
+            'geometry': {'type': 'Point', 'coordinates': [37.6 + i * 0.01, 55.7]},
+        } for i in range(count)]
+        return SimpleUploadedFile('points.geojson', json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    def import_file(self, f, name='imported', **data):
+        data.update(name=name, file=f)
+        return self.api_client.client.post(self.import_uri, data)
+
+    def test_fill_table_in_batches(self):
+        table_pk = self.get_table_pk(self.create_table())
+        model_class = TableProxyResource().get_objects_resource(table_pk)._meta.object_class
+        features = ((dict(integer_field=i), GEOSGeometry('POINT(37.6 55.7)')) for i in range(5))
+        stats = FileImportResource().fill_table(model_class, features, batch_size=2)
+        self.assertEqual(stats.features, 5)
+        self.assertEqual(stats.batches, 3)
+        self.assertEqual(model_class.objects.count(), 5)
+
+    def test_import_file(self):
+        resp = self.import_file(self.get_geojson_file(5))
+        self.assertHttpCreated(resp)
+        stats = json.loads(resp.content)
+        self.assertEqual(stats['features'], 5)
+        self.assertEqual(stats['batches'], 1)
+        objects_uri = self.get_objects_uri(resp.get('Location'))
+        data = self.deserialize(self.api_client.get(objects_uri))
+        self.assertEqual(data['meta']['total_count'], 5)
+        self.assertEqual(sorted(f['properties']['value'] for f in data['features']), range(5))
+
+    def test_import_geojsonseq_file(self):
+        lines = [json.dumps({
+            'type': 'Feature',
+            'properties': {'name': u'point %s' % i, 'value': i} if i else {'name': u'point 0'},
+            'geometry': {'type': 'Point', 'coordinates': [37.6 + i * 0.01, 55.7]},
+        }) for i in range(5)]
+        resp = self.import_file(SimpleUploadedFile('points.geojsonl', '\n'.join(lines)))
+        self.assertHttpCreated(resp)
+        self.assertEqual(json.loads(resp.content)['features'], 5)
+        objects_uri = self.get_objects_uri(resp.get('Location'))
+        data = self.deserialize(self.api_client.get(objects_uri))
+        self.assertEqual(sorted(f['properties']['value'] for f in data['features']), [None] + range(1, 5))
+
+    def test_geojsonseq_properties_after_sample_counted(self):
+        sample_size = IMPORT_TYPE_SAMPLE_SIZE
+        lines = [json.dumps({
+            'type': 'Feature',
+            'properties': {'name': u'point %s' % i, 'late': i} if i == sample_size else {'name': u'point %s' % i},
+            'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7]},
+        }) for i in range(sample_size + 1)]
+        resp = self.import_file(SimpleUploadedFile('points.geojsonl', '\n'.join(lines)), async='true')
+        job = self.deserialize(self.api_client.get(resp.get('Location')))
+        self.assertEqual((job['status'], job['invalid_values']), ('done', 1))
+        self.assertEqual(job['features_imported'], sample_size + 1)
+        data = self.deserialize(self.api_client.get(job['objects_uri'], data={'limit': 1}))
+        self.assertNotIn('late', data['features'][0]['properties'])
+
+    def test_import_column_types(self):
+        features = [{
+            'type': 'Feature',
+            'properties': {'code': '007', 'count': str(i), 'value': i * 0.5, 'day': '2016-01-0%s' % (i + 1), 'flag': bool(i % 2)},
+            'geometry': {'type': 'Polygon', 'coordinates': [[[37.6, 55.7], [37.7, 55.7], [37.7, 55.8], [37.6, 55.7]]]}
+                        if i else {'type': 'MultiPolygon', 'coordinates': [[[[37.6, 55.7], [37.7, 55.7], [37.7, 55.8], [37.6, 55.7]]]]},
+        } for i in range(3)]
+        f = SimpleUploadedFile('polygons.geojson', json.dumps({'type': 'FeatureCollection', 'features': features}))
+        resp = self.import_file(f)
+        self.assertHttpCreated(resp)
+        self.assertEqual(json.loads(resp.content)['invalid_values'], 0)
+        table = self.deserialize(self.api_client.get(resp.get('Location')))
+        types = dict((f['name'], f['type']) for f in table['fields'])
+        self.assertEqual(types['code'], 'text')
+        self.assertEqual(types['count'], 'integer')
+        self.assertEqual(types['value'], 'float')
+        self.assertEqual(types['day'], 'date')
+        self.assertEqual(types['flag'], 'null_boolean')
+        self.assertEqual(types['geometry'], 'multi_polygon')
+        data = self.deserialize(self.api_client.get(table['objects_uri']))
+        self.assertEqual(sorted(f['properties']['count'] for f in data['features']), [0, 1, 2])
+
+    def test_values_after_sample_counted(self):
+        sample_size = IMPORT_TYPE_SAMPLE_SIZE
+        features = [{
+            'type': 'Feature',
+            'properties': {'count': str(i) if i < sample_size else 'many'},
+            'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7]},
+        } for i in range(sample_size + 1)]
+        f = SimpleUploadedFile('points.geojson', json.dumps({'type': 'FeatureCollection', 'features': features}))
+        resp = self.import_file(f, async='true')
+        job = self.deserialize(self.api_client.get(resp.get('Location')))
+        self.assertEqual((job['status'], job['invalid_values']), ('done', 1))
+        data = self.deserialize(self.api_client.get(job['objects_uri'], data={'count__isnull': 'true'}))
+        self.assertEqual(data['meta']['total_count'], 1)
+
+    def test_sample_size_bounded(self):
+        reader = GeoJSONSeqReader(None)
+        self.assertRaises(ValueError, ImportSchema, reader, sample_size=0)
+        self.assertRaises(ValueError, ImportSchema, reader, sample_size=MAX_IMPORT_TYPE_SAMPLE_SIZE + 1)
+
+    def test_import_empty_file(self):
+        self.assertHttpBadRequest(self.import_file(self.get_geojson_file(0)))
+
+    def test_import_wrong_file(self):
+        self.assertHttpBadRequest(self.import_file(SimpleUploadedFile('points.geojson', 'not a vector file')))
+
+
+    def test_async_import(self):
+        resp = self.import_file(self.get_geojson_file(5), async='true')
+        self.assertHttpAccepted(resp)
+        job = self.deserialize(self.api_client.get(resp.get('Location')))
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['features_total'], 5)
+        self.assertEqual(job['features_imported'], 5)
+        data = self.deserialize(self.api_client.get(job['objects_uri']))
+        self.assertEqual(data['meta']['total_count'], 5)
+
+    def test_async_import_error(self):
+        resp = self.import_file(SimpleUploadedFile('points.geojson', 'not a vector file'), async='true')
+        self.assertHttpAccepted(resp)
+        job = self.deserialize(self.api_client.get(resp.get('Location')))
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'wrong file format')
+        self.assertNotIn('objects_uri', job)
+
+    def test_abandoned_job_failed(self):
+        table_uri = self.create_table()
+        table_pk = self.get_table_pk(table_uri)
+        user = get_user_model().objects.get(username='user')
+        job = ImportJob.objects.create(user=user, name='foo', filename='foo.geojson', status=ImportJob.STATUS_RUNNING, md_id=table_pk)
+        running = ImportJob.objects.create(user=user, name='bar', filename='bar.geojson', status=ImportJob.STATUS_RUNNING)
+        ImportJob.objects.filter(pk=job.pk).update(updated=timezone.now() - datetime.timedelta(seconds=import_pool.timeout + 1))
+        import_pool.reclaim()
+        job = ImportJob.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.error, job.md_id), ('failed', 'job was interrupted', None))
+        self.assertFalse(ModelDefinition.objects.filter(pk=table_pk).exists())
+        self.assertEqual(ImportJob.objects.get(pk=running.pk).status, 'running')
+
+class TableImportTests(TableMixin, ResourceTestCase):
+    import_uri = FileImportResource().get_resource_uri()
+
+    def import_file(self, f, **data):
+        data.update(file=f)
+        return self.api_client.client.post(self.import_uri, data)
+
+    def get_rows_file(self, rows):
+        features = [{
+            'type': 'Feature',
+            'properties': {'Text Field': text, 'integer_field': str(value), 'extra': 1},
+            'geometry': {'type': 'Point', 'coordinates': [37.6, 55.7]},
+        } for text, value in rows]
+        return SimpleUploadedFile('rows.geojson', json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    def get_rows(self, objects_uri):
+        data = self.deserialize(self.api_client.get(objects_uri, data={'order_by': 'id'}))
+        return [(f['properties']['text_field'], f['properties']['integer_field']) for f in data['features']]
+
+    def import_rows(self, table_uri, rows, **data):
+        resp = self.import_file(self.get_rows_file(rows), table=table_uri, **data)
+        self.assertValidJSONResponse(resp)
+        return json.loads(resp.content)
+
+    def test_import_into_table(self):
+        table_uri = self.create_table()
+        objects_uri = self.get_objects_uri(table_uri)
+        stats = self.import_rows(table_uri, [('a', 1), ('b', 2)])
+        self.assertEqual((stats['created'], stats['updated'], stats['deleted']), (2, 0, 0))
+        stats = self.import_rows(table_uri, [('b', 20), ('c', 3), ('c', 30)], mode='upsert', key='text_field')
+        self.assertEqual((stats['created'], stats['updated']), (1, 1))
+        self.assertEqual(self.get_rows(objects_uri), [('a', 1), ('b', 20), ('c', 30)])
+        stats = self.import_rows(table_uri, [('d', 4)], mode='replace')
+        self.assertEqual((stats['created'], stats['deleted']), (1, 3))
+        self.assertEqual(self.get_rows(objects_uri), [('d', 4)])
+        self.assertEqual(self.deserialize(self.api_client.get(table_uri))['row_count'], 1)
+
+    def test_import_into_table_errors(self):
+        table_uri = self.create_table()
+        self.assertHttpBadRequest(self.import_file(self.get_rows_file([('a', 1)]), table=table_uri, mode='upsert'))
+        self.assertHttpBadRequest(self.import_file(self.get_rows_file([('a', 1)]), table=table_uri, mode='upsert', key='float_field'))
+        self.assertHttpBadRequest(self.import_file(self.get_rows_file([]), table=table_uri, mode='replace'))
+        self.create_user_and_login('other')
+        self.assertHttpUnauthorized(self.import_file(self.get_rows_file([('a', 1)]), table=table_uri))
+
+    def test_async_import_into_table(self):
+        table_uri = self.create_table()
+        resp = self.import_file(self.get_rows_file([('a', 1)]), table=table_uri, async='true')
+        self.assertHttpAccepted(resp)
+        job = self.deserialize(self.api_client.get(resp.get('Location')))
+        self.assertEqual((job['status'], job['mode'], job['features_imported']), ('done', 'append', 1))
+        self.assertEqual(self.get_rows(job['objects_uri']), [('a', 1)])
+
 class AuthorizationTests(TableMixin, ResourceTestCase):
     def test_table_access(self):
         location = self.create_table()
@@ -238,3 +1395,68 @@ class AuthorizationTests(TableMixin, ResourceTestCase):
         location = self.get_object_uri()
         self.create_user_and_login('user2')
         self.assertHttpUnauthorized(self.api_client.get(location))
+
+    def test_deleted_table_data_not_found(self):
+        table_uri = self.create_table()
+        objects_uri = self.get_objects_uri(table_uri)
+        stats_uri = TableProxyResource().uri_for_stats(self.get_table_pk(table_uri))
+        self.assertEqual(self.api_client.delete(table_uri).status_code, 204)
+        self.assertHttpNotFound(self.api_client.get(objects_uri))
+        self.assertHttpNotFound(self.api_client.post(objects_uri.rstrip('/') + '/batch/', data={'type': 'FeatureCollection', 'features': []}))
+        self.assertHttpNotFound(self.api_client.get(stats_uri))
+
+    def test_table_data_access_granted(self):
+        location = self.get_object_uri()
+        md = ModelDefinition.objects.get(pk=resolve(location).kwargs['table_pk'])
+        self.create_user_and_login('user2')
+        self.assertHttpUnauthorized(self.api_client.get(location))
+        UserToTable.objects.create(md=md, user=get_user_model().objects.get(username='user2'))
+        self.assertHttpOK(self.api_client.get(location))
+
+    def test_table_permissions_resolved_once(self):
+        md = ModelDefinition.objects.get(pk=self.get_table_pk(self.create_table()))
+        user = get_user_model().objects.get(username='user')
+        auth = get_table_auth()()
+        with self.assertNumQueries(2):
+            for i in range(3):
+                self.assertTrue(auth.check_data_view(md, user))
+                self.assertTrue(auth.check_data_modify(md, user))
+
+
+class ResourceCacheTests(TableMixin, ResourceTestCase):
+    def test_resource_class_reused(self):
+        table_pk = self.get_table_pk(self.create_table())
+        proxy = TableProxyResource()
+        self.assertIs(proxy.get_objects_resource(table_pk), proxy.get_objects_resource(table_pk))
+
+    def test_schema_change_rebuilds_resource_class(self):
+        table = self.create_table()
+        table_pk = self.get_table_pk(table)
+        proxy = TableProxyResource()
+        R = proxy.get_objects_resource(table_pk)
+        payload = {'name': 'newfield', 'type': 'text', 'table': table}
+        self.assertHttpCreated(self.api_client.post(FieldsResource().get_resource_uri(), data=payload))
+        self.assertIsNot(R, proxy.get_objects_resource(table_pk))
+        resp = self.api_client.post(self.get_objects_uri(table), data={'newfield': 'foo'})
+        self.assertHttpCreated(resp)
+
+    @override_settings(USERLAYERS_TABLE_AUTHORIZATION='userlayers.tests.PublicTableAuthorization')
+    def test_cached_resource_class_reads_current_definition(self):
+        table_pk = self.get_table_pk(self.create_table())
+        objects_uri = TableProxyResource().uri_for_table(table_pk)
+        self.assertHttpOK(self.api_client.get(objects_uri))
+        R = resource_cache.get(table_pk)
+        self.create_user_and_login('user2')
+        self.assertHttpUnauthorized(self.api_client.get(objects_uri))
+        #changed by another process, schema checksum stays the same
+        ModelDefinition.objects.filter(pk=table_pk).update(verbose_name='public foo')
+        self.assertHttpOK(self.api_client.get(objects_uri))
+        self.assertIs(resource_cache.get(table_pk), R)
+
+    def test_table_delete_invalidates_resource_class(self):
+        table = self.create_table()
+        table_pk = self.get_table_pk(table)
+        TableProxyResource().get_objects_resource(table_pk)
+        self.assertTrue(resource_cache.get(table_pk))
+        self.api_client.delete(table)
+        self.assertIsNone(resource_cache.get(table_pk))